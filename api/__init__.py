@@ -4,13 +4,24 @@ API 模块
 FastAPI 应用程序和路由的入口点。
 """
 
-from .app import qwen_api
-from .routes import router
+# 应用及其依赖（模型管理、中间件、路由）在首次调用 get_app() 时才导入和创建，
+# 仅导入 api 包或其子模块不会加载整个应用
+_app = None
 
-# 创建 FastAPI 应用实例
-app = qwen_api.create_app()
 
-# 注册路由
-app.include_router(router)
+def get_app():
+    """获取 FastAPI 应用实例，首次调用时创建并注册路由"""
+    global _app
+    if _app is None:
+        from .app import qwen_api
+        from .routes import router
+        
+        # 创建 FastAPI 应用实例
+        _app = qwen_api.create_app()
+        
+        # 注册路由
+        _app.include_router(router)
+    return _app
 
-__all__ = ["app", "qwen_api"]
\ No newline at end of file
+
+__all__ = ["get_app"]
@@ -4,10 +4,12 @@ FastAPI 应用程序
 主要的 FastAPI 应用实例，包含路由、中间件和异常处理器。
 """
 
+import asyncio
 import logging
+from concurrent.futures import ThreadPoolExecutor
 import time
 from datetime import datetime
-from typing import Dict, Any
+from typing import Callable, Dict, Any, Optional, Tuple
 from contextlib import asynccontextmanager
 
 from fastapi import FastAPI, HTTPException, Request, Response
@@ -18,17 +20,13 @@ from starlette.exceptions import HTTPException as StarletteHTTPException
 
 from config.manager import get_config_manager
 from services.model_manager import ModelManager
+from services.batcher import DynamicBatcher
 from services.request_processor import RequestProcessor
 from models.responses import ErrorResponse
-from .middleware import (
-    FileValidationMiddleware,
-    RateLimitMiddleware, 
-    ConcurrencyLimitMiddleware,
-    SecurityHeadersMiddleware,
-    RequestLoggingMiddleware
-)
-from services.error_handler import error_handler
+from .middleware import CombinedMiddleware, RequestLoggingMiddleware
+from services.error_handler import error_handler, DefaultJSONResponse
 from services.logging import configure_logging, get_logger
+from services.sysinfo import sysinfo_sampler
 
 logger = logging.getLogger(__name__)
 
@@ -41,6 +39,13 @@ class QwenImageAPI:
         self.model_manager: ModelManager = None
         self.request_processor: RequestProcessor = None
         self.app_start_time = None
+        self._model_load_future: Optional[asyncio.Future] = None
+        self.batcher: Optional[DynamicBatcher] = None
+        self._infer_executor: Optional[ThreadPoolExecutor] = None
+        # /info 响应缓存: (模型加载状态, 序列化后的响应体)，模型加载完成时清空
+        self._info_response: Optional[Tuple[bool, bytes]] = None
+        # 健康响应 JSON 前缀缓存: 模型加载状态 -> memory_usage 之前的 JSON 片段
+        self._health_prefixes: Dict[bool, bytes] = {}
         
     @asynccontextmanager
     async def lifespan(self, app: FastAPI):
@@ -73,7 +78,11 @@ class QwenImageAPI:
             
             # 初始化请求处理器
             self.request_processor = RequestProcessor(
-                max_file_size=config.server.max_file_size
+                max_file_size=config.server.max_file_size,
+                allowed_file_types=(
+                    config.security.allowed_file_types
+                    if config.security.enable_file_validation else None
+                )
             )
             startup_logger.info("Request processor initialized")
             
@@ -84,17 +93,34 @@ class QwenImageAPI:
                 config=model_config
             )
             
-            # 加载模型（如果模型路径已配置）
+            # 在后台线程中加载模型（如果模型路径已配置），不阻塞事件循环
             if model_config['model_path']:
-                try:
-                    self.model_manager.load_model()
-                    startup_logger.info("Model loaded successfully", model_path=model_config['model_path'])
-                except Exception as e:
-                    startup_logger.error("Failed to load model", error=str(e), model_path=model_config['model_path'])
-                    # 不阻止服务启动，允许在运行时重试加载模型
+                self._model_load_future = asyncio.get_running_loop().run_in_executor(
+                    None, self._load_model, config.server.warmup
+                )
+                self._model_load_future.add_done_callback(self._on_model_loaded)
+                startup_logger.info("Model loading started in background", model_path=model_config['model_path'])
             else:
                 startup_logger.warning("Model path not configured, model not loaded")
             
+            # 启动文生图动态批处理器
+            self.batcher = DynamicBatcher(
+                self.model_manager,
+                max_batch_size=config.server.max_batch_size,
+                batch_window=config.server.batch_window_ms / 1000,
+                executor=self.get_inference_executor(),
+                max_queue_size=config.server.batch_queue_size
+            )
+            self.batcher.start()
+            startup_logger.info(
+                "Dynamic batcher started",
+                max_batch_size=config.server.max_batch_size,
+                batch_window_ms=config.server.batch_window_ms
+            )
+            
+            # 启动系统资源后台采样
+            sysinfo_sampler.start(config.server.sysinfo_interval)
+            
             startup_logger.info("Qwen Image API service started successfully")
             
         except Exception as e:
@@ -108,6 +134,26 @@ class QwenImageAPI:
         shutdown_logger.info("Shutting down Qwen Image API service...")
         
         try:
+            # 停止系统资源采样
+            await sysinfo_sampler.stop()
+            
+            # 停止批处理器，未完成的请求以错误结束
+            if self.batcher is not None:
+                await self.batcher.stop()
+                self.batcher = None
+            
+            # 等待已提交的推理完成后关闭推理线程，在默认线程池中等待以免阻塞事件循环
+            if self._infer_executor is not None:
+                await asyncio.get_running_loop().run_in_executor(
+                    None, self._infer_executor.shutdown, True
+                )
+                self._infer_executor = None
+            
+            # 等待仍在进行的模型加载结束，避免与清理并发
+            if self._model_load_future is not None and not self._model_load_future.done():
+                shutdown_logger.info("Waiting for model loading to finish...")
+                await asyncio.wait([self._model_load_future])
+            
             # 清理模型资源
             if self.model_manager:
                 self.model_manager.cleanup()
@@ -125,42 +171,23 @@ class QwenImageAPI:
             title="Qwen Image API Service",
             description="基于 qwen-image 模型的图像生成 API 服务",
             version="1.0.0",
-            lifespan=self.lifespan
+            lifespan=self.lifespan,
+            default_response_class=DefaultJSONResponse
         )
         
         # 获取配置
         config = self.config_manager.get_config()
         
-        # 添加请求日志和追踪中间件（最外层）
-        app.add_middleware(RequestLoggingMiddleware)
-        
-        # 添加安全头中间件
-        app.add_middleware(SecurityHeadersMiddleware)
+        # 添加安全头、文件验证、速率限制和并发限制的合并中间件
+        app.add_middleware(CombinedMiddleware, config=config)
         
-        # 添加并发限制中间件
+        # 添加请求日志和追踪中间件（包裹合并中间件）
         app.add_middleware(
-            ConcurrencyLimitMiddleware,
-            max_concurrent_requests=config.server.max_concurrent_requests,
-            queue_timeout=config.server.queue_timeout
+            RequestLoggingMiddleware,
+            verbose_requests=config.log.verbose_requests,
+            tracing_enabled=config.log.tracing_enabled
         )
         
-        # 添加速率限制中间件（如果启用）
-        if config.security.enable_rate_limiting:
-            app.add_middleware(
-                RateLimitMiddleware,
-                requests_per_minute=config.security.requests_per_minute,
-                requests_per_hour=config.security.requests_per_hour,
-                burst_size=config.security.burst_size
-            )
-        
-        # 添加文件验证中间件（如果启用）
-        if config.security.enable_file_validation:
-            app.add_middleware(
-                FileValidationMiddleware,
-                max_file_size=config.server.max_file_size,
-                allowed_content_types=set(config.security.allowed_file_types)
-            )
-        
         # 添加 CORS 中间件
         app.add_middleware(
             CORSMiddleware,
@@ -170,34 +197,6 @@ class QwenImageAPI:
             allow_headers=["*"],
         )
         
-        # 添加请求日志中间件
-        @app.middleware("http")
-        async def log_requests(request: Request, call_next):
-            start_time = time.time()
-            
-            # 记录请求信息
-            logger.info(
-                f"Request: {request.method} {request.url.path} "
-                f"from {request.client.host if request.client else 'unknown'}"
-            )
-            
-            # 处理请求
-            response = await call_next(request)
-            
-            # 计算处理时间
-            process_time = time.time() - start_time
-            
-            # 记录响应信息
-            logger.info(
-                f"Response: {response.status_code} "
-                f"in {process_time:.3f}s"
-            )
-            
-            # 添加响应头
-            response.headers["X-Process-Time"] = str(process_time)
-            
-            return response
-        
         # 全局异常处理器 - 使用统一的错误处理系统
         @app.exception_handler(HTTPException)
         async def http_exception_handler(request: Request, exc: HTTPException):
@@ -223,18 +222,111 @@ class QwenImageAPI:
         
         return app
     
+    def _load_model(self, warmup: bool) -> None:
+        """在后台线程中加载模型，并按配置执行预热"""
+        self.model_manager.load_model()
+        if warmup:
+            try:
+                self.model_manager.warmup()
+            except Exception as e:
+                # 预热失败不影响模型使用，首个请求承担冷启动开销
+                logger.warning(f"Model warmup failed: {e}")
+    
+    def _on_model_loaded(self, future: asyncio.Future):
+        """后台模型加载完成回调"""
+        startup_logger = get_logger("startup")
+        model_path = self.model_manager.model_path if self.model_manager else None
+        
+        if future.cancelled():
+            startup_logger.warning("Model loading cancelled", model_path=model_path)
+            return
+        
+        # 模型状态已变化，下次请求 /info 时重新生成
+        self.invalidate_info_response()
+        
+        error = future.exception()
+        if error is not None:
+            # 不阻止服务运行，允许在运行时重试加载模型
+            startup_logger.error("Failed to load model", error=str(error), model_path=model_path)
+        else:
+            startup_logger.info("Model loaded successfully", model_path=model_path)
+    
+    def is_model_warming_up(self) -> bool:
+        """模型是否正在后台加载中"""
+        return self._model_load_future is not None and not self._model_load_future.done()
+    
     def get_model_manager(self) -> ModelManager:
         """获取模型管理器实例"""
         if self.model_manager is None:
             raise RuntimeError("Model manager not initialized")
         return self.model_manager
     
+    def get_batcher(self) -> Optional[DynamicBatcher]:
+        """获取正在运行的动态批处理器，未启动时返回 None"""
+        if self.batcher is not None and self.batcher.is_running:
+            return self.batcher
+        return None
+    
+    def get_inference_executor(self) -> ThreadPoolExecutor:
+        """获取推理专用的单线程执行器
+        
+        所有推理调用在同一个线程中排队执行，事件循环保持响应，GPU 也不会被多个线程分时抢占。
+        """
+        if self._infer_executor is None:
+            self._infer_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="infer")
+        return self._infer_executor
+    
     def get_request_processor(self) -> RequestProcessor:
         """获取请求处理器实例"""
         if self.request_processor is None:
             raise RuntimeError("Request processor not initialized")
         return self.request_processor
     
+    def get_info_response(self, model_loaded: bool, build: Callable[[], bytes]) -> bytes:
+        """
+        获取 /info 响应体，模型加载状态不变时复用缓存
+        
+        Args:
+            model_loaded: 模型是否已加载
+            build: 生成响应体的函数，仅在缓存失效时调用
+            
+        Returns:
+            bytes: 序列化后的响应体
+        """
+        cached = self._info_response
+        if cached is not None and cached[0] == model_loaded:
+            return cached[1]
+        
+        body = build()
+        self._info_response = (model_loaded, body)
+        return body
+    
+    def invalidate_info_response(self):
+        """清空 /info 响应缓存"""
+        self._info_response = None
+    
+    def get_health_prefix(self, model_loaded: bool) -> bytes:
+        """
+        获取健康响应中 memory_usage 之前的 JSON 前缀
+        
+        前缀只包含服务状态和模型加载状态，按模型加载状态缓存。
+        
+        Args:
+            model_loaded: 模型是否已加载
+            
+        Returns:
+            bytes: 以 `"memory_usage":` 结尾的 JSON 片段
+        """
+        prefix = self._health_prefixes.get(model_loaded)
+        if prefix is None:
+            static = DefaultJSONResponse(content={
+                "status": "healthy" if model_loaded else "degraded",
+                "model_loaded": model_loaded
+            }).body
+            prefix = static[:-1] + b',"memory_usage":'
+            self._health_prefixes[model_loaded] = prefix
+        return prefix
+    
     def get_uptime(self) -> float:
         """获取服务运行时间（秒）"""
         if self.app_start_time is None:
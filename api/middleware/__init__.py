@@ -0,0 +1,13 @@
+"""
+API 中间件
+
+包含安全验证、速率限制和性能优化的中间件。
+"""
+
+from .combined import CombinedMiddleware
+from .request_logging import RequestLoggingMiddleware
+
+__all__ = [
+    "CombinedMiddleware",
+    "RequestLoggingMiddleware"
+]
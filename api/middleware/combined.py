@@ -0,0 +1,602 @@
+"""
+合并中间件
+
+将文件验证、速率限制、并发限制和安全头合并为单个纯 ASGI 中间件，
+避免多层 BaseHTTPMiddleware 带来的任务组和内存流开销。
+"""
+
+import asyncio
+import json
+import logging
+import time
+from typing import Dict, List, Optional, Tuple
+from collections import OrderedDict, deque
+
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse, Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from config.models import AppConfig
+from models.responses import ErrorResponse
+from services.error_handler import DefaultJSONResponse
+
+logger = logging.getLogger(__name__)
+
+# 不受速率限制、文件验证和并发限制的路径
+_RATELIMIT_SKIP = frozenset({"/health", "/info", "/", "/docs", "/openapi.json"})
+
+# 推理端点，受并发限制
+_INFERENCE_PATHS = frozenset({
+    "/text-to-image", "/text-to-image/raw", "/text-to-image/stream",
+    "/image-to-image", "/image-to-image/raw", "/image-to-image/stream",
+})
+
+# 需要禁用缓存的路径
+_NO_CACHE_PATHS = _INFERENCE_PATHS
+
+# 需要验证上传文件的路径
+_UPLOAD_PATHS = frozenset({"/image-to-image", "/image-to-image/raw", "/image-to-image/stream"})
+
+# 预编码的安全响应头，在 http.response.start 中一次性追加
+_SECURITY_HEADERS = (
+    (b"x-content-type-options", b"nosniff"),
+    (b"x-frame-options", b"DENY"),
+    (b"x-xss-protection", b"1; mode=block"),
+    (b"referrer-policy", b"strict-origin-when-cross-origin"),
+)
+
+# 推理端点的缓存控制头
+_NO_CACHE_HEADERS = (
+    (b"cache-control", b"no-cache, no-store, must-revalidate"),
+    (b"pragma", b"no-cache"),
+    (b"expires", b"0"),
+)
+
+
+class _ClientWindow:
+    """单个客户端的限流窗口状态"""
+
+    __slots__ = ("requests", "minute_requests", "burst_count", "burst_reset_time")
+
+    def __init__(self):
+        # 请求时间为 time.monotonic() 浮点数，按时间顺序追加
+        # requests 覆盖最近一小时，minute_requests 覆盖最近一分钟，长度即计数
+        self.requests: deque = deque()
+        self.minute_requests: deque = deque()
+        self.burst_count = 0
+        self.burst_reset_time: Optional[float] = None
+
+
+# 错误响应模板中动态数值的占位标记
+_SLOT = "__SLOT__"
+
+
+def _error_body_template(error: Dict) -> bytes:
+    """将错误响应预先序列化为字节模板，值为 _SLOT 的位置替换为 %d 占位符"""
+    content = ErrorResponse(error=error).model_dump()
+    body = json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return body.replace(b"%", b"%%").replace(f'"{_SLOT}"'.encode(), b"%d")
+
+
+class _BodyTooLarge(Exception):
+    """请求体超过大小限制"""
+
+
+class _BodySizeLimiter:
+    """逐块统计请求体大小，覆盖分块传输和不可信的 Content-Length
+
+    只计数不缓冲，请求体仍以流的形式直接交给路由处理。
+    """
+
+    __slots__ = ("receive", "max_size", "received", "exceeded")
+
+    def __init__(self, receive: Receive, max_size: int):
+        self.receive = receive
+        self.max_size = max_size
+        self.received = 0
+        self.exceeded = False
+
+    async def __call__(self) -> Message:
+        message = await self.receive()
+        if message["type"] == "http.request":
+            self.received += len(message.get("body", b""))
+            if self.received > self.max_size:
+                self.exceeded = True
+                raise _BodyTooLarge()
+        return message
+
+
+class CombinedMiddleware:
+    """合并的安全与流量控制中间件
+
+    按顺序执行：安全头注入、文件验证、速率限制、并发限制，然后调用内部应用。
+    所有检查直接基于 ASGI scope 完成，不构造 Request 对象，也不缓冲响应体。
+    """
+
+    # 限流状态分片数（必须为 2 的幂）
+    NUM_SHARDS = 64
+
+    def __init__(self, app: ASGIApp, config: AppConfig):
+        self.app = app
+        server_config = config.server
+        security_config = config.security
+
+        # 文件验证配置
+        self.enable_file_validation = security_config.enable_file_validation
+        self.max_file_size = server_config.max_file_size
+        self.allowed_content_types = frozenset(ct.lower() for ct in security_config.allowed_file_types)
+
+        # 速率限制配置
+        self.enable_rate_limiting = security_config.enable_rate_limiting
+        self.requests_per_minute = security_config.requests_per_minute
+        self.requests_per_hour = security_config.requests_per_hour
+        self.burst_size = security_config.burst_size
+        self.rate_limit_remaining_headers = security_config.rate_limit_remaining_headers
+        # 限额头为常量，预先编码
+        self._rate_limit_headers = (
+            (b"x-ratelimit-limit-minute", str(self.requests_per_minute).encode()),
+            (b"x-ratelimit-limit-hour", str(self.requests_per_hour).encode()),
+        )
+
+        # 使用内存存储请求记录（生产环境建议使用 Redis）
+        # 按客户端标识哈希分片，每个分片按最近访问顺序排列（LRU）
+        # 超出分片容量时淘汰最久未访问的客户端，后台任务定期清理过期客户端
+        self.max_clients_per_shard = -(-security_config.rate_limit_max_clients // self.NUM_SHARDS)
+        self.prune_interval = security_config.rate_limit_prune_interval
+        self.shards: List["OrderedDict[str, _ClientWindow]"] = [
+            OrderedDict() for _ in range(self.NUM_SHARDS)
+        ]
+        self._prune_task: Optional[asyncio.Task] = None
+
+        # 并发限制配置
+        # 固定数量的工作协程从有界队列中按顺序发放执行许可
+        self.max_concurrent_requests = server_config.max_concurrent_requests
+        self.queue_timeout = server_config.queue_timeout
+        self.max_queue_size = self.max_concurrent_requests * 2
+        self._concurrency_limit_header = (
+            b"x-concurrency-limit", str(self.max_concurrent_requests).encode()
+        )
+
+        # 拒绝路径的响应体模板，过载时无需再构造模型和序列化
+        self._rate_limit_body = _error_body_template({
+            "code": "RATE_LIMIT_EXCEEDED",
+            "message": "请求频率过高，请稍后重试",
+            "details": {
+                "limits": {
+                    "requests_per_minute": self.requests_per_minute,
+                    "requests_per_hour": self.requests_per_hour,
+                    "burst_size": self.burst_size
+                },
+                "current": {
+                    "requests_per_minute": _SLOT,
+                    "requests_per_hour": _SLOT,
+                    "burst_requests": _SLOT
+                },
+                "retry_after": 60  # 建议等待时间（秒）
+            }
+        })
+        self._overloaded_body = _error_body_template({
+            "code": "SERVICE_OVERLOADED",
+            "message": "服务器负载过高，请稍后重试",
+            "details": {
+                "active_requests": _SLOT,
+                "queued_requests": _SLOT,
+                "max_concurrent": self.max_concurrent_requests
+            }
+        })
+        self._queue_timeout_body = _error_body_template({
+            "code": "QUEUE_TIMEOUT",
+            "message": f"请求在队列中等待超时 ({self.queue_timeout}s)",
+            "details": {
+                "queue_timeout": self.queue_timeout,
+                "active_requests": _SLOT,
+                "queued_requests": _SLOT
+            }
+        })
+        self.queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._workers_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._idle_workers = 0
+        self.active_requests = 0
+
+    @property
+    def queued_requests(self) -> int:
+        """当前排队等待的请求数（不含即将被空闲工作协程取走的条目）"""
+        if self.queue is None:
+            return 0
+        return max(0, self.queue.qsize() - self._idle_workers)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "lifespan":
+            await self.app(scope, self._wrap_lifespan_receive(receive), send)
+            return
+
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        path = scope["path"]
+        headers = Headers(scope=scope)
+        extra_headers: List[Tuple[bytes, bytes]] = []
+        track_concurrency = False
+        response_started = False
+        body_limiter: Optional[_BodySizeLimiter] = None
+
+        async def send_with_headers(message: Message) -> None:
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+                # 复制原始头列表，避免修改可能被复用的响应对象
+                raw_headers = list(message.get("headers", ()))
+                raw_headers.extend(_SECURITY_HEADERS)
+                if path in _NO_CACHE_PATHS:
+                    raw_headers.extend(_NO_CACHE_HEADERS)
+                raw_headers.extend(extra_headers)
+                if track_concurrency:
+                    raw_headers.append((b"x-concurrency-active", str(self.active_requests).encode()))
+                    raw_headers.append((b"x-concurrency-queued", str(self.queued_requests).encode()))
+                    raw_headers.append(self._concurrency_limit_header)
+                message["headers"] = raw_headers
+            await send(message)
+
+        async def send_wrapper(message: Message) -> None:
+            # 请求体超限时丢弃应用自身的错误响应，改由中间件返回 413
+            if body_limiter is not None and body_limiter.exceeded and not response_started:
+                return
+            await send_with_headers(message)
+
+        async def call_app() -> None:
+            try:
+                await self.app(scope, receive, send_wrapper)
+            except _BodyTooLarge:
+                pass
+
+            if body_limiter is not None and body_limiter.exceeded and not response_started:
+                logger.warning(f"Request body too large: more than {self.max_file_size} bytes")
+                await self._file_too_large_response(body_limiter.received)(
+                    scope, receive, send_with_headers
+                )
+
+        # 排除路径只注入安全头，跳过所有检查
+        if path in _RATELIMIT_SKIP:
+            await self.app(scope, receive, send_wrapper)
+            return
+
+        # 文件验证
+        if self.enable_file_validation:
+            error_response = self._validate_upload(path, scope["method"], headers)
+            if error_response is not None:
+                await error_response(scope, receive, send_wrapper)
+                return
+
+            # 流式统计请求体大小，防止绕过 Content-Length 检查
+            if path in _UPLOAD_PATHS and scope["method"] == "POST":
+                receive = body_limiter = _BodySizeLimiter(receive, self.max_file_size)
+
+        # 速率限制
+        if self.enable_rate_limiting:
+            client_id = self._get_client_id(scope, headers)
+            is_limited, minute_requests, hour_requests, burst_count = self._is_rate_limited(client_id)
+
+            if is_limited:
+                logger.warning(
+                    f"Rate limit exceeded for client {client_id}: "
+                    f"minute={minute_requests}, hour={hour_requests}, burst={burst_count}"
+                )
+                await self._rate_limit_response(
+                    minute_requests, hour_requests, burst_count
+                )(scope, receive, send_wrapper)
+                return
+
+            # 记录请求
+            self._record_request(client_id)
+
+            # 添加速率限制头信息
+            extra_headers.extend(self._rate_limit_headers)
+            if self.rate_limit_remaining_headers:
+                extra_headers.append((b"x-ratelimit-remaining-minute", str(
+                    max(0, self.requests_per_minute - minute_requests)
+                ).encode()))
+                extra_headers.append((b"x-ratelimit-remaining-hour", str(
+                    max(0, self.requests_per_hour - hour_requests)
+                ).encode()))
+
+        # 非推理端点不受并发限制
+        if path not in _INFERENCE_PATHS:
+            await call_app()
+            return
+
+        # 入队等待执行许可，队列已满时直接拒绝
+        self._ensure_workers()
+        grant: asyncio.Future = asyncio.get_running_loop().create_future()
+        try:
+            if self.queued_requests >= self.max_queue_size:
+                raise asyncio.QueueFull
+            self.queue.put_nowait(grant)
+        except asyncio.QueueFull:
+            logger.warning("Request queue full, rejecting request")
+            await self._overloaded_response()(scope, receive, send_wrapper)
+            return
+
+        start_time = time.time()
+        done: Optional[asyncio.Event] = None
+
+        try:
+            # 使用超时等待工作协程发放许可
+            done = await asyncio.wait_for(grant, timeout=self.queue_timeout)
+            self.active_requests += 1
+
+            wait_time = time.time() - start_time
+            if wait_time > 1.0:  # 记录较长的等待时间
+                logger.info(f"Request waited {wait_time:.2f}s in queue")
+            if wait_time > 0.1:
+                extra_headers.append((b"x-queue-time", f"{wait_time:.3f}".encode()))
+
+            # 处理请求
+            track_concurrency = True
+            await call_app()
+
+        except asyncio.TimeoutError:
+            logger.warning(f"Request timed out after {self.queue_timeout}s in queue")
+            await self._queue_timeout_response()(scope, receive, send_wrapper)
+
+        finally:
+            if done is not None:
+                self.active_requests -= 1
+                done.set()
+            elif grant.done() and not grant.cancelled():
+                # 许可在超时或取消的同时被发放，立即归还
+                grant.result().set()
+
+    def _ensure_workers(self) -> None:
+        """确保当前事件循环中已启动并发工作协程"""
+        loop = asyncio.get_running_loop()
+        if self._workers_loop is loop:
+            return
+
+        # 首次使用或事件循环已更换时重新创建队列和工作协程
+        # 容量包含尚未被空闲工作协程取走的条目
+        self.queue = asyncio.Queue(
+            maxsize=self.max_queue_size + self.max_concurrent_requests
+        )
+        self._idle_workers = self.max_concurrent_requests
+        self._workers = [
+            loop.create_task(self._worker())
+            for _ in range(self.max_concurrent_requests)
+        ]
+        self._workers_loop = loop
+
+    def _stop_workers(self) -> None:
+        """停止并发工作协程"""
+        for worker in self._workers:
+            worker.cancel()
+        self._workers = []
+        self._workers_loop = None
+        self.queue = None
+
+    async def _worker(self) -> None:
+        """逐个发放执行许可，并等待持有者完成后再处理下一个"""
+        while True:
+            try:
+                grant = await self.queue.get()
+            finally:
+                self._idle_workers -= 1
+
+            try:
+                if grant.done():
+                    # 等待者已超时或被取消
+                    continue
+
+                done = asyncio.Event()
+                grant.set_result(done)
+                await done.wait()
+            finally:
+                self._idle_workers += 1
+
+    def _validate_upload(self, path: str, method: str, headers: Headers) -> Optional[JSONResponse]:
+        """验证上传请求，返回错误响应或 None"""
+
+        # 只对文件上传端点进行验证
+        if path not in _UPLOAD_PATHS or method != "POST":
+            return None
+
+        # 检查 Content-Length（缺失或无效时由流式统计兜底）
+        content_length = headers.get("content-length")
+        if content_length and content_length.isdigit():
+            content_length = int(content_length)
+            if content_length > self.max_file_size:
+                logger.warning(f"File too large: {content_length} bytes")
+                return self._file_too_large_response(content_length)
+
+        # 检查 Content-Type
+        content_type = headers.get("content-type", "")
+        if content_type.startswith("multipart/form-data"):
+            # multipart 请求会在路由层进一步验证文件类型
+            pass
+        elif content_type and content_type.split(";", 1)[0].strip().lower() not in self.allowed_content_types:
+            logger.warning(f"Unsupported content type: {content_type}")
+            error_response = ErrorResponse(
+                error={
+                    "code": "UNSUPPORTED_MEDIA_TYPE",
+                    "message": "不支持的文件类型",
+                    "details": {
+                        "supported_types": list(self.allowed_content_types),
+                        "received_type": content_type
+                    }
+                }
+            )
+            return DefaultJSONResponse(
+                status_code=415,
+                content=error_response.model_dump()
+            )
+
+        return None
+
+    def _file_too_large_response(self, received_size: int) -> JSONResponse:
+        """构建文件过大错误响应"""
+        error_response = ErrorResponse(
+            error={
+                "code": "FILE_TOO_LARGE",
+                "message": f"文件大小超过限制 ({self.max_file_size} bytes)",
+                "details": {
+                    "max_size": self.max_file_size,
+                    "received_size": received_size
+                }
+            }
+        )
+        return DefaultJSONResponse(
+            status_code=413,
+            content=error_response.model_dump()
+        )
+
+    def _get_client_id(self, scope: Scope, headers: Headers) -> str:
+        """获取客户端标识"""
+        # 优先使用 X-Forwarded-For 头
+        forwarded_for = headers.get("x-forwarded-for")
+        if forwarded_for:
+            return forwarded_for.split(",")[0].strip()
+
+        # 使用客户端 IP
+        client = scope.get("client")
+        if client:
+            return client[0]
+
+        return "unknown"
+
+    def _shard_for(self, client_id: str) -> "OrderedDict[str, _ClientWindow]":
+        """获取客户端所在的分片"""
+        return self.shards[hash(client_id) & (self.NUM_SHARDS - 1)]
+
+    def _is_rate_limited(self, client_id: str) -> Tuple[bool, int, int, int]:
+        """检查是否超过速率限制
+
+        返回 (是否受限, 分钟请求数, 小时请求数, 突发请求数)
+        """
+        window = self._shard_for(client_id).get(client_id)
+        if window is None:
+            return False, 0, 0, 0
+
+        now = time.monotonic()
+        minute_ago = now - 60.0
+        hour_ago = now - 3600.0
+
+        requests = window.requests
+        recent = window.minute_requests
+
+        # 移除各窗口中过期的请求记录
+        while requests and requests[0] < hour_ago:
+            requests.popleft()
+        while recent and recent[0] <= minute_ago:
+            recent.popleft()
+
+        minute_requests = len(recent)
+        hour_requests = len(requests)
+
+        # 检查突发请求限制
+        if window.burst_reset_time is not None and now - window.burst_reset_time > 60.0:
+            window.burst_count = 0
+            window.burst_reset_time = None
+
+        burst_count = window.burst_count
+
+        # 检查各种限制
+        is_limited = (
+            minute_requests >= self.requests_per_minute or
+            hour_requests >= self.requests_per_hour or
+            burst_count >= self.burst_size
+        )
+
+        return is_limited, minute_requests, hour_requests, burst_count
+
+    def _record_request(self, client_id: str):
+        """记录请求"""
+        now = time.monotonic()
+        shard = self._shard_for(client_id)
+
+        window = shard.get(client_id)
+        if window is None:
+            window = shard[client_id] = _ClientWindow()
+            # 超出分片容量时淘汰最久未访问的客户端
+            if len(shard) > self.max_clients_per_shard:
+                shard.popitem(last=False)
+        else:
+            shard.move_to_end(client_id)
+
+        window.requests.append(now)
+        window.minute_requests.append(now)
+
+        # 更新突发计数
+        window.burst_count += 1
+        if window.burst_reset_time is None:
+            window.burst_reset_time = now
+
+    def _prune_expired_clients(self) -> int:
+        """移除一小时内没有请求的客户端，返回移除数量"""
+        hour_ago = time.monotonic() - 3600.0
+        removed = 0
+
+        for shard in self.shards:
+            # 分片按最近访问排序，遇到第一个活跃客户端即可停止
+            while shard:
+                client_id, window = next(iter(shard.items()))
+                if window.requests and window.requests[-1] >= hour_ago:
+                    break
+                del shard[client_id]
+                removed += 1
+
+        return removed
+
+    async def _prune_loop(self) -> None:
+        """定期清理过期客户端的后台任务"""
+        while True:
+            await asyncio.sleep(self.prune_interval)
+            removed = self._prune_expired_clients()
+            if removed:
+                logger.debug(f"Pruned {removed} idle rate-limit clients")
+
+    def _wrap_lifespan_receive(self, receive: Receive) -> Receive:
+        """在应用启动和关闭时管理工作协程和后台清理任务"""
+
+        async def receive_wrapper() -> Message:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                self._ensure_workers()
+                if self.enable_rate_limiting and self._prune_task is None:
+                    self._prune_task = asyncio.create_task(self._prune_loop())
+            elif message["type"] == "lifespan.shutdown":
+                self._stop_workers()
+                if self._prune_task is not None:
+                    self._prune_task.cancel()
+                    self._prune_task = None
+            return message
+
+        return receive_wrapper
+
+    def _rate_limit_response(self, minute_requests: int, hour_requests: int, burst_count: int) -> Response:
+        """构建速率限制错误响应"""
+        body = self._rate_limit_body % (minute_requests, hour_requests, burst_count)
+        return Response(
+            body,
+            status_code=429,
+            media_type="application/json",
+            headers={"Retry-After": "60"}
+        )
+
+    def _overloaded_response(self) -> Response:
+        """构建服务过载错误响应"""
+        body = self._overloaded_body % (self.active_requests, self.queued_requests)
+        return Response(
+            body,
+            status_code=503,
+            media_type="application/json",
+            headers={"Retry-After": "30"}
+        )
+
+    def _queue_timeout_response(self) -> Response:
+        """构建队列超时错误响应"""
+        body = self._queue_timeout_body % (self.active_requests, self.queued_requests)
+        return Response(
+            body,
+            status_code=503,
+            media_type="application/json"
+        )
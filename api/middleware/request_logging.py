@@ -0,0 +1,179 @@
+"""
+请求日志中间件
+
+负责请求追踪、结构化日志记录和性能指标采集。
+"""
+
+import time
+from typing import Optional
+
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .combined import _RATELIMIT_SKIP
+
+
+class RequestLoggingMiddleware:
+    """请求日志和追踪中间件
+
+    纯 ASGI 实现，直接从 scope 读取请求信息，在 http.response.start 中注入响应头，
+    不构造 Request/Response 对象，也不为每个请求创建任务组。
+    """
+
+    def __init__(self, app: ASGIApp, verbose_requests: bool = False, tracing_enabled: bool = True):
+        self.app = app
+        self.verbose_requests = verbose_requests
+        self.tracing_enabled = tracing_enabled
+
+        # 在初始化时绑定日志服务，避免每个请求重复导入和创建日志器
+        from services.logging import (
+            set_request_context, clear_request_context, generate_request_id,
+            request_tracker, performance_monitor, get_logger
+        )
+        self._set_ctx = set_request_context
+        self._new_id = generate_request_id
+        self._clear_ctx = clear_request_context
+        self._tracker = request_tracker
+        self._monitor = performance_monitor
+        self._logger = get_logger("request")
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        """处理请求日志和追踪"""
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_tracker = self._tracker
+        performance_monitor = self._monitor
+        logger = self._logger
+
+        path = scope["path"]
+        method = scope["method"]
+        headers = Headers(scope=scope)
+
+        # 追踪关闭或健康检查等排除路径不设置上下文，也不记录追踪和性能指标
+        trace = self.tracing_enabled and path not in _RATELIMIT_SKIP
+
+        # 设置请求上下文；不追踪时仍生成请求 ID 用于响应头
+        request_id = self._set_ctx() if trace else self._new_id()
+
+        # 获取客户端信息
+        client_ip = self._get_client_ip(scope, headers)
+
+        # 开始请求追踪
+        if trace:
+            request_tracker.start_request(
+                request_id=request_id,
+                endpoint=path,
+                method=method,
+                client_ip=client_ip
+            )
+
+        start_time = time.perf_counter()
+
+        # 记录简要的请求行（仅在详细模式下）
+        if self.verbose_requests:
+            logger.info(f"Request: {method} {path} from {client_ip}")
+
+        # 记录请求开始
+        logger.info(
+            "Request started",
+            method=method,
+            path=path,
+            client_ip=client_ip,
+            user_agent=headers.get("user-agent", ""),
+            content_length=headers.get("content-length", "0")
+        )
+
+        status_code = 500
+        response_size: Optional[str] = None
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code, response_size
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                response_size = Headers(raw=message.get("headers", [])).get("content-length")
+
+                # 添加请求 ID 和处理时间到响应头
+                raw_headers = list(message.get("headers", ()))
+                raw_headers.append((b"x-request-id", request_id.encode()))
+                raw_headers.append((b"x-process-time", f"{time.perf_counter() - start_time:.3f}".encode()))
+                message["headers"] = raw_headers
+            await send(message)
+
+        try:
+            # 处理请求
+            await self.app(scope, receive, send_wrapper)
+
+        except Exception as e:
+            # 计算处理时间
+            duration = time.perf_counter() - start_time
+
+            if trace:
+                # 结束请求追踪（带错误信息）
+                request_tracker.end_request(request_id, 500, str(e))
+
+                # 记录性能指标
+                performance_monitor.record_request(
+                    endpoint=path,
+                    duration=duration,
+                    status_code=500,
+                    error_type=type(e).__name__
+                )
+
+            # 记录错误
+            logger.error(
+                "Request failed",
+                error=str(e),
+                error_type=type(e).__name__,
+                duration=duration
+            )
+
+            raise
+
+        else:
+            # 计算处理时间
+            duration = time.perf_counter() - start_time
+
+            if trace:
+                # 结束请求追踪
+                request_tracker.end_request(request_id, status_code)
+
+                # 记录性能指标
+                performance_monitor.record_request(
+                    endpoint=path,
+                    duration=duration,
+                    status_code=status_code
+                )
+
+            # 记录请求完成
+            logger.info(
+                "Request completed",
+                status_code=status_code,
+                duration=duration,
+                response_size=response_size or "unknown"
+            )
+
+        finally:
+            # 清除请求上下文
+            if trace:
+                self._clear_ctx()
+
+    def _get_client_ip(self, scope: Scope, headers: Headers) -> str:
+        """获取客户端 IP 地址"""
+        # 优先使用 X-Forwarded-For 头
+        forwarded_for = headers.get("x-forwarded-for")
+        if forwarded_for:
+            return forwarded_for.split(",")[0].strip()
+
+        # 使用 X-Real-IP 头
+        real_ip = headers.get("x-real-ip")
+        if real_ip:
+            return real_ip
+
+        # 使用客户端 IP
+        client = scope.get("client")
+        if client:
+            return client[0]
+
+        return "unknown"
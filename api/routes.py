@@ -4,13 +4,19 @@ API 路由定义
 包含所有 API 端点的路由处理函数。
 """
 
+import asyncio
+import functools
+import io
+import json
 import logging
 import time
 from datetime import datetime
-from typing import Dict, Any
+from typing import Dict, Any, Iterator, Optional, Tuple
 
-from fastapi import APIRouter, HTTPException, UploadFile, File, Form, Depends
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, HTTPException, UploadFile, File, Form, Depends, Query, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from PIL import Image
 
 from models.requests import TextToImageRequest, ImageToImageRequest
 from models.responses import ImageResponse, HealthResponse, InfoResponse, ErrorResponse
@@ -18,6 +24,10 @@ from services.exceptions import (
     ModelNotLoadedError, InferenceError, ValidationError, 
     MemoryError, ResourceError
 )
+from services.sysinfo import sysinfo_sampler
+from services.logging import performance_monitor, request_tracker
+from services.error_handler import DefaultJSONResponse
+from services.request_processor import b64encode
 from .app import qwen_api
 
 logger = logging.getLogger(__name__)
@@ -25,29 +35,91 @@ logger = logging.getLogger(__name__)
 # 创建路由器
 router = APIRouter()
 
+# 元数据中的模型名称
+MODEL_NAME = "qwen-image"
+
+# 所有生成结果共享的元数据字段
+_BASE_META = {"model": MODEL_NAME}
+
 
 def get_model_manager():
     """依赖注入：获取模型管理器"""
     return qwen_api.get_model_manager()
 
 
+def get_ready_model_manager():
+    """依赖注入：获取已完成预热的模型管理器"""
+    model_manager = qwen_api.get_model_manager()
+    if qwen_api.is_model_warming_up():
+        raise HTTPException(
+            status_code=503,
+            detail="模型正在预热，请稍后重试"
+        )
+    return model_manager
+
+
 def get_request_processor():
     """依赖注入：获取请求处理器"""
     return qwen_api.get_request_processor()
 
 
-@router.post("/text-to-image", response_model=ImageResponse)
-async def text_to_image(
+async def _run_inference(func, **kwargs):
+    """在推理专用线程中执行阻塞的推理调用"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        qwen_api.get_inference_executor(),
+        functools.partial(func, **kwargs)
+    )
+
+
+# 推理异常类型 -> (HTTP 状态码, 错误信息, 日志级别, 是否附带异常详情)
+_EXC_MAP = {
+    ModelNotLoadedError: (503, "模型未加载，请稍后重试", logging.ERROR, False),
+    ValidationError: (400, "参数验证失败", logging.WARNING, True),
+    MemoryError: (503, "内存不足", logging.ERROR, True),
+    ResourceError: (503, "服务繁忙，请稍后重试", logging.WARNING, True),
+    InferenceError: (500, "图像生成失败", logging.ERROR, True),
+}
+
+
+def _to_http_exception(error: Exception, endpoint: str) -> HTTPException:
+    """将推理过程中的异常映射为 HTTP 异常"""
+    if isinstance(error, HTTPException):
+        return error
+    
+    # 按 MRO 查找，子类异常沿用父类的映射
+    for exc_type in type(error).__mro__:
+        entry = _EXC_MAP.get(exc_type)
+        if entry is not None:
+            status_code, message, level, with_detail = entry
+            logger.log(level, "%s in %s: %s", type(error).__name__, endpoint, error)
+            return HTTPException(
+                status_code=status_code,
+                detail=f"{message}: {error}" if with_detail else message
+            )
+    
+    logger.error(f"Unexpected error in {endpoint}: {error}", exc_info=error)
+    return HTTPException(
+        status_code=500,
+        detail="服务器内部错误"
+    )
+
+
+async def _generate_text_to_image(
     request: TextToImageRequest,
-    model_manager=Depends(get_model_manager),
-    request_processor=Depends(get_request_processor)
-):
+    model_manager,
+    request_processor
+) -> Tuple[Image.Image, Dict[str, Any]]:
     """
-    文生图 API 端点
+    执行文生图推理
     
-    根据文本描述生成图像
+    Returns:
+        Tuple[Image.Image, Dict[str, Any]]: 生成的图像和元数据
+        
+    Raises:
+        HTTPException: 验证或推理失败
     """
-    start_time = time.time()
+    start_ns = time.monotonic_ns()
     
     try:
         logger.info(f"Text-to-image request: prompt='{request.prompt[:50]}...'")
@@ -62,95 +134,68 @@ async def text_to_image(
                 detail="模型未加载，服务暂时不可用"
             )
         
-        # 执行推理
-        image = model_manager.text_to_image(
-            prompt=request.prompt,
-            width=request.width,
-            height=request.height,
-            num_inference_steps=request.num_inference_steps,
-            guidance_scale=request.guidance_scale
-        )
-        
-        # 计算推理时间
-        inference_time = time.time() - start_time
-        
-        # 构建元数据
-        metadata = {
-            "width": image.width,
-            "height": image.height,
-            "inference_time": round(inference_time, 3),
-            "model": "qwen-image",
-            "timestamp": datetime.now().isoformat(),
-            "parameters": {
-                "prompt": request.prompt,
-                "width": request.width,
-                "height": request.height,
-                "num_inference_steps": request.num_inference_steps,
-                "guidance_scale": request.guidance_scale
-            }
-        }
-        
-        # 格式化响应
-        response = request_processor.format_image_response(image, metadata)
-        
-        logger.info(f"Text-to-image completed in {inference_time:.3f}s")
-        return response
+        # 执行推理：批处理器运行时与参数相同的并发请求合并推理
+        batcher = qwen_api.get_batcher()
+        if batcher is not None:
+            image = await batcher.submit(request)
+        else:
+            image = await _run_inference(
+                model_manager.text_to_image,
+                prompt=request.prompt,
+                width=request.width,
+                height=request.height,
+                num_inference_steps=request.num_inference_steps,
+                guidance_scale=request.guidance_scale,
+                cache_interval=request.cache_interval
+            )
         
-    except ModelNotLoadedError:
-        logger.error("Model not loaded")
-        raise HTTPException(
-            status_code=503,
-            detail="模型未加载，请稍后重试"
-        )
-    except ValidationError as e:
-        logger.warning(f"Validation error: {e}")
-        raise HTTPException(
-            status_code=400,
-            detail=f"参数验证失败: {str(e)}"
-        )
-    except MemoryError as e:
-        logger.error(f"Memory error: {e}")
-        raise HTTPException(
-            status_code=503,
-            detail=f"内存不足: {str(e)}"
-        )
-    except InferenceError as e:
-        logger.error(f"Inference error: {e}")
-        raise HTTPException(
-            status_code=500,
-            detail=f"图像生成失败: {str(e)}"
-        )
     except Exception as e:
-        logger.error(f"Unexpected error in text-to-image: {e}", exc_info=True)
-        raise HTTPException(
-            status_code=500,
-            detail="服务器内部错误"
-        )
+        raise _to_http_exception(e, "text-to-image")
+    
+    # 计算推理时间
+    inference_time = (time.monotonic_ns() - start_ns) / 1e9
+    
+    # 构建元数据
+    width, height = image.size
+    metadata = {
+        **_BASE_META,
+        "width": width,
+        "height": height,
+        "inference_time": round(inference_time, 3),
+        "timestamp": datetime.now().isoformat(),
+        "parameters": request.model_dump()
+    }
+    
+    logger.info(f"Text-to-image completed in {inference_time:.3f}s")
+    return image, metadata
 
 
-@router.post("/image-to-image", response_model=ImageResponse)
-async def image_to_image(
-    image: UploadFile = File(..., description="输入图像文件"),
-    prompt: str = Form(..., description="文本描述"),
-    strength: float = Form(0.8, description="变换强度"),
-    width: int = Form(None, description="输出宽度"),
-    height: int = Form(None, description="输出高度"),
-    num_inference_steps: int = Form(20, description="推理步数"),
-    model_manager=Depends(get_model_manager),
-    request_processor=Depends(get_request_processor)
-):
+async def _generate_image_to_image(
+    image: UploadFile,
+    prompt: str,
+    strength: float,
+    width: Optional[int],
+    height: Optional[int],
+    num_inference_steps: int,
+    model_manager,
+    request_processor
+) -> Tuple[Image.Image, Dict[str, Any]]:
     """
-    图生图 API 端点
+    执行图生图推理
     
-    基于输入图像和文本描述生成新图像
+    Returns:
+        Tuple[Image.Image, Dict[str, Any]]: 生成的图像和元数据
+        
+    Raises:
+        HTTPException: 验证或推理失败
     """
-    start_time = time.time()
+    start_ns = time.monotonic_ns()
     
     try:
         logger.info(f"Image-to-image request: prompt='{prompt[:50]}...'")
         
-        # 处理上传的图像
-        input_image = request_processor.process_image_upload(image)
+        # 处理上传的图像（在线程池中解码，不阻塞事件循环）
+        input_image = await run_in_threadpool(request_processor.process_image_upload, image)
         
         # 构建请求对象进行验证
         img_request = ImageToImageRequest(
@@ -172,7 +217,8 @@ async def image_to_image(
             )
         
         # 执行推理
-        result_image = model_manager.image_to_image(
+        result_image = await _run_inference(
+            model_manager.image_to_image,
             image=input_image,
             prompt=img_request.prompt,
             strength=img_request.strength,
@@ -181,66 +227,246 @@ async def image_to_image(
             num_inference_steps=img_request.num_inference_steps
         )
         
-        # 计算推理时间
-        inference_time = time.time() - start_time
-        
-        # 构建元数据
-        metadata = {
-            "width": result_image.width,
-            "height": result_image.height,
-            "inference_time": round(inference_time, 3),
-            "model": "qwen-image",
-            "timestamp": datetime.now().isoformat(),
-            "parameters": {
-                "prompt": img_request.prompt,
-                "strength": img_request.strength,
-                "width": img_request.width,
-                "height": img_request.height,
-                "num_inference_steps": img_request.num_inference_steps
-            },
-            "input_image": {
-                "original_width": input_image.width,
-                "original_height": input_image.height,
-                "format": input_image.format
-            }
+    except Exception as e:
+        raise _to_http_exception(e, "image-to-image")
+    
+    # 计算推理时间
+    inference_time = (time.monotonic_ns() - start_ns) / 1e9
+    
+    # 构建元数据
+    width, height = result_image.size
+    original_width, original_height = input_image.size
+    metadata = {
+        **_BASE_META,
+        "width": width,
+        "height": height,
+        "inference_time": round(inference_time, 3),
+        "timestamp": datetime.now().isoformat(),
+        "parameters": img_request.model_dump(),
+        "input_image": {
+            "original_width": original_width,
+            "original_height": original_height,
+            "format": input_image.format
         }
-        
-        # 格式化响应
-        response = request_processor.format_image_response(result_image, metadata)
-        
-        logger.info(f"Image-to-image completed in {inference_time:.3f}s")
-        return response
-        
-    except ModelNotLoadedError:
-        logger.error("Model not loaded")
-        raise HTTPException(
-            status_code=503,
-            detail="模型未加载，请稍后重试"
-        )
-    except ValidationError as e:
-        logger.warning(f"Validation error: {e}")
-        raise HTTPException(
-            status_code=400,
-            detail=f"参数验证失败: {str(e)}"
-        )
-    except MemoryError as e:
-        logger.error(f"Memory error: {e}")
-        raise HTTPException(
-            status_code=503,
-            detail=f"内存不足: {str(e)}"
-        )
-    except InferenceError as e:
-        logger.error(f"Inference error: {e}")
-        raise HTTPException(
-            status_code=500,
-            detail=f"图像生成失败: {str(e)}"
-        )
+    }
+    
+    logger.info(f"Image-to-image completed in {inference_time:.3f}s")
+    return result_image, metadata
+
+
+async def _raw_image_response(image: Image.Image, metadata: Dict[str, Any],
+                              request_processor, image_format: str) -> Response:
+    """构建直接返回图像字节的响应，元数据放在响应头中；编码在线程池中执行，不阻塞事件循环"""
+    try:
+        content, media_type = await run_in_threadpool(request_processor.encode_image, image, image_format)
     except Exception as e:
-        logger.error(f"Unexpected error in image-to-image: {e}", exc_info=True)
-        raise HTTPException(
-            status_code=500,
-            detail="服务器内部错误"
-        )
+        raise _to_http_exception(e, "image encoding")
+    
+    return Response(
+        content=content,
+        media_type=media_type,
+        headers={
+            "X-Inference-Time": str(metadata["inference_time"]),
+            "X-Width": str(image.width),
+            "X-Height": str(image.height),
+            # 响应头只能包含 latin-1 字符，使用 ASCII 转义的 JSON
+            "X-Metadata": json.dumps(metadata, ensure_ascii=True, separators=(",", ":"))
+        }
+    )
+
+
+# 流式编码 base64 的原始字节块大小，取 3 的倍数保证各块编码结果可直接拼接
+_STREAM_CHUNK_SIZE = 49152
+
+
+def _stream_image_json(buffer: io.BytesIO, metadata: Dict[str, Any]) -> Iterator[bytes]:
+    """
+    逐块生成与 ImageResponse 结构一致的 JSON，避免一次性构建完整的 base64 字符串
+
+    Args:
+        buffer: 已写入图像数据的缓冲区，生成结束后关闭
+        metadata: 响应元数据
+
+    Yields:
+        bytes: JSON 片段
+    """
+    with buffer, buffer.getbuffer() as view:
+        envelope = DefaultJSONResponse(content={
+            "success": True,
+            "metadata": metadata,
+            "error": None,
+            "image": ""
+        }).body
+        # 去掉末尾的 `"}`，得到以 `"image":"` 结尾的前缀
+        yield envelope[:-2]
+
+        # 直接从缓冲区的零拷贝视图按块编码，不复制出完整的图像字节
+        for offset in range(0, len(view), _STREAM_CHUNK_SIZE):
+            yield b64encode(view[offset:offset + _STREAM_CHUNK_SIZE])
+        yield b'"}'
+
+
+async def _streaming_image_response(image: Image.Image, metadata: Dict[str, Any],
+                                    request_processor, image_format: str) -> StreamingResponse:
+    """构建流式输出 base64 JSON 的响应；编码在线程池中执行，不阻塞事件循环"""
+    try:
+        buffer = await run_in_threadpool(request_processor.encode_image_buffer, image, image_format)
+    except Exception as e:
+        raise _to_http_exception(e, "image encoding")
+
+    response_metadata = {
+        "width": image.width,
+        "height": image.height,
+        "format": image_format.upper(),
+        "mode": request_processor.encoded_mode(image, image_format)
+    }
+    response_metadata.update(metadata)
+    return StreamingResponse(
+        _stream_image_json(buffer, response_metadata),
+        media_type="application/json"
+    )
+
+
+@router.post("/text-to-image", response_model=ImageResponse)
+async def text_to_image(
+    request: TextToImageRequest,
+    format: str = Query("jpeg", pattern="^(jpeg|png|webp)$", description="输出图像格式（需要无损时使用 png）"),
+    model_manager=Depends(get_ready_model_manager),
+    request_processor=Depends(get_request_processor)
+):
+    """
+    文生图 API 端点
+    
+    根据文本描述生成图像，图像以 base64 编码嵌入 JSON 返回
+    """
+    image, metadata = await _generate_text_to_image(request, model_manager, request_processor)
+    
+    # 格式化响应：图像编码和 base64 是 CPU 密集操作，放到线程池中执行
+    response = await run_in_threadpool(
+        request_processor.format_image_response, image, metadata, image_format=format
+    )
+    
+    # 直接返回已构建好的响应，跳过 response_model 对大体积 base64 数据的二次验证和序列化
+    return DefaultJSONResponse(content=response.model_dump())
+
+
+@router.post(
+    "/text-to-image/raw",
+    response_class=Response,
+    responses={200: {"content": {"image/png": {}, "image/jpeg": {}, "image/webp": {}}}}
+)
+async def text_to_image_raw(
+    request: TextToImageRequest,
+    format: str = Query("png", pattern="^(jpeg|png|webp)$", description="输出图像格式"),
+    model_manager=Depends(get_ready_model_manager),
+    request_processor=Depends(get_request_processor)
+):
+    """
+    文生图 API 端点（推荐）
+    
+    直接返回图像字节，元数据在 X-Metadata 响应头中，省去 base64 编解码和约 33% 的传输体积
+    """
+    image, metadata = await _generate_text_to_image(request, model_manager, request_processor)
+    return await _raw_image_response(image, metadata, request_processor, format)
+
+
+@router.post("/text-to-image/stream", response_model=ImageResponse)
+async def text_to_image_stream(
+    request: TextToImageRequest,
+    format: str = Query("jpeg", pattern="^(jpeg|png|webp)$", description="输出图像格式（需要无损时使用 png）"),
+    model_manager=Depends(get_ready_model_manager),
+    request_processor=Depends(get_request_processor)
+):
+    """
+    文生图 API 端点（流式）
+    
+    响应结构与 /text-to-image 相同，base64 数据分块编码并流式输出，不在内存中构建完整的响应体
+    """
+    image, metadata = await _generate_text_to_image(request, model_manager, request_processor)
+    return await _streaming_image_response(image, metadata, request_processor, format)
+
+
+@router.post("/image-to-image", response_model=ImageResponse)
+async def image_to_image(
+    image: UploadFile = File(..., description="输入图像文件"),
+    prompt: str = Form(..., description="文本描述"),
+    strength: float = Form(0.8, description="变换强度"),
+    width: int = Form(None, description="输出宽度"),
+    height: int = Form(None, description="输出高度"),
+    num_inference_steps: int = Form(20, description="推理步数"),
+    format: str = Query("jpeg", pattern="^(jpeg|png|webp)$", description="输出图像格式（需要无损时使用 png）"),
+    model_manager=Depends(get_ready_model_manager),
+    request_processor=Depends(get_request_processor)
+):
+    """
+    图生图 API 端点
+    
+    基于输入图像和文本描述生成新图像，图像以 base64 编码嵌入 JSON 返回
+    """
+    result_image, metadata = await _generate_image_to_image(
+        image, prompt, strength, width, height, num_inference_steps,
+        model_manager, request_processor
+    )
+    
+    # 格式化响应：图像编码和 base64 是 CPU 密集操作，放到线程池中执行
+    response = await run_in_threadpool(
+        request_processor.format_image_response, result_image, metadata, image_format=format
+    )
+    
+    # 直接返回已构建好的响应，跳过 response_model 对大体积 base64 数据的二次验证和序列化
+    return DefaultJSONResponse(content=response.model_dump())
+
+
+@router.post(
+    "/image-to-image/raw",
+    response_class=Response,
+    responses={200: {"content": {"image/png": {}, "image/jpeg": {}, "image/webp": {}}}}
+)
+async def image_to_image_raw(
+    image: UploadFile = File(..., description="输入图像文件"),
+    prompt: str = Form(..., description="文本描述"),
+    strength: float = Form(0.8, description="变换强度"),
+    width: int = Form(None, description="输出宽度"),
+    height: int = Form(None, description="输出高度"),
+    num_inference_steps: int = Form(20, description="推理步数"),
+    format: str = Query("png", pattern="^(jpeg|png|webp)$", description="输出图像格式"),
+    model_manager=Depends(get_ready_model_manager),
+    request_processor=Depends(get_request_processor)
+):
+    """
+    图生图 API 端点（推荐）
+    
+    直接返回图像字节，元数据在 X-Metadata 响应头中，省去 base64 编解码和约 33% 的传输体积
+    """
+    result_image, metadata = await _generate_image_to_image(
+        image, prompt, strength, width, height, num_inference_steps,
+        model_manager, request_processor
+    )
+    return await _raw_image_response(result_image, metadata, request_processor, format)
+
+
+@router.post("/image-to-image/stream", response_model=ImageResponse)
+async def image_to_image_stream(
+    image: UploadFile = File(..., description="输入图像文件"),
+    prompt: str = Form(..., description="文本描述"),
+    strength: float = Form(0.8, description="变换强度"),
+    width: int = Form(None, description="输出宽度"),
+    height: int = Form(None, description="输出高度"),
+    num_inference_steps: int = Form(20, description="推理步数"),
+    format: str = Query("jpeg", pattern="^(jpeg|png|webp)$", description="输出图像格式（需要无损时使用 png）"),
+    model_manager=Depends(get_ready_model_manager),
+    request_processor=Depends(get_request_processor)
+):
+    """
+    图生图 API 端点（流式）
+    
+    响应结构与 /image-to-image 相同，base64 数据分块编码并流式输出，不在内存中构建完整的响应体
+    """
+    result_image, metadata = await _generate_image_to_image(
+        image, prompt, strength, width, height, num_inference_steps,
+        model_manager, request_processor
+    )
+    return await _streaming_image_response(result_image, metadata, request_processor, format)
 
 
 @router.get("/health", response_model=HealthResponse)
@@ -270,17 +496,14 @@ async def health_check(
         if "gpu_info" in resource_stats:
             memory_usage["gpu"] = resource_stats["gpu_info"]
         
-        # 添加系统内存信息
-        try:
-            import psutil
-            system_memory = psutil.virtual_memory()
+        # 添加系统内存信息（读取后台采样快照）
+        system_memory = sysinfo_sampler.get_snapshot().get("memory")
+        if system_memory:
             memory_usage["system"] = {
-                "total_gb": round(system_memory.total / (1024**3), 2),
-                "available_gb": round(system_memory.available / (1024**3), 2),
-                "used_percent": system_memory.percent
+                "total_gb": round(system_memory["total"] / (1024**3), 2),
+                "available_gb": round(system_memory["available"] / (1024**3), 2),
+                "used_percent": system_memory["percent"]
             }
-        except ImportError:
-            pass
         
         # 确定服务状态
         status = "healthy" if model_loaded else "degraded"
@@ -288,6 +511,20 @@ async def health_check(
         # 获取服务运行时间
         uptime = qwen_api.get_uptime()
         
+        if status == "healthy":
+            # 状态字段的 JSON 前缀不变，只序列化会变化的内存信息、uptime 和 timestamp
+            body = b"".join((
+                qwen_api.get_health_prefix(model_loaded),
+                DefaultJSONResponse(content=memory_usage).body,
+                b',"uptime":',
+                repr(uptime).encode(),
+                b',"timestamp":"',
+                datetime.now().isoformat().encode(),
+                b'"}'
+            ))
+            logger.debug("Health check: status=healthy, model_loaded=True")
+            return Response(content=body, media_type="application/json")
+        
         response = HealthResponse(
             status=status,
             model_loaded=model_loaded,
@@ -312,6 +549,57 @@ async def health_check(
         )
 
 
+def _build_info_body(model_manager, request_processor) -> bytes:
+    """
+    生成 /info 响应体
+
+    Args:
+        model_manager: 模型管理器
+        request_processor: 请求处理器
+
+    Returns:
+        bytes: 序列化后的 InfoResponse
+    """
+    # 获取模型信息
+    model_info = model_manager.get_model_info()
+    
+    # 获取支持的格式
+    supported_formats = request_processor.get_supported_formats()
+    
+    # 获取支持的参数范围
+    format_info = model_manager.get_supported_formats()
+    
+    response = InfoResponse(
+        service_name="qwen-image-api-service",
+        version="1.0.0",
+        model_info={
+            "name": "qwen-image",
+            "loaded": model_info.get("loaded", False),
+            "device": model_info.get("device", "unknown"),
+            "dtype": model_info.get("torch_dtype", "unknown"),
+            "path": model_info.get("model_path", "")
+        },
+        supported_formats=supported_formats,
+        api_endpoints=[
+            "/text-to-image",
+            "/text-to-image/raw",
+            "/text-to-image/stream",
+            "/image-to-image", 
+            "/image-to-image/raw",
+            "/image-to-image/stream",
+            "/health",
+            "/info"
+        ]
+    )
+    
+    # 添加详细的格式和参数信息
+    response.model_info.update({
+        "supported_parameters": format_info
+    })
+    
+    return DefaultJSONResponse(content=response.model_dump()).body
+
+
 @router.get("/info", response_model=InfoResponse)
 async def service_info(
     model_manager=Depends(get_model_manager),
@@ -323,41 +611,14 @@ async def service_info(
     返回模型信息和 API 详情
     """
     try:
-        # 获取模型信息
-        model_info = model_manager.get_model_info()
-        
-        # 获取支持的格式
-        supported_formats = request_processor.get_supported_formats()
-        
-        # 获取支持的参数范围
-        format_info = model_manager.get_supported_formats()
-        
-        response = InfoResponse(
-            service_name="qwen-image-api-service",
-            version="1.0.0",
-            model_info={
-                "name": "qwen-image",
-                "loaded": model_info.get("loaded", False),
-                "device": model_info.get("device", "unknown"),
-                "dtype": model_info.get("torch_dtype", "unknown"),
-                "path": model_info.get("model_path", "")
-            },
-            supported_formats=supported_formats,
-            api_endpoints=[
-                "/text-to-image",
-                "/image-to-image", 
-                "/health",
-                "/info"
-            ]
+        # 模型加载状态不变时直接返回缓存的响应体
+        body = qwen_api.get_info_response(
+            model_manager.is_model_loaded(),
+            functools.partial(_build_info_body, model_manager, request_processor)
         )
         
-        # 添加详细的格式和参数信息
-        response.model_info.update({
-            "supported_parameters": format_info
-        })
-        
         logger.debug("Service info requested")
-        return response
+        return Response(content=body, media_type="application/json")
         
     except Exception as e:
         logger.error(f"Service info error: {e}", exc_info=True)
@@ -375,10 +636,8 @@ async def get_metrics():
     返回服务性能指标和统计信息
     """
     try:
-        from services.logging import performance_monitor, request_tracker
-        
-        # 获取性能指标
-        metrics = performance_monitor.get_metrics()
+        # 获取性能指标（复制顶层字典，不修改监控器缓存的快照）
+        metrics = dict(performance_monitor.get_metrics())
         
         # 获取活跃请求信息
         active_requests = request_tracker.get_active_requests()
@@ -389,25 +648,10 @@ async def get_metrics():
             "requests": list(active_requests.values())
         }
         
-        # 添加系统资源信息
-        try:
-            import psutil
-            system_info = {
-                "cpu_percent": psutil.cpu_percent(),
-                "memory": {
-                    "total": psutil.virtual_memory().total,
-                    "available": psutil.virtual_memory().available,
-                    "percent": psutil.virtual_memory().percent
-                },
-                "disk": {
-                    "total": psutil.disk_usage('/').total,
-                    "free": psutil.disk_usage('/').free,
-                    "percent": psutil.disk_usage('/').percent
-                }
-            }
+        # 添加系统资源信息（读取后台采样快照）
+        system_info = sysinfo_sampler.get_snapshot()
+        if system_info:
             metrics["system"] = system_info
-        except ImportError:
-            pass
         
         logger.debug("Metrics requested")
         return metrics
@@ -4,15 +4,28 @@
 负责从文件加载配置、处理默认值和配置合并逻辑。
 """
 
+import copy
 import os
 import yaml
 import json
 from pathlib import Path
-from typing import Dict, Any, Optional, Union
+from types import MappingProxyType
+from typing import Dict, Any, Mapping, Optional, Union
 import logging
 
 from .models import AppConfig, validate_config_dict, get_default_config
 
+# 优先使用 LibYAML 提供的 C 加载器
+try:
+    from yaml import CSafeLoader as _YamlLoader
+except ImportError:
+    from yaml import SafeLoader as _YamlLoader
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 logger = logging.getLogger(__name__)
 
 
@@ -29,6 +42,10 @@ class ConfigManager:
         self._config: Optional[AppConfig] = None
         self._config_path = config_path
         self._default_config = get_default_config()
+        # 已加载配置文件的 (路径, 修改时间, 大小)，未变化时跳过重新解析和验证
+        self._config_stamp: Optional[tuple] = None
+        # 各配置段的只读字典快照，配置重新加载时清空
+        self._section_dicts: Dict[str, Mapping[str, Any]] = {}
     
     def load_config(self, config_path: Optional[str] = None) -> AppConfig:
         """
@@ -50,12 +67,22 @@ class ConfigManager:
         if not self._config_path:
             logger.info("未指定配置文件，使用默认配置")
             self._config = validate_config_dict(self._default_config)
+            self._section_dicts = {}
+            self._config_stamp = None
             return self._config
         
         config_file = Path(self._config_path)
-        if not config_file.exists():
+        try:
+            stat = config_file.stat()
+        except FileNotFoundError:
             raise FileNotFoundError(f"配置文件不存在: {self._config_path}")
         
+        # 文件未变化时直接返回已验证的配置
+        stamp = (str(config_file.resolve()), stat.st_mtime_ns, stat.st_size)
+        if self._config is not None and stamp == self._config_stamp:
+            logger.debug(f"配置文件未变化，使用缓存配置: {self._config_path}")
+            return self._config
+        
         try:
             # 根据文件扩展名选择解析方法
             if config_file.suffix.lower() in ['.yaml', '.yml']:
@@ -70,6 +97,8 @@ class ConfigManager:
             
             # 验证配置
             self._config = validate_config_dict(merged_config)
+            self._section_dicts = {}
+            self._config_stamp = stamp
             
             logger.info(f"成功加载配置文件: {self._config_path}")
             return self._config
@@ -89,7 +118,7 @@ class ConfigManager:
         """
         try:
             with open(config_file, 'r', encoding='utf-8') as f:
-                return yaml.safe_load(f) or {}
+                return yaml.load(f, Loader=_YamlLoader) or {}
         except yaml.YAMLError as e:
             raise ValueError(f"YAML 格式错误: {str(e)}")
     
@@ -103,6 +132,12 @@ class ConfigManager:
         Returns:
             Dict[str, Any]: 配置字典
         """
+        if orjson is not None:
+            try:
+                return orjson.loads(config_file.read_bytes())
+            except orjson.JSONDecodeError as e:
+                raise ValueError(f"JSON 格式错误: {str(e)}")
+        
         try:
             with open(config_file, 'r', encoding='utf-8') as f:
                 return json.load(f)
@@ -120,15 +155,24 @@ class ConfigManager:
         Returns:
             Dict[str, Any]: 合并后的配置字典
         """
-        merged = default.copy()
+        # 深拷贝一次默认配置，之后原地合并，不修改传入的字典
+        merged = copy.deepcopy(default)
         
-        for key, value in file_config.items():
-            if key in merged and isinstance(merged[key], dict) and isinstance(value, dict):
-                # 递归合并嵌套字典
-                merged[key] = self._merge_configs(merged[key], value)
-            else:
-                # 直接覆盖或添加新键
-                merged[key] = value
+        # 文件配置为空时无需合并，但仍返回副本
+        if not file_config:
+            return merged
+        
+        # 用显式栈逐层合并嵌套字典，避免递归调用
+        stack = [(merged, file_config)]
+        while stack:
+            base, override = stack.pop()
+            for key, value in override.items():
+                current = base.get(key)
+                if isinstance(current, dict) and isinstance(value, dict):
+                    stack.append((current, value))
+                else:
+                    # 直接覆盖或添加新键
+                    base[key] = value
         
         return merged
     
@@ -146,35 +190,50 @@ class ConfigManager:
             raise RuntimeError("配置未加载，请先调用 load_config()")
         return self._config
     
-    def get_model_config(self) -> Dict[str, Any]:
+    def _get_section_dict(self, section: str) -> Mapping[str, Any]:
+        """
+        获取配置段的只读字典快照
+        
+        快照在首次访问时生成并缓存，以只读映射返回，调用方无法修改共享的快照。
+        
+        Args:
+            section: 配置段名称
+            
+        Returns:
+            Mapping[str, Any]: 配置段只读字典
+        """
+        snapshot = self._section_dicts.get(section)
+        if snapshot is None:
+            snapshot = MappingProxyType(getattr(self.get_config(), section).model_dump())
+            self._section_dicts[section] = snapshot
+        return snapshot
+    
+    def get_model_config(self) -> Mapping[str, Any]:
         """
         获取模型配置
         
         Returns:
-            Dict[str, Any]: 模型配置字典
+            Mapping[str, Any]: 模型配置只读字典
         """
-        config = self.get_config()
-        return config.model.dict()
+        return self._get_section_dict("model")
     
-    def get_server_config(self) -> Dict[str, Any]:
+    def get_server_config(self) -> Mapping[str, Any]:
         """
         获取服务器配置
         
         Returns:
-            Dict[str, Any]: 服务器配置字典
+            Mapping[str, Any]: 服务器配置只读字典
         """
-        config = self.get_config()
-        return config.server.dict()
+        return self._get_section_dict("server")
     
-    def get_log_config(self) -> Dict[str, Any]:
+    def get_log_config(self) -> Mapping[str, Any]:
         """
         获取日志配置
         
         Returns:
-            Dict[str, Any]: 日志配置字典
+            Mapping[str, Any]: 日志配置只读字典
         """
-        config = self.get_config()
-        return config.log.dict()
+        return self._get_section_dict("log")
     
     def validate_config(self) -> bool:
         """
@@ -219,6 +278,8 @@ class ConfigManager:
         """
         重新加载配置文件
         
+        文件的修改时间和大小均未变化时直接返回当前配置。
+        
         Returns:
             AppConfig: 重新加载的配置对象
         """
@@ -238,7 +299,7 @@ class ConfigManager:
             ValueError: 不支持的格式
         """
         config = self.get_config()
-        config_dict = config.dict()
+        config_dict = config.model_dump()
         
         output_file = Path(output_path)
         output_file.parent.mkdir(parents=True, exist_ok=True)
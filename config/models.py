@@ -4,44 +4,67 @@
 基于 Pydantic 的配置模型，提供数据验证和类型检查功能。
 """
 
-from pydantic import BaseModel, Field, validator
+from pydantic import BaseModel, ConfigDict, Field, field_validator
 from typing import Optional, Dict, Any
 import os
 
 
 class ModelConfig(BaseModel):
     """模型配置"""
+    model_config = ConfigDict(protected_namespaces=(), frozen=True)
+    
     model_path: str = Field(..., description="模型文件路径")
     device: str = Field("cuda", description="推理设备 (cuda/cpu)")
-    torch_dtype: str = Field("float16", description="PyTorch 数据类型")
+    torch_dtype: str = Field("bfloat16", description="PyTorch 数据类型")
+    quantization_method: str = Field("none", description="权重量化方式 (none/bnb_int8/fp8/quanto_fp8/torchao_int8/torchao_fp8)")
     max_memory: Optional[str] = Field(None, description="最大内存限制")
+    cache_interval: int = Field(1, ge=1, le=10, description="Transformer 块特征缓存间隔步数 (1 表示关闭)")
+    tensor_pool_enable: bool = Field(True, description="是否按形状复用图生图输入等临时张量")
+    vae_tile_size: int = Field(512, ge=0, le=2048, description="VAE 分块解码的块大小（像素），0 表示关闭分块和切片解码")
+    debug_stub: bool = Field(False, description="模拟实现是否在图像上绘制提示词摘要和参数（仅用于测试验证）")
     
-    @validator('model_path')
+    @field_validator('model_path')
+    @classmethod
     def validate_model_path(cls, v):
         if not v:
             raise ValueError("模型路径不能为空")
         return v
     
-    @validator('device')
+    @field_validator('device')
+    @classmethod
     def validate_device(cls, v):
         if v not in ['cuda', 'cpu', 'auto']:
             raise ValueError("设备类型必须是 'cuda', 'cpu' 或 'auto'")
         return v
     
-    @validator('torch_dtype')
+    @field_validator('torch_dtype')
+    @classmethod
     def validate_torch_dtype(cls, v):
-        valid_types = ['float16', 'float32', 'bfloat16']
+        valid_types = ['float16', 'float32', 'bfloat16', 'float8_e4m3fn', 'float8_e5m2']
         if v not in valid_types:
             raise ValueError(f"torch_dtype 必须是 {valid_types} 中的一个")
         return v
+    
+    @field_validator('quantization_method')
+    @classmethod
+    def validate_quantization_method(cls, v):
+        valid_methods = ['none', 'bnb_int8', 'fp8', 'quanto_fp8', 'torchao_int8', 'torchao_fp8']
+        if v not in valid_methods:
+            raise ValueError(f"quantization_method 必须是 {valid_methods} 中的一个")
+        return v
 
 
 class SecurityConfig(BaseModel):
     """安全配置"""
+    model_config = ConfigDict(frozen=True)
+    
     enable_rate_limiting: bool = Field(True, description="启用速率限制")
     requests_per_minute: int = Field(60, ge=1, le=1000, description="每分钟请求限制")
     requests_per_hour: int = Field(1000, ge=1, le=10000, description="每小时请求限制")
     burst_size: int = Field(10, ge=1, le=100, description="突发请求限制")
+    rate_limit_remaining_headers: bool = Field(True, description="是否返回剩余请求数响应头")
+    rate_limit_max_clients: int = Field(65536, ge=64, description="速率限制最多追踪的客户端数")
+    rate_limit_prune_interval: int = Field(60, ge=1, le=3600, description="清理过期客户端的间隔 (秒)")
     enable_file_validation: bool = Field(True, description="启用文件验证")
     allowed_file_types: list = Field(
         default=["image/jpeg", "image/png", "image/webp", "image/bmp", "image/tiff"],
@@ -51,14 +74,22 @@ class SecurityConfig(BaseModel):
 
 class ServerConfig(BaseModel):
     """服务器配置"""
+    model_config = ConfigDict(frozen=True)
+    
     host: str = Field("0.0.0.0", description="服务器主机地址")
     port: int = Field(8000, ge=1, le=65535, description="服务器端口")
     max_file_size: int = Field(10 * 1024 * 1024, ge=1024, description="最大文件大小 (字节)")
     max_concurrent_requests: int = Field(4, ge=1, le=100, description="最大并发请求数")
     request_timeout: int = Field(300, ge=10, le=3600, description="请求超时时间 (秒)")
     queue_timeout: int = Field(30, ge=5, le=300, description="队列等待超时时间 (秒)")
+    max_batch_size: int = Field(4, ge=1, le=32, description="文生图动态批处理的最大批大小")
+    batch_window_ms: int = Field(50, ge=0, le=1000, description="动态批处理凑批等待时间 (毫秒)")
+    batch_queue_size: int = Field(64, ge=1, le=4096, description="动态批处理等待队列的最大请求数")
+    sysinfo_interval: float = Field(2.0, ge=0.1, le=60, description="系统资源后台采样间隔 (秒)")
+    warmup: bool = Field(True, description="模型加载后是否执行预热推理")
     
-    @validator('host')
+    @field_validator('host')
+    @classmethod
     def validate_host(cls, v):
         if not v:
             raise ValueError("主机地址不能为空")
@@ -67,14 +98,19 @@ class ServerConfig(BaseModel):
 
 class LogConfig(BaseModel):
     """日志配置"""
+    model_config = ConfigDict(frozen=True)
+    
     level: str = Field("INFO", description="日志级别")
     format: str = Field(
         "%(asctime)s - %(name)s - %(levelname)s - %(message)s",
         description="日志格式"
     )
     file_path: Optional[str] = Field(None, description="日志文件路径")
+    verbose_requests: bool = Field(False, description="是否为每个请求额外输出简要请求行")
+    tracing_enabled: bool = Field(True, description="是否启用请求追踪（请求 ID、活跃请求追踪和性能指标）")
     
-    @validator('level')
+    @field_validator('level')
+    @classmethod
     def validate_level(cls, v):
         valid_levels = ['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL']
         if v.upper() not in valid_levels:
@@ -89,8 +125,8 @@ class AppConfig(BaseModel):
     security: SecurityConfig = SecurityConfig()
     log: LogConfig = LogConfig()
     
-    class Config:
-        extra = "forbid"  # 禁止额外字段
+    # 禁止额外字段；配置加载后整体不可修改
+    model_config = ConfigDict(extra="forbid", frozen=True)
 
 
 def validate_config_dict(config_dict: Dict[str, Any]) -> AppConfig:
@@ -123,8 +159,13 @@ def get_default_config() -> Dict[str, Any]:
         "model": {
             "model_path": "",
             "device": "cuda",
-            "torch_dtype": "float16",
-            "max_memory": None
+            "torch_dtype": "bfloat16",
+            "quantization_method": "none",
+            "max_memory": None,
+            "cache_interval": 1,
+            "tensor_pool_enable": True,
+            "vae_tile_size": 512,
+            "debug_stub": False
         },
         "server": {
             "host": "0.0.0.0",
@@ -132,7 +173,12 @@ def get_default_config() -> Dict[str, Any]:
             "max_file_size": 10 * 1024 * 1024,
             "max_concurrent_requests": 4,
             "request_timeout": 300,
-            "queue_timeout": 30
+            "queue_timeout": 30,
+            "max_batch_size": 4,
+            "batch_window_ms": 50,
+            "batch_queue_size": 64,
+            "sysinfo_interval": 2.0,
+            "warmup": True
         },
         "security": {
             "enable_rate_limiting": True,
@@ -145,6 +191,8 @@ def get_default_config() -> Dict[str, Any]:
         "log": {
             "level": "INFO",
             "format": "%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-            "file_path": None
+            "file_path": None,
+            "verbose_requests": False,
+            "tracing_enabled": True
         }
     }
\ No newline at end of file
@@ -10,7 +10,7 @@ from pathlib import Path
 import uvicorn
 
 from config.manager import init_config
-from api import app
+from api import get_app
 
 # 设置日志
 logging.basicConfig(
@@ -106,12 +106,14 @@ def main():
         logger.info(f"Model path: {config.model.model_path or 'Not configured'}")
         logger.info(f"Device: {config.model.device}")
         
-        # 启动服务器
+        # 启动服务器（配置加载完成后再创建应用）
         uvicorn.run(
-            app,
+            get_app(),
             host=host,
             port=port,
             reload=args.reload,
+            # 每个工作进程都会加载一份模型，固定为单进程
+            workers=1,
             log_level=args.log_level.lower(),
             access_log=True
         )
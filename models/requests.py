@@ -4,7 +4,7 @@ API 请求模型定义
 包含文生图和图生图的请求数据模型，使用 Pydantic 进行数据验证。
 """
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 from typing import Optional
 
 
@@ -41,17 +41,32 @@ class TextToImageRequest(BaseModel):
         le=20.0,
         description="引导比例"
     )
+    cache_interval: Optional[int] = Field(
+        None,
+        ge=1,
+        le=10,
+        description="特征缓存间隔步数，未设置时使用服务端配置；服务端未启用特征缓存时忽略"
+    )
+
+    def can_batch(self, other: "TextToImageRequest") -> bool:
+        """判断能否与另一个请求合并为同一批次推理（生成参数完全一致）"""
+        return (
+            self.width == other.width
+            and self.height == other.height
+            and self.num_inference_steps == other.num_inference_steps
+            and self.guidance_scale == other.guidance_scale
+            and self.cache_interval == other.cache_interval
+        )
 
-    class Config:
-        schema_extra = {
-            "example": {
-                "prompt": "一只可爱的小猫坐在花园里",
-                "width": 512,
-                "height": 512,
-                "num_inference_steps": 20,
-                "guidance_scale": 7.5
-            }
+    model_config = ConfigDict(frozen=True, json_schema_extra={
+        "example": {
+            "prompt": "一只可爱的小猫坐在花园里",
+            "width": 512,
+            "height": 512,
+            "num_inference_steps": 20,
+            "guidance_scale": 7.5
         }
+    })
 
 
 class ImageToImageRequest(BaseModel):
@@ -88,13 +103,12 @@ class ImageToImageRequest(BaseModel):
         description="推理步数"
     )
 
-    class Config:
-        schema_extra = {
-            "example": {
-                "prompt": "将这张图片转换为水彩画风格",
-                "strength": 0.8,
-                "width": 512,
-                "height": 512,
-                "num_inference_steps": 20
-            }
-        }
\ No newline at end of file
+    model_config = ConfigDict(frozen=True, json_schema_extra={
+        "example": {
+            "prompt": "将这张图片转换为水彩画风格",
+            "strength": 0.8,
+            "width": 512,
+            "height": 512,
+            "num_inference_steps": 20
+        }
+    })
\ No newline at end of file
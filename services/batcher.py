@@ -0,0 +1,207 @@
+"""
+动态批处理器
+
+将参数相同的并发文生图请求合并为一次批量推理，减少逐个请求串行占用 GPU 的开销。
+"""
+
+import asyncio
+import logging
+from collections import deque
+from concurrent.futures import Executor
+from typing import Deque, List, Optional, Tuple
+
+from PIL import Image
+
+from models.requests import TextToImageRequest
+from .exceptions import ResourceError, ValidationError
+
+
+logger = logging.getLogger(__name__)
+
+_Item = Tuple[TextToImageRequest, asyncio.Future]
+
+
+class DynamicBatcher:
+    """文生图动态批处理器
+
+    请求通过 submit() 进入队列，由单个后台工作协程取出。工作协程在收到第一个请求后
+    等待一个短暂的缓冲窗口，收集最多 max_batch_size 个 can_batch 兼容的请求，
+    然后调用 model_manager.text_to_image_batch() 一次完成推理，并将结果分发给各请求。
+    不兼容的请求保留到下一批优先处理。排队请求数超过 max_queue_size 时 submit() 直接拒绝。
+    """
+
+    def __init__(self, model_manager, max_batch_size: int = 4, batch_window: float = 0.05,
+                 executor: Optional[Executor] = None, max_queue_size: int = 64):
+        """
+        初始化批处理器
+
+        Args:
+            model_manager: 模型管理器，需提供 text_to_image_batch 方法
+            max_batch_size: 单批最大请求数
+            batch_window: 收到首个请求后等待凑批的时间 (秒)
+            executor: 执行批量推理的执行器，为 None 时使用事件循环默认线程池
+            max_queue_size: 等待凑批的最大请求数
+        """
+        self.model_manager = model_manager
+        self.max_batch_size = max_batch_size
+        self.batch_window = batch_window
+        self.executor = executor
+
+        self._queue: "asyncio.Queue[_Item]" = asyncio.Queue(maxsize=max_queue_size)
+        self._deferred: Deque[_Item] = deque()
+        self._worker: Optional[asyncio.Task] = None
+
+    @property
+    def is_running(self) -> bool:
+        """工作协程是否在运行"""
+        return self._worker is not None and not self._worker.done()
+
+    def start(self) -> None:
+        """启动后台工作协程"""
+        if not self.is_running:
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        """停止工作协程，并让尚未处理的请求以错误结束"""
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+        pending = list(self._deferred)
+        self._deferred.clear()
+        while not self._queue.empty():
+            pending.append(self._queue.get_nowait())
+        for _, future in pending:
+            if not future.done():
+                future.set_exception(RuntimeError("Batcher stopped"))
+
+    async def submit(self, request: TextToImageRequest) -> Image.Image:
+        """
+        提交文生图请求并等待结果
+
+        Args:
+            request: 文生图请求
+
+        Returns:
+            PIL.Image.Image: 生成的图像
+
+        Raises:
+            ResourceError: 排队请求已满
+        """
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((request, future))
+        except asyncio.QueueFull:
+            raise ResourceError("Batch queue is full", resource_type="batch_queue")
+        return await future
+
+    async def _next_item(self) -> _Item:
+        """优先取出上一批遗留的请求"""
+        if self._deferred:
+            return self._deferred.popleft()
+        return await self._queue.get()
+
+    async def _collect(self) -> List[_Item]:
+        """收集一批参数兼容的请求"""
+        loop = asyncio.get_running_loop()
+        first = await self._next_item()
+        batch = [first]
+        deadline = loop.time() + self.batch_window
+
+        # 先合并遗留请求中兼容的部分，其余保持原有顺序
+        if self._deferred:
+            remaining: Deque[_Item] = deque()
+            for item in self._deferred:
+                if len(batch) < self.max_batch_size and item[0].can_batch(first[0]):
+                    batch.append(item)
+                else:
+                    remaining.append(item)
+            self._deferred = remaining
+
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(self._queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            if item[0].can_batch(first[0]):
+                batch.append(item)
+            else:
+                self._deferred.append(item)
+
+        return batch
+
+    async def _run(self) -> None:
+        """工作协程主循环"""
+        while True:
+            batch = await self._collect()
+
+            # 丢弃客户端已放弃的请求
+            batch = [item for item in batch if not item[1].done()]
+            if not batch:
+                continue
+
+            try:
+                await self._process(batch)
+            except asyncio.CancelledError:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(RuntimeError("Batcher stopped"))
+                raise
+
+    async def _process(self, batch: List[_Item]) -> None:
+        """
+        执行一批推理并分发结果
+
+        参数校验或资源（如按批估算的显存）检查失败时无法判断是否与单个请求有关，
+        多请求的批次改为逐个重试，避免一个请求或批大小本身让同批的其他请求一起失败。
+
+        Args:
+            batch: 参数兼容的请求及其 future
+        """
+        loop = asyncio.get_running_loop()
+        first = batch[0][0]
+        prompts = [request.prompt for request, _ in batch]
+        try:
+            images = await loop.run_in_executor(
+                self.executor,
+                lambda: self.model_manager.text_to_image_batch(
+                    prompts=prompts,
+                    width=first.width,
+                    height=first.height,
+                    num_inference_steps=first.num_inference_steps,
+                    guidance_scale=first.guidance_scale,
+                    cache_interval=first.cache_interval
+                )
+            )
+        except (ValidationError, ResourceError) as e:
+            if len(batch) == 1:
+                self._fail(batch, e)
+                return
+            logger.warning(f"Batched inference rejected ({e}), retrying {len(batch)} requests one by one")
+            for item in batch:
+                if not item[1].done():
+                    await self._process([item])
+            return
+        except Exception as e:
+            logger.error(f"Batched inference failed for {len(batch)} requests: {e}")
+            self._fail(batch, e)
+            return
+
+        logger.debug(f"Batched inference completed for {len(batch)} requests")
+        for (_, future), image in zip(batch, images):
+            if not future.done():
+                future.set_result(image)
+
+    @staticmethod
+    def _fail(batch: List[_Item], error: Exception) -> None:
+        """让批次中尚未完成的请求以同一异常结束"""
+        for _, future in batch:
+            if not future.done():
+                future.set_exception(error)
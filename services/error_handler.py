@@ -5,16 +5,17 @@
 """
 
 import traceback
+from datetime import datetime
+from operator import attrgetter
 from typing import Dict, Any, Optional, Type
 from enum import Enum
 
 from fastapi import HTTPException, Request
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 from fastapi.exceptions import RequestValidationError
 from starlette.exceptions import HTTPException as StarletteHTTPException
 from pydantic import ValidationError
 
-from models.responses import ErrorResponse
 from services.logging import get_logger, performance_monitor
 from services.exceptions import (
     ModelNotLoadedError, InferenceError, ValidationError as CustomValidationError,
@@ -23,6 +24,42 @@ from services.exceptions import (
 
 logger = get_logger(__name__)
 
+# 优先使用 orjson 序列化响应，未安装时回退到标准库实现
+try:
+    import orjson
+    from fastapi.responses import ORJSONResponse as DefaultJSONResponse
+
+    def _json_dumps(content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+except ImportError:
+    import json
+
+    DefaultJSONResponse = JSONResponse
+
+    def _json_dumps(content: Any) -> bytes:
+        return json.dumps(
+            content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")
+        ).encode("utf-8")
+
+
+# 预先生成的 HTTP 状态码错误代码，避免每次错误都格式化字符串
+_HTTP_CODE_NAMES: Dict[int, str] = {code: f"HTTP_{code}" for code in range(100, 600)}
+
+
+def _http_error_code(exc: HTTPException) -> str:
+    """HTTPException 对应的错误代码"""
+    code = _HTTP_CODE_NAMES.get(exc.status_code)
+    return code if code is not None else f"HTTP_{exc.status_code}"
+
+
+def _envelope_prefix(code: str, message: str, category: "ErrorCategory") -> bytes:
+    """序列化错误响应中 details 之前的固定部分，details 和结尾的 }} 在请求时拼接"""
+    body = _json_dumps({
+        "success": False,
+        "error": {"code": code, "message": message, "category": category.value, "details": None}
+    })
+    return body[:-len(b"null}}")]
+
 
 class ErrorCategory(Enum):
     """错误分类"""
@@ -81,102 +118,131 @@ class ErrorCode(Enum):
     SERVICE_OVERLOADED = "SERVICE_OVERLOADED"
 
 
+# 错误处理路径上用到的枚举值，预先取出为字符串常量，避免每次访问 .value
+_VALIDATION_ERROR = ErrorCode.VALIDATION_ERROR.value
+_MODEL_NOT_LOADED = ErrorCode.MODEL_NOT_LOADED.value
+_INFERENCE_ERROR = ErrorCode.INFERENCE_ERROR.value
+_MEMORY_ERROR = ErrorCode.MEMORY_ERROR.value
+_RESOURCE_ERROR = ErrorCode.RESOURCE_ERROR.value
+_GATEWAY_TIMEOUT = ErrorCode.GATEWAY_TIMEOUT.value
+_NOT_FOUND = ErrorCode.NOT_FOUND.value
+_FORBIDDEN = ErrorCode.FORBIDDEN.value
+_INTERNAL_SERVER_ERROR = ErrorCode.INTERNAL_SERVER_ERROR.value
+_UNKNOWN_ERROR_CATEGORY = ErrorCategory.UNKNOWN_ERROR.value
+
+
 class ErrorHandler:
     """统一错误处理器"""
     
     def __init__(self):
         self.error_mappings = self._setup_error_mappings()
+        
+        # 预先序列化固定错误的响应外壳，请求时只序列化 details
+        for mapping in self.error_mappings.values():
+            mapping["category_value"] = mapping["category"].value
+            fields = (mapping["code"], mapping["message"], mapping["status_code"])
+            mapping["envelope"] = (
+                None if any(callable(field) for field in fields)
+                else _envelope_prefix(mapping["code"], mapping["message"], mapping["category"])
+            )
+        self._unknown_envelope = _envelope_prefix(
+            _INTERNAL_SERVER_ERROR, "服务器内部错误", ErrorCategory.UNKNOWN_ERROR
+        )
     
     def _setup_error_mappings(self) -> Dict[Type[Exception], Dict[str, Any]]:
-        """设置错误映射"""
+        """设置错误映射
+
+        code、message、status_code 为固定值，或接收异常实例返回对应值的可调用对象。
+        三者都是固定值时，初始化时会为该映射预先序列化响应外壳。
+        """
         return {
             # FastAPI 异常
             HTTPException: {
                 "category": ErrorCategory.CLIENT_ERROR,
-                "get_code": lambda e: f"HTTP_{e.status_code}",
-                "get_message": lambda e: e.detail,
-                "get_status_code": lambda e: e.status_code
+                "code": _http_error_code,
+                "message": attrgetter("detail"),
+                "status_code": attrgetter("status_code")
             },
             
             # 请求验证异常
             RequestValidationError: {
                 "category": ErrorCategory.VALIDATION_ERROR,
-                "get_code": lambda e: ErrorCode.VALIDATION_ERROR.value,
-                "get_message": lambda e: "请求参数验证失败",
-                "get_status_code": lambda e: 422
+                "code": _VALIDATION_ERROR,
+                "message": "请求参数验证失败",
+                "status_code": 422
             },
             
             # Pydantic 验证异常
             ValidationError: {
                 "category": ErrorCategory.VALIDATION_ERROR,
-                "get_code": lambda e: ErrorCode.VALIDATION_ERROR.value,
-                "get_message": lambda e: "数据验证失败",
-                "get_status_code": lambda e: 422
+                "code": _VALIDATION_ERROR,
+                "message": "数据验证失败",
+                "status_code": 422
             },
             
             # 自定义异常
             ModelNotLoadedError: {
                 "category": ErrorCategory.MODEL_ERROR,
-                "get_code": lambda e: ErrorCode.MODEL_NOT_LOADED.value,
-                "get_message": lambda e: "模型未加载",
-                "get_status_code": lambda e: 503
+                "code": _MODEL_NOT_LOADED,
+                "message": "模型未加载",
+                "status_code": 503
             },
             
             InferenceError: {
                 "category": ErrorCategory.MODEL_ERROR,
-                "get_code": lambda e: ErrorCode.INFERENCE_ERROR.value,
-                "get_message": lambda e: f"模型推理失败: {str(e)}",
-                "get_status_code": lambda e: 500
+                "code": _INFERENCE_ERROR,
+                "message": "模型推理失败: {}".format,
+                "status_code": 500
             },
             
             CustomValidationError: {
                 "category": ErrorCategory.VALIDATION_ERROR,
-                "get_code": lambda e: ErrorCode.VALIDATION_ERROR.value,
-                "get_message": lambda e: f"参数验证失败: {str(e)}",
-                "get_status_code": lambda e: 400
+                "code": _VALIDATION_ERROR,
+                "message": "参数验证失败: {}".format,
+                "status_code": 400
             },
             
             CustomMemoryError: {
                 "category": ErrorCategory.RESOURCE_ERROR,
-                "get_code": lambda e: ErrorCode.MEMORY_ERROR.value,
-                "get_message": lambda e: f"内存不足: {str(e)}",
-                "get_status_code": lambda e: 503
+                "code": _MEMORY_ERROR,
+                "message": "内存不足: {}".format,
+                "status_code": 503
             },
             
             ResourceError: {
                 "category": ErrorCategory.RESOURCE_ERROR,
-                "get_code": lambda e: ErrorCode.RESOURCE_ERROR.value,
-                "get_message": lambda e: f"资源错误: {str(e)}",
-                "get_status_code": lambda e: 503
+                "code": _RESOURCE_ERROR,
+                "message": "资源错误: {}".format,
+                "status_code": 503
             },
             
             # 系统异常
             MemoryError: {
                 "category": ErrorCategory.RESOURCE_ERROR,
-                "get_code": lambda e: ErrorCode.MEMORY_ERROR.value,
-                "get_message": lambda e: "系统内存不足",
-                "get_status_code": lambda e: 503
+                "code": _MEMORY_ERROR,
+                "message": "系统内存不足",
+                "status_code": 503
             },
             
             TimeoutError: {
                 "category": ErrorCategory.SERVER_ERROR,
-                "get_code": lambda e: ErrorCode.GATEWAY_TIMEOUT.value,
-                "get_message": lambda e: "请求超时",
-                "get_status_code": lambda e: 504
+                "code": _GATEWAY_TIMEOUT,
+                "message": "请求超时",
+                "status_code": 504
             },
             
             FileNotFoundError: {
                 "category": ErrorCategory.CLIENT_ERROR,
-                "get_code": lambda e: ErrorCode.NOT_FOUND.value,
-                "get_message": lambda e: "文件未找到",
-                "get_status_code": lambda e: 404
+                "code": _NOT_FOUND,
+                "message": "文件未找到",
+                "status_code": 404
             },
             
             PermissionError: {
                 "category": ErrorCategory.CLIENT_ERROR,
-                "get_code": lambda e: ErrorCode.FORBIDDEN.value,
-                "get_message": lambda e: "权限不足",
-                "get_status_code": lambda e: 403
+                "code": _FORBIDDEN,
+                "message": "权限不足",
+                "status_code": 403
             }
         }
     
@@ -185,11 +251,11 @@ class ErrorHandler:
         request: Request,
         exc: Exception,
         include_traceback: bool = False
-    ) -> JSONResponse:
+    ) -> Response:
         """处理异常并返回统一格式的响应"""
         
-        # 获取错误信息
-        error_info = self._get_error_info(exc)
+        # 获取错误信息，错误响应和日志共用同一个时间戳
+        error_info = self._get_error_info(exc, ts=datetime.now().isoformat())
         
         # 记录错误日志
         self._log_error(request, exc, error_info)
@@ -199,7 +265,7 @@ class ErrorHandler:
             endpoint=request.url.path,
             duration=0.0,  # 在中间件中会更新
             status_code=error_info["status_code"],
-            error_type=error_info["category"].value
+            error_type=error_info["category_value"]
         )
         
         # 构建错误响应
@@ -221,49 +287,71 @@ class ErrorHandler:
         if include_traceback:
             error_details["traceback"] = traceback.format_exc()
         
-        error_response = ErrorResponse(
-            error={
-                "code": error_info["code"],
-                "message": error_info["message"],
-                "category": error_info["category"].value,
-                "details": error_details
-            }
-        )
+        # 固定错误直接拼接预先序列化的响应外壳
+        envelope = error_info["envelope"]
+        if envelope is not None:
+            return Response(
+                content=b"".join((envelope, _json_dumps(error_details), b"}}")),
+                status_code=error_info["status_code"],
+                media_type="application/json"
+            )
         
-        return JSONResponse(
+        # 错误响应完全由服务端组装，直接按 ErrorResponse 结构构建字典并序列化
+        return DefaultJSONResponse(
             status_code=error_info["status_code"],
-            content=error_response.dict()
+            content={
+                "success": False,
+                "error": {
+                    "code": error_info["code"],
+                    "message": error_info["message"],
+                    "category": error_info["category_value"],
+                    "details": error_details
+                }
+            }
         )
     
-    def _get_error_info(self, exc: Exception) -> Dict[str, Any]:
-        """获取错误信息"""
-        from datetime import datetime
+    def _get_error_info(self, exc: Exception, ts: Optional[str] = None) -> Dict[str, Any]:
+        """获取错误信息
+        
+        Args:
+            exc: 异常实例
+            ts: 错误发生时间 (ISO 格式)，为空时取当前时间
+        """
+        if ts is None:
+            ts = datetime.now().isoformat()
         
         exc_type = type(exc)
         
-        # 查找匹配的错误映射
+        # 沿异常类的 MRO 查找最具体的错误映射
         mapping = None
-        for error_type, error_mapping in self.error_mappings.items():
-            if isinstance(exc, error_type):
-                mapping = error_mapping
+        for cls in exc_type.__mro__:
+            mapping = self.error_mappings.get(cls)
+            if mapping is not None:
                 break
         
         if mapping:
+            code = mapping["code"]
+            message = mapping["message"]
+            status_code = mapping["status_code"]
             return {
                 "category": mapping["category"],
-                "code": mapping["get_code"](exc),
-                "message": mapping["get_message"](exc),
-                "status_code": mapping["get_status_code"](exc),
-                "timestamp": datetime.now().isoformat()
+                "category_value": mapping["category_value"],
+                "code": code(exc) if callable(code) else code,
+                "message": message(exc) if callable(message) else message,
+                "status_code": status_code(exc) if callable(status_code) else status_code,
+                "timestamp": ts,
+                "envelope": mapping["envelope"]
             }
         else:
             # 未知错误的默认处理
             return {
                 "category": ErrorCategory.UNKNOWN_ERROR,
-                "code": ErrorCode.INTERNAL_SERVER_ERROR.value,
+                "category_value": _UNKNOWN_ERROR_CATEGORY,
+                "code": _INTERNAL_SERVER_ERROR,
                 "message": "服务器内部错误",
                 "status_code": 500,
-                "timestamp": datetime.now().isoformat()
+                "timestamp": ts,
+                "envelope": self._unknown_envelope
             }
     
     def _log_error(self, request: Request, exc: Exception, error_info: Dict[str, Any]):
@@ -281,7 +369,7 @@ class ErrorHandler:
         # 构建日志上下文
         log_context = {
             "error_code": error_info["code"],
-            "error_category": error_info["category"].value,
+            "error_category": error_info["category_value"],
             "status_code": status_code,
             "path": str(request.url.path),
             "method": request.method,
@@ -304,20 +392,27 @@ class ErrorHandler:
         )
     
     def _get_client_ip(self, request: Request) -> str:
-        """获取客户端 IP 地址"""
-        # 优先使用 X-Forwarded-For 头
-        forwarded_for = request.headers.get("x-forwarded-for")
-        if forwarded_for:
-            return forwarded_for.split(",")[0].strip()
+        """获取客户端 IP 地址
+        
+        直接扫描一遍 ASGI scope 中的原始请求头，不构建 Headers 对象。
+        """
+        real_ip = None
+        for name, value in request.scope.get("headers", ()):
+            # 优先使用 X-Forwarded-For 头
+            if name == b"x-forwarded-for" and value:
+                index = value.find(b",")
+                return (value if index < 0 else value[:index]).strip().decode("latin-1")
+            # 其次使用 X-Real-IP 头
+            if name == b"x-real-ip" and value and real_ip is None:
+                real_ip = value
         
-        # 使用 X-Real-IP 头
-        real_ip = request.headers.get("x-real-ip")
-        if real_ip:
-            return real_ip
+        if real_ip is not None:
+            return real_ip.decode("latin-1")
         
         # 使用客户端 IP
-        if request.client:
-            return request.client.host
+        client = request.scope.get("client")
+        if client:
+            return client[0]
         
         return "unknown"
 
@@ -334,15 +429,14 @@ def create_error_response(
 ) -> JSONResponse:
     """创建标准错误响应"""
     
-    error_response = ErrorResponse(
-        error={
-            "code": code,
-            "message": message,
-            "details": details or {}
-        }
-    )
-    
-    return JSONResponse(
+    return DefaultJSONResponse(
         status_code=status_code,
-        content=error_response.dict()
+        content={
+            "success": False,
+            "error": {
+                "code": code,
+                "message": message,
+                "details": details or {}
+            }
+        }
     )
\ No newline at end of file
@@ -4,24 +4,59 @@
 提供统一的日志记录、请求追踪和性能监控功能。
 """
 
+import asyncio
+import atexit
+import itertools
 import logging
+import os
+import queue
+import threading
 import time
-import uuid
+from collections import Counter
 from datetime import datetime
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional, Tuple
 from contextvars import ContextVar
 from functools import wraps
+from logging.handlers import QueueHandler, QueueListener
 
 import structlog
 from structlog.stdlib import LoggerFactory
 
+# JSON 日志优先使用 orjson 序列化，未安装时使用 structlog 默认的 json.dumps
+try:
+    import orjson
+
+    def _orjson_serializer(event_dict: Dict[str, Any], default=None, **kwargs) -> str:
+        return orjson.dumps(event_dict, default=default, option=orjson.OPT_NON_STR_KEYS).decode()
+except ImportError:
+    _orjson_serializer = None
+
 # 请求上下文变量
 request_id_var: ContextVar[str] = ContextVar('request_id', default='')
 user_id_var: ContextVar[str] = ContextVar('user_id', default='')
+# 当前请求的 (请求 ID, 单调起始时间)
+_request_start_var: ContextVar[Optional[Tuple[str, float]]] = ContextVar('request_start', default=None)
+
+# 后台日志写入线程，及根日志器上向它投递记录的队列处理器
+_log_listener: Optional[QueueListener] = None
+_queue_handler: Optional[QueueHandler] = None
+
+# 按名称缓存的结构化日志器
+_logger_cache: Dict[Optional[str], Any] = {}
+
+# 请求 ID 序号计数器（进程内单调递增）
+_request_counter = itertools.count()
 
 
 class RequestTracker:
-    """请求追踪器"""
+    """请求追踪器
+
+    请求的单调起始时间保存在上下文变量中，结束时直接计算耗时。
+
+    活跃请求表仍然保留：/metrics 需要列出其他请求上下文中的活跃请求，上下文变量
+    无法跨请求枚举。表只做单次的插入和弹出操作（在 GIL 下均为原子操作），
+    不做先检查后修改的组合操作，因此无需加锁。
+    """
     
     def __init__(self):
         self.active_requests: Dict[str, Dict[str, Any]] = {}
@@ -37,20 +72,28 @@ class RequestTracker:
             "timestamp": datetime.now().isoformat()
         }
         
+        _request_start_var.set((request_id, time.perf_counter()))
         self.active_requests[request_id] = request_info
         return request_info
     
     def end_request(self, request_id: str, status_code: int, error: str = None) -> Dict[str, Any]:
         """结束请求追踪"""
-        if request_id not in self.active_requests:
+        request_info = self.active_requests.pop(request_id, None)
+        if request_info is None:
             return {}
         
-        request_info = self.active_requests.pop(request_id)
         end_time = time.time()
         
+        # 在同一请求上下文中结束时使用单调时钟计算耗时
+        started = _request_start_var.get()
+        if started is not None and started[0] == request_id:
+            duration = time.perf_counter() - started[1]
+        else:
+            duration = end_time - request_info["start_time"]
+        
         request_info.update({
             "end_time": end_time,
-            "duration": end_time - request_info["start_time"],
+            "duration": duration,
             "status_code": status_code,
             "error": error
         })
@@ -63,62 +106,96 @@ class RequestTracker:
 
 
 class PerformanceMonitor:
-    """性能监控器"""
+    """性能监控器
+
+    按端点分配整数编号，计数、累计耗时（纳秒）和错误数分别存放在按编号索引的列表中。
+    记录时只在锁内做整数累加，平均耗时在 get_metrics() 时再计算。
+    计算结果缓存到下一次记录为止，指标没有变化时重复读取不再重建字典。
+    """
     
     def __init__(self):
-        self.metrics = {
-            "request_count": 0,
-            "error_count": 0,
-            "total_duration": 0.0,
-            "avg_duration": 0.0,
-            "endpoint_stats": {},
-            "error_stats": {}
-        }
+        self._lock = threading.Lock()
+        self._version = 0
+        self.reset_metrics()
     
     def record_request(self, endpoint: str, duration: float, status_code: int, error_type: str = None):
         """记录请求指标"""
-        self.metrics["request_count"] += 1
-        self.metrics["total_duration"] += duration
-        self.metrics["avg_duration"] = self.metrics["total_duration"] / self.metrics["request_count"]
+        duration_ns = int(duration * 1e9)
+        is_error = status_code >= 400
         
-        # 端点统计
-        if endpoint not in self.metrics["endpoint_stats"]:
-            self.metrics["endpoint_stats"][endpoint] = {
-                "count": 0,
-                "total_duration": 0.0,
-                "avg_duration": 0.0,
-                "error_count": 0
-            }
-        
-        endpoint_stats = self.metrics["endpoint_stats"][endpoint]
-        endpoint_stats["count"] += 1
-        endpoint_stats["total_duration"] += duration
-        endpoint_stats["avg_duration"] = endpoint_stats["total_duration"] / endpoint_stats["count"]
-        
-        # 错误统计
-        if status_code >= 400:
-            self.metrics["error_count"] += 1
-            endpoint_stats["error_count"] += 1
+        with self._lock:
+            self._version += 1
+            self._snapshot = None
+            idx = self._endpoint_ids.get(endpoint)
+            if idx is None:
+                idx = self._endpoint_ids[endpoint] = len(self._counts)
+                self._counts.append(0)
+                self._total_ns.append(0)
+                self._error_counts.append(0)
+            
+            self._counts[idx] += 1
+            self._total_ns[idx] += duration_ns
             
-            if error_type:
-                if error_type not in self.metrics["error_stats"]:
-                    self.metrics["error_stats"][error_type] = 0
-                self.metrics["error_stats"][error_type] += 1
+            # 错误统计
+            if is_error:
+                self._error_counts[idx] += 1
+                if error_type:
+                    self._error_stats[error_type] += 1
     
     def get_metrics(self) -> Dict[str, Any]:
-        """获取性能指标"""
-        return self.metrics.copy()
+        """获取性能指标
+
+        返回的快照在指标变化前会被重复返回，调用方不应修改它。
+        """
+        snapshot = self._snapshot
+        if snapshot is not None:
+            return snapshot
+        
+        with self._lock:
+            version = self._version
+            counts = list(self._counts)
+            total_ns = list(self._total_ns)
+            error_counts = list(self._error_counts)
+            endpoint_ids = dict(self._endpoint_ids)
+            error_stats = dict(self._error_stats)
+        
+        endpoint_stats = {}
+        for endpoint, idx in endpoint_ids.items():
+            total_duration = total_ns[idx] / 1e9
+            endpoint_stats[endpoint] = {
+                "count": counts[idx],
+                "total_duration": total_duration,
+                "avg_duration": total_duration / counts[idx],
+                "error_count": error_counts[idx]
+            }
+        
+        request_count = sum(counts)
+        total_duration = sum(total_ns) / 1e9
+        snapshot = {
+            "request_count": request_count,
+            "error_count": sum(error_counts),
+            "total_duration": total_duration,
+            "avg_duration": total_duration / request_count if request_count else 0.0,
+            "endpoint_stats": endpoint_stats,
+            "error_stats": error_stats
+        }
+        
+        with self._lock:
+            # 计算期间有新的记录时不缓存，下次读取重新计算
+            if self._version == version:
+                self._snapshot = snapshot
+        return snapshot
     
     def reset_metrics(self):
         """重置指标"""
-        self.metrics = {
-            "request_count": 0,
-            "error_count": 0,
-            "total_duration": 0.0,
-            "avg_duration": 0.0,
-            "endpoint_stats": {},
-            "error_stats": {}
-        }
+        with self._lock:
+            self._version += 1
+            self._snapshot: Optional[Dict[str, Any]] = None
+            self._endpoint_ids: Dict[str, int] = {}
+            self._counts: List[int] = []
+            self._total_ns: List[int] = []
+            self._error_counts: List[int] = []
+            self._error_stats: Counter = Counter()
 
 
 def add_request_context(logger, method_name, event_dict):
@@ -140,6 +217,30 @@ def add_timestamp(logger, method_name, event_dict):
     return event_dict
 
 
+def _start_log_listener(handlers: List[logging.Handler]) -> QueueHandler:
+    """启动后台日志写入线程，返回投递日志记录的队列处理器"""
+    global _log_listener, _queue_handler
+    
+    _stop_log_listener()
+    log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    _log_listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _log_listener.start()
+    _queue_handler = QueueHandler(log_queue)
+    return _queue_handler
+
+
+def _stop_log_listener() -> None:
+    """停止后台日志写入线程，写完队列中剩余的记录"""
+    global _log_listener
+    
+    if _log_listener is not None:
+        _log_listener.stop()
+        _log_listener = None
+
+
+atexit.register(_stop_log_listener)
+
+
 def configure_logging(log_level: str = "INFO", log_file: str = None, json_format: bool = True):
     """配置结构化日志"""
     
@@ -156,7 +257,10 @@ def configure_logging(log_level: str = "INFO", log_file: str = None, json_format
     ]
     
     if json_format:
-        processors.append(structlog.processors.JSONRenderer())
+        if _orjson_serializer is not None:
+            processors.append(structlog.processors.JSONRenderer(serializer=_orjson_serializer))
+        else:
+            processors.append(structlog.processors.JSONRenderer())
     else:
         processors.append(structlog.dev.ConsoleRenderer())
     
@@ -168,26 +272,64 @@ def configure_logging(log_level: str = "INFO", log_file: str = None, json_format
         cache_logger_on_first_use=True,
     )
     
-    # 配置标准库日志
-    logging.basicConfig(
-        level=getattr(logging, log_level.upper()),
-        format="%(message)s",
-        handlers=[
-            logging.StreamHandler(),
-            *([logging.FileHandler(log_file)] if log_file else [])
-        ]
-    )
+    # 配置标准库日志：根日志器上已有的处理器（如入口脚本 basicConfig 添加的）保留原有格式，
+    # 与新建的处理器一起移到后台线程写入，请求路径上只把日志记录放入队列
+    root = logging.getLogger()
+    configured = bool(root.handlers)
+    handlers = [h for h in root.handlers if h is not _queue_handler]
+    if _log_listener is not None:
+        handlers = [*_log_listener.handlers, *handlers]
+    
+    formatter = logging.Formatter("%(message)s")
+    if not handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(formatter)
+        handlers.append(handler)
+    if log_file and not any(
+        isinstance(h, logging.FileHandler) and h.baseFilename == os.path.abspath(log_file)
+        for h in handlers
+    ):
+        handler = logging.FileHandler(log_file)
+        handler.setFormatter(formatter)
+        handlers.append(handler)
+    
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_start_log_listener(handlers))
+    
+    # 与 basicConfig 一致，日志级别已由调用方配置时不覆盖
+    if not configured:
+        root.setLevel(getattr(logging, log_level.upper()))
 
 
 def get_logger(name: str = None) -> structlog.stdlib.BoundLogger:
-    """获取结构化日志器"""
-    return structlog.get_logger(name)
+    """获取结构化日志器
+
+    同名日志器只创建一次，之后直接返回缓存的实例。
+    """
+    logger = _logger_cache.get(name)
+    if logger is None:
+        logger = _logger_cache[name] = structlog.get_logger(name)
+    return logger
+
+
+def generate_request_id() -> str:
+    """生成按时间排序的请求 ID
+    
+    由进程 ID、单调时钟纳秒数和进程内计数器组成的 20 位十六进制字符串，
+    无需像 uuid4 那样每次读取系统随机数。
+    """
+    return (
+        f"{os.getpid() & 0xFFFF:04x}"
+        f"{time.monotonic_ns() & 0xFFFFFFFFFFFF:012x}"
+        f"{next(_request_counter) & 0xFFFF:04x}"
+    )
 
 
 def set_request_context(request_id: str = None, user_id: str = None):
     """设置请求上下文"""
     if request_id is None:
-        request_id = str(uuid.uuid4())
+        request_id = generate_request_id()
     
     request_id_var.set(request_id)
     if user_id:
@@ -203,70 +345,57 @@ def clear_request_context():
 
 
 def log_performance(func_name: str = None):
-    """性能日志装饰器"""
+    """性能日志装饰器
+    
+    日志器在装饰时绑定一次，不再在每次调用时查找。
+    """
     def decorator(func):
-        @wraps(func)
-        async def async_wrapper(*args, **kwargs):
-            logger = get_logger(func_name or func.__name__)
-            start_time = time.time()
-            
-            try:
-                logger.info("Function started", function=func.__name__)
-                result = await func(*args, **kwargs)
-                duration = time.time() - start_time
-                logger.info(
-                    "Function completed",
-                    function=func.__name__,
-                    duration=duration,
-                    success=True
-                )
+        logger = get_logger(func_name or func.__name__)
+        name = func.__name__
+        completed_fields = {"function": name, "success": True}
+        
+        def log_started():
+            logger.info("Function started", function=name)
+        
+        def log_failed(duration: float, e: Exception):
+            logger.error(
+                "Function failed",
+                function=name,
+                duration=duration,
+                error=str(e),
+                error_type=type(e).__name__,
+                success=False
+            )
+        
+        # 装饰时判断一次函数类型，只构建实际需要的包装函数
+        if asyncio.iscoroutinefunction(func):
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                start_time = time.perf_counter()
+                log_started()
+                try:
+                    result = await func(*args, **kwargs)
+                except Exception as e:
+                    log_failed(time.perf_counter() - start_time, e)
+                    raise
+                logger.info("Function completed", duration=time.perf_counter() - start_time, **completed_fields)
                 return result
-            except Exception as e:
-                duration = time.time() - start_time
-                logger.error(
-                    "Function failed",
-                    function=func.__name__,
-                    duration=duration,
-                    error=str(e),
-                    error_type=type(e).__name__,
-                    success=False
-                )
-                raise
+            
+            return async_wrapper
         
         @wraps(func)
         def sync_wrapper(*args, **kwargs):
-            logger = get_logger(func_name or func.__name__)
-            start_time = time.time()
-            
+            start_time = time.perf_counter()
+            log_started()
             try:
-                logger.info("Function started", function=func.__name__)
                 result = func(*args, **kwargs)
-                duration = time.time() - start_time
-                logger.info(
-                    "Function completed",
-                    function=func.__name__,
-                    duration=duration,
-                    success=True
-                )
-                return result
             except Exception as e:
-                duration = time.time() - start_time
-                logger.error(
-                    "Function failed",
-                    function=func.__name__,
-                    duration=duration,
-                    error=str(e),
-                    error_type=type(e).__name__,
-                    success=False
-                )
+                log_failed(time.perf_counter() - start_time, e)
                 raise
+            logger.info("Function completed", duration=time.perf_counter() - start_time, **completed_fields)
+            return result
         
-        # 检查是否是异步函数
-        import asyncio
-        if asyncio.iscoroutinefunction(func):
-            return async_wrapper
-        else:
-            return sync_wrapper
+        return sync_wrapper
     
     return decorator
 
@@ -6,14 +6,27 @@
 
 import logging
 import gc
+import hashlib
+import os
+import time
+import numpy as np
 import torch
-from typing import Dict, Any, Optional
-from PIL import Image
+from typing import Callable, Dict, Any, List, Optional, Sequence, Tuple
+from PIL import Image, ImageFont
 import base64
 import io
-from threading import Lock
+from collections import OrderedDict
+from contextlib import contextmanager, nullcontext
+from threading import Condition, Lock
+
+try:
+    import psutil
+except ImportError:  # psutil 为可选依赖
+    psutil = None
 
 from .interfaces import ModelManagerInterface
+from .tensor_pool import TensorPool
+from .weight_loader import load_safetensors
 from .exceptions import (
     ModelLoadError, ModelNotLoadedError, InferenceError, 
     ResourceError, ValidationError, DeviceError, MemoryError
@@ -23,10 +36,193 @@ from config.models import ModelConfig
 
 logger = logging.getLogger(__name__)
 
+# 形状缓存与提示词编码缓存的最大条目数
+SHAPE_CACHE_SIZE = 64
+PROMPT_CACHE_SIZE = 256
+
+# 各图像模式每像素的原始字节数（与 Image.tobytes() 的长度一致）
+_BYTES_PER_PIXEL: Dict[str, int] = {
+    'L': 1, 'P': 1,
+    'LA': 2, 'La': 2, 'PA': 2, 'I;16': 2, 'I;16L': 2, 'I;16B': 2, 'I;16N': 2,
+    'RGB': 3, 'YCbCr': 3, 'LAB': 3, 'HSV': 3,
+    'RGBA': 4, 'RGBa': 4, 'RGBX': 4, 'CMYK': 4, 'I': 4, 'F': 4,
+}
+
+# CUDA 是否可用（驱动查询，进程内只执行一次）
+CUDA_AVAILABLE = torch.cuda.is_available()
+
+# 图生图变换强度高于该值时，预处理缩放使用双线性插值代替 LANCZOS
+FAST_RESAMPLE_STRENGTH = 0.6
+
+# CUDA 缓存分配器配置：可扩展段减少混合分辨率请求下的显存碎片，用户显式设置时不覆盖
+CUDA_ALLOC_CONF = "expandable_segments:True,max_split_size_mb:512"
+
+# 启动预热使用的分辨率和推理步数，Transformer 按固定形状编译，每个分辨率各预热一遍
+WARMUP_SHAPES: Tuple[Tuple[int, int], ...] = ((512, 512), (768, 768), (1024, 1024))
+WARMUP_STEPS = 8
+
+# 支持的图像格式和参数范围（静态，不随模型加载变化）
+SUPPORTED_FORMATS: Dict[str, Any] = {
+    'image_formats': ['JPEG', 'PNG', 'WEBP', 'BMP'],
+    'max_resolution': {'width': 2048, 'height': 2048},
+    'min_resolution': {'width': 256, 'height': 256},
+    'inference_steps_range': {'min': 1, 'max': 100},
+    'guidance_scale_range': {'min': 1.0, 'max': 20.0},
+    'strength_range': {'min': 0.1, 'max': 1.0},
+    'supported_dtypes': ['float16', 'float32', 'bfloat16', 'float8_e4m3fn', 'float8_e5m2'],
+    'quantization_methods': ['none', 'bnb_int8', 'fp8', 'quanto_fp8', 'torchao_int8', 'torchao_fp8'],
+    'supported_devices': ['cpu', 'cuda', 'auto']
+}
+
+
+class FeatureCache:
+    """一次生成中各 CachedBlock 共享的去噪进度
+
+    diffusers 管道每个去噪步按 CFG 分支调用 Transformer 一到两次（条件分支在前）。
+    Transformer 的 forward pre-hook 调用 begin_branch() 记录当前分支，管道的
+    callback_on_step_end 调用 end_step() 进入下一步。
+    """
+
+    def __init__(self, interval: int = 1):
+        self.interval = interval
+        self.step = 0
+        self.branch = -1
+
+    def reset(self, interval: Optional[int] = None) -> None:
+        """开始新一次生成前重置进度"""
+        if interval is not None:
+            self.interval = interval
+        self.step = 0
+        self.branch = -1
+
+    def begin_branch(self, module: torch.nn.Module, args: Any) -> None:
+        """Transformer forward pre-hook：同一步内的第几次调用即 CFG 分支序号"""
+        self.branch += 1
+
+    def end_step(self, pipeline: Any, step: int, timestep: Any,
+                 callback_kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        """管道 callback_on_step_end 回调：进入下一个去噪步"""
+        self.step += 1
+        self.branch = -1
+        return callback_kwargs
+
+    def should_compute(self, step: int, branch: int) -> bool:
+        """
+        判断该步是否需要完整计算
+
+        条件分支每 interval 步计算一次；无条件分支（branch > 0）的输出变化更慢，
+        按 FasterCache 的做法间隔加倍。
+        """
+        if self.interval <= 1:
+            return True
+        period = self.interval * 2 if branch > 0 else self.interval
+        return step % period == 0
+
+
+class CachedBlock(torch.nn.Module):
+    """带步间特征缓存的 Transformer 块包装
+
+    相邻去噪步之间块的输出残差变化很小。需要完整计算的步记录每个输出相对输入的残差，
+    其余步直接返回输入 + 上次残差，跳过该块的注意力和 MLP 计算。残差按 CFG 分支分别保存。
+
+    兼容 diffusers 的双流块：以关键字 hidden_states / encoder_hidden_states 调用并返回
+    (encoder_hidden_states, hidden_states) 元组；单张量输入输出的块取第一个位置参数。
+    未共享 FeatureCache 时块自行计步，每次调用视为一步。
+    """
+
+    def __init__(self, module: torch.nn.Module, interval: int = 1,
+                 cache: Optional[FeatureCache] = None):
+        super().__init__()
+        self.module = module
+        self._standalone = cache is None
+        self.cache = cache if cache is not None else FeatureCache(interval)
+        self.residuals: Dict[int, Tuple[torch.Tensor, ...]] = {}
+        self._single_output = True
+
+    def reset(self, interval: Optional[int] = None) -> None:
+        """开始新一次生成前清空缓存残差（独立计步时同时重置步数）"""
+        if self._standalone:
+            self.cache.reset(interval)
+        self.residuals.clear()
+
+    def _inputs(self, args: tuple, kwargs: Dict[str, Any]) -> Optional[Tuple[torch.Tensor, ...]]:
+        """与块输出一一对应的输入张量，无法对应时返回 None"""
+        hidden = kwargs.get('hidden_states', args[0] if args else None)
+        if self._single_output:
+            return (hidden,) if isinstance(hidden, torch.Tensor) else None
+        encoder = kwargs.get('encoder_hidden_states', args[1] if len(args) > 1 else None)
+        if isinstance(hidden, torch.Tensor) and isinstance(encoder, torch.Tensor):
+            return encoder, hidden
+        return None
+
+    def forward(self, *args, **kwargs) -> Any:
+        cache = self.cache
+        if self._standalone:
+            step, branch = cache.step, 0
+            cache.step += 1
+        else:
+            step, branch = cache.step, max(cache.branch, 0)
+
+        inputs = self._inputs(args, kwargs)
+        residuals = self.residuals.get(branch)
+        if (
+            not cache.should_compute(step, branch)
+            and inputs is not None
+            and residuals is not None
+            and all(i.shape == r.shape for i, r in zip(inputs, residuals))
+        ):
+            outputs = tuple(i + r for i, r in zip(inputs, residuals))
+            return outputs[0] if self._single_output else outputs
+
+        out = self.module(*args, **kwargs)
+        if cache.interval > 1:
+            self._single_output = isinstance(out, torch.Tensor)
+            outputs = (out,) if self._single_output else tuple(out)
+            inputs = self._inputs(args, kwargs)
+            if inputs is not None and len(inputs) == len(outputs):
+                # out 可能是编译模块的 CUDA Graph 输出缓冲区，下一次回放会覆写，残差需持有独立存储
+                self.residuals[branch] = tuple((o - i).clone() for o, i in zip(outputs, inputs))
+            else:
+                self.residuals.pop(branch, None)
+        return out
+
+
+def wrap_blocks_with_cache(blocks: torch.nn.ModuleList, interval: int = 1,
+                           cache: Optional[FeatureCache] = None) -> List[CachedBlock]:
+    """
+    将 ModuleList 中的每个块原地替换为 CachedBlock
+    
+    Args:
+        blocks: Transformer 块列表（如 pipeline.transformer.transformer_blocks）
+        interval: 缓存间隔步数（未共享 cache 时使用）
+        cache: 各块共享的去噪进度，为 None 时每个块独立计步
+        
+    Returns:
+        List[CachedBlock]: 包装后的块
+    """
+    wrapped = []
+    for index, block in enumerate(blocks):
+        if not isinstance(block, CachedBlock):
+            block = CachedBlock(block, interval, cache)
+            blocks[index] = block
+        wrapped.append(block)
+    return wrapped
+
+
+def _load_default_font() -> Any:
+    """加载 PIL 默认字体，失败时返回 None"""
+    try:
+        return ImageFont.load_default()
+    except Exception:
+        return None
+
 
 class ModelManager(ModelManagerInterface):
     """qwen-image 模型管理器"""
     
+    # 模拟实现绘制文字使用的默认字体，所有实例共享，只加载一次
+    _DEFAULT_FONT = _load_default_font()
+    
     def __init__(self, model_path: str, config: Dict[str, Any]):
         """
         初始化模型管理器
@@ -38,13 +234,62 @@ class ModelManager(ModelManagerInterface):
         self.model_path = model_path
         self.config = ModelConfig(**config)
         self.model = None
+        
+        # 推理设备在初始化时解析一次，热路径只读取属性
+        self._device = self._get_device()
+        self._is_cuda = self._device == "cuda"
+        
+        # 分配器配置在首次 CUDA 分配时读取，需在加载模型前设置
+        if not torch.cuda.is_initialized():
+            os.environ.setdefault("PYTORCH_CUDA_ALLOC_CONF", CUDA_ALLOC_CONF)
         self.processor = None
         self._model_loaded = False
+        
+        # 加载后绑定的文生图 / 图生图管道，推理时直接调用
+        self._t2i_pipe: Any = None
+        self._i2i_pipe: Any = None
+        
+        # VAE 是否以分块方式解码（影响推理显存估算）
+        self._vae_tiled = False
+        
+        # CUDA 上半精度推理使用的 autocast 精度，None 表示不启用
+        self._autocast_dtype: Optional[torch.dtype] = None
+        
+        # 快速加载的权重缓冲区的释放函数，模型卸载后调用
+        self._release_weights: Optional[Callable[[], None]] = None
+        
+        # 图生图输入的锁页暂存区、设备端缓冲区和专用拷贝流（CUDA 上加载模型时分配）
+        self._pin_buf: Optional[torch.Tensor] = None
+        self._gpu_img: Optional[torch.Tensor] = None
+        self._copy_stream: Optional["torch.cuda.Stream"] = None
+        self._copy_done: Optional["torch.cuda.Event"] = None
+        self._staging_lock = Lock()
+        
+        # GPU 总显存（设备属性不变，首次使用时查询）
+        self._gpu_total_mem: Optional[int] = None
+        # _lock 只用于模型加载和清理的状态切换；推理统计使用独立的 _stats_lock，
+        # 每次请求只在更新计数时短暂持有
         self._lock = Lock()
+        self._stats_lock = Lock()
+        # 正在使用模型的推理数；cleanup 等待其归零后才释放模型
+        self._active_requests = 0
+        self._requests_idle = Condition()
         self._memory_usage = {'peak': 0, 'current': 0}
         self._inference_count = 0
         self._error_count = 0
         
+        # 按生成参数缓存的推理准备结果，以及提示词编码结果（LRU）
+        self._shape_cache: "OrderedDict[tuple, Dict[str, Any]]" = OrderedDict()
+        self._prompt_cache: "OrderedDict[bytes, Any]" = OrderedDict()
+        self._cache_lock = Lock()
+        
+        # 已包装特征缓存的 Transformer 块（cache_interval > 1 且真实管道加载后填充）及其共享的去噪进度
+        self._cached_blocks: List[CachedBlock] = []
+        self._feature_cache = FeatureCache(self.config.cache_interval)
+        
+        # 潜变量等临时张量的复用池
+        self.tensor_pool: Optional[TensorPool] = TensorPool() if self.config.tensor_pool_enable else None
+        
         logger.info(f"ModelManager initialized with path: {model_path}")
         logger.info(f"Device: {self.config.device}, dtype: {self.config.torch_dtype}")
     
@@ -65,7 +310,6 @@ class ModelManager(ModelManagerInterface):
                 logger.info("Loading qwen-image model...")
                 
                 # 检查模型路径是否存在
-                import os
                 if not os.path.exists(self.model_path):
                     raise ModelLoadError(
                         f"Model path does not exist: {self.model_path}",
@@ -76,7 +320,7 @@ class ModelManager(ModelManagerInterface):
                 self._check_memory_availability()
                 
                 # 设置设备
-                device = self._get_device()
+                device = self._device
                 
                 # 加载 qwen-image 模型
                 # 注意：这里使用模拟实现，实际部署时需要替换为真实的 qwen-image 模型
@@ -86,6 +330,34 @@ class ModelManager(ModelManagerInterface):
                 if self.model is None:
                     raise ModelLoadError("Failed to initialize qwen-image model")
                 
+                # 绑定推理管道
+                self._bind_pipelines(self.model)
+                
+                # 对 Transformer 权重执行加载后量化
+                self._apply_quantization(self.model)
+                
+                # 为管道中的 Transformer 块启用步间特征缓存
+                self._cached_blocks = self._wrap_transformer_blocks(self.model)
+                
+                # VAE 分块 + 切片解码，峰值显存不再随输出分辨率增长
+                self._vae_tiled = self._enable_vae_tiling(self.model)
+                
+                # UNet 注意力使用融合的 SDPA 内核
+                self._apply_sdpa_attention(self.model)
+                
+                # 卷积模块使用 channels_last 布局，并确定推理时的 autocast 精度
+                self._apply_channels_last(self.model)
+                compute_dtype, _ = self._resolve_dtypes()
+                self._autocast_dtype = (
+                    compute_dtype
+                    if device == "cuda" and compute_dtype in (torch.float16, torch.bfloat16)
+                    else None
+                )
+                
+                # 预分配图生图输入的 H2D 传输缓冲区
+                if device == "cuda":
+                    self._allocate_staging()
+                
                 # 更新内存使用情况
                 self._update_memory_usage()
                 
@@ -94,14 +366,58 @@ class ModelManager(ModelManagerInterface):
                 
             except ModelLoadError:
                 self._model_loaded = False
-                self._error_count += 1
+                self._record_error()
                 raise
             except Exception as e:
                 logger.error(f"Failed to load model: {str(e)}")
                 self._model_loaded = False
-                self._error_count += 1
+                self._record_error()
                 raise ModelLoadError(f"Model loading failed: {str(e)}", model_path=self.model_path)
     
+    def warmup(self, shapes: Sequence[Tuple[int, int]] = WARMUP_SHAPES,
+               num_inference_steps: int = WARMUP_STEPS, passes: int = 2) -> None:
+        """
+        预热推理路径
+
+        在 CUDA 上启用 TF32 和 cuDNN 自动调优并编译 Transformer 和 VAE 解码器，然后以常用
+        分辨率执行几次推理，让内核选择、编译、CUDA Graph 捕获和显存分配发生在服务启动阶段
+        而不是首个请求上。预热不计入推理统计。
+
+        Args:
+            shapes: 预热分辨率列表 (width, height)
+            num_inference_steps: 预热推理步数
+            passes: 每个分辨率的预热推理次数
+
+        Raises:
+            ModelNotLoadedError: 模型未加载
+        """
+        if not self._model_loaded:
+            raise ModelNotLoadedError()
+
+        if self._is_cuda:
+            torch.backends.cuda.matmul.allow_tf32 = True
+            torch.backends.cudnn.benchmark = True
+            torch.set_float32_matmul_precision("high")
+            self._compile_pipeline(self.model)
+
+        start_time = time.perf_counter()
+        for width, height in shapes:
+            for _ in range(passes):
+                self._prepare_feature_cache()
+                with self._reader(), torch.inference_mode(), self._autocast(), self._tensor_scope():
+                    self._execute_text_to_image(
+                        prompt="warmup",
+                        width=width,
+                        height=height,
+                        num_inference_steps=num_inference_steps,
+                        guidance_scale=7.5
+                    )
+        logger.info(
+            f"Model warmup completed in {time.perf_counter() - start_time:.2f}s "
+            f"({passes} passes at {', '.join(f'{w}x{h}' for w, h in shapes)}, "
+            f"{num_inference_steps} steps)"
+        )
+    
     def text_to_image(self, prompt: str, **kwargs) -> Image.Image:
         """
         文生图推理
@@ -119,29 +435,32 @@ class ModelManager(ModelManagerInterface):
             InferenceError: 推理失败
             MemoryError: 内存不足
         """
-        if not self._model_loaded:
-            raise ModelNotLoadedError()
-        
-        if not prompt or not prompt.strip():
-            raise ValidationError("Prompt cannot be empty", parameter="prompt")
+        # 解析推理参数
+        width = kwargs.get('width', 512)
+        height = kwargs.get('height', 512)
+        num_inference_steps = kwargs.get('num_inference_steps', 20)
+        guidance_scale = kwargs.get('guidance_scale', 7.5)
         
+        # 检查模型状态、验证参数并检查内存可用性（仅计入错误统计，异常原样抛出）
         try:
-            logger.info(f"Generating image from text: {prompt[:50]}...")
-            
-            # 解析推理参数
-            width = kwargs.get('width', 512)
-            height = kwargs.get('height', 512)
-            num_inference_steps = kwargs.get('num_inference_steps', 20)
-            guidance_scale = kwargs.get('guidance_scale', 7.5)
-            
-            # 验证参数
+            if not self._model_loaded:
+                raise ModelNotLoadedError()
+            if not prompt or not prompt.strip():
+                raise ValidationError("Prompt cannot be empty", parameter="prompt")
             self._validate_generation_params(width, height, num_inference_steps, guidance_scale)
-            
-            # 检查内存可用性
             self._check_inference_memory(width, height)
-            
-            # 执行文生图推理
-            with torch.no_grad():
+        except (ModelNotLoadedError, ValidationError, MemoryError):
+            self._record_error()
+            raise
+        
+        logger.info(f"Generating image from text: {prompt[:50]}...")
+        
+        # 重置特征缓存
+        self._prepare_feature_cache(kwargs.get('cache_interval'))
+        
+        # 执行文生图推理，只有管道调用本身的失败被转换为 InferenceError
+        try:
+            with self._reader(), torch.inference_mode(), self._autocast(), self._tensor_scope():
                 image = self._execute_text_to_image(
                     prompt=prompt,
                     width=width,
@@ -149,22 +468,85 @@ class ModelManager(ModelManagerInterface):
                     num_inference_steps=num_inference_steps,
                     guidance_scale=guidance_scale
                 )
-            
-            # 更新统计信息
-            self._inference_count += 1
-            self._update_memory_usage()
-            
-            logger.info(f"Image generated successfully: {width}x{height}")
-            return image
-            
-        except (ValidationError, ModelNotLoadedError, MemoryError):
-            self._error_count += 1
-            raise
-        except Exception as e:
+        except RuntimeError as e:
             logger.error(f"Text-to-image generation failed: {str(e)}")
-            self._error_count += 1
+            self._record_error()
             raise InferenceError(f"Text-to-image generation failed: {str(e)}", inference_type="text_to_image")
+        
+        # 更新统计信息
+        self._record_inference()
+        self._update_memory_usage()
+        
+        logger.info(f"Image generated successfully: {width}x{height}")
+        return image
     
+    def text_to_image_batch(self, prompts: List[str], **kwargs) -> List[Image.Image]:
+        """
+        批量文生图推理
+
+        所有提示词共享同一组推理参数，在一次管道调用中完成生成。
+
+        Args:
+            prompts: 文本提示词列表
+            **kwargs: 推理参数 (width, height, num_inference_steps, guidance_scale)
+
+        Returns:
+            List[PIL.Image.Image]: 与提示词一一对应的生成图像
+
+        Raises:
+            ModelNotLoadedError: 模型未加载
+            ValidationError: 参数无效
+            InferenceError: 推理失败
+            MemoryError: 内存不足
+        """
+        # 解析推理参数
+        width = kwargs.get('width', 512)
+        height = kwargs.get('height', 512)
+        num_inference_steps = kwargs.get('num_inference_steps', 20)
+        guidance_scale = kwargs.get('guidance_scale', 7.5)
+
+        # 检查模型状态、验证参数并检查内存可用性（按批大小估算）
+        try:
+            if not self._model_loaded:
+                raise ModelNotLoadedError()
+            if not prompts:
+                raise ValidationError("Prompts cannot be empty", parameter="prompts")
+            for prompt in prompts:
+                if not prompt or not prompt.strip():
+                    raise ValidationError("Prompt cannot be empty", parameter="prompt")
+            self._validate_generation_params(width, height, num_inference_steps, guidance_scale)
+            self._check_inference_memory(width, height * len(prompts))
+        except (ModelNotLoadedError, ValidationError, MemoryError):
+            self._record_error()
+            raise
+
+        logger.info(f"Generating {len(prompts)} images from text in one batch")
+
+        # 重置特征缓存
+        self._prepare_feature_cache(kwargs.get('cache_interval'))
+
+        # 执行批量文生图推理
+        try:
+            with self._reader(), torch.inference_mode(), self._autocast(), self._tensor_scope():
+                images = self._execute_text_to_image_batch(
+                    prompts=prompts,
+                    width=width,
+                    height=height,
+                    num_inference_steps=num_inference_steps,
+                    guidance_scale=guidance_scale
+                )
+        except RuntimeError as e:
+            logger.error(f"Batched text-to-image generation failed: {str(e)}")
+            self._record_error()
+            raise InferenceError(f"Text-to-image generation failed: {str(e)}", inference_type="text_to_image")
+
+        # 更新统计信息
+        self._record_inference(len(prompts))
+        self._update_memory_usage()
+
+        logger.info(f"Batch of {len(prompts)} images generated successfully: {width}x{height}")
+        return images
+
     def image_to_image(self, image: Image.Image, prompt: str, **kwargs) -> Image.Image:
         """
         图生图推理
@@ -183,17 +565,14 @@ class ModelManager(ModelManagerInterface):
             InferenceError: 推理失败
             MemoryError: 内存不足
         """
-        if not self._model_loaded:
-            raise ModelNotLoadedError()
-        
-        if not prompt or not prompt.strip():
-            raise ValidationError("Prompt cannot be empty", parameter="prompt")
-        
-        if not isinstance(image, Image.Image):
-            raise ValidationError("Input must be a PIL Image", parameter="image")
-        
+        # 检查模型状态和输入、验证参数并检查内存可用性（仅计入错误统计，异常原样抛出）
         try:
-            logger.info(f"Generating image from image+text: {prompt[:50]}...")
+            if not self._model_loaded:
+                raise ModelNotLoadedError()
+            if not prompt or not prompt.strip():
+                raise ValidationError("Prompt cannot be empty", parameter="prompt")
+            if not isinstance(image, Image.Image):
+                raise ValidationError("Input must be a PIL Image", parameter="image")
             
             # 解析推理参数
             strength = kwargs.get('strength', 0.8)
@@ -201,19 +580,25 @@ class ModelManager(ModelManagerInterface):
             height = kwargs.get('height', image.height)
             num_inference_steps = kwargs.get('num_inference_steps', 20)
             
-            # 验证参数
             self._validate_generation_params(width, height, num_inference_steps)
             if not 0.1 <= strength <= 1.0:
                 raise ValidationError("Strength must be between 0.1 and 1.0", parameter="strength")
-            
-            # 检查内存可用性
             self._check_inference_memory(width, height)
-            
-            # 预处理输入图像
-            processed_image = self._preprocess_image(image, width, height)
-            
-            # 执行图生图推理
-            with torch.no_grad():
+        except (ModelNotLoadedError, ValidationError, MemoryError):
+            self._record_error()
+            raise
+        
+        logger.info(f"Generating image from image+text: {prompt[:50]}...")
+        
+        # 重置特征缓存
+        self._prepare_feature_cache(kwargs.get('cache_interval'))
+        
+        # 预处理输入图像
+        processed_image = self._preprocess_image(image, width, height, strength)
+        
+        # 执行图生图推理
+        try:
+            with self._reader(), torch.inference_mode(), self._autocast(), self._tensor_scope():
                 result_image = self._execute_image_to_image(
                     image=processed_image,
                     prompt=prompt,
@@ -222,21 +607,17 @@ class ModelManager(ModelManagerInterface):
                     height=height,
                     num_inference_steps=num_inference_steps
                 )
-            
-            # 更新统计信息
-            self._inference_count += 1
-            self._update_memory_usage()
-            
-            logger.info(f"Image-to-image generation completed: {width}x{height}")
-            return result_image
-            
-        except (ValidationError, ModelNotLoadedError, MemoryError):
-            self._error_count += 1
-            raise
-        except Exception as e:
+        except RuntimeError as e:
             logger.error(f"Image-to-image generation failed: {str(e)}")
-            self._error_count += 1
+            self._record_error()
             raise InferenceError(f"Image-to-image generation failed: {str(e)}", inference_type="image_to_image")
+        
+        # 更新统计信息
+        self._record_inference()
+        self._update_memory_usage()
+        
+        logger.info(f"Image-to-image generation completed: {width}x{height}")
+        return result_image
     
     def is_model_loaded(self) -> bool:
         """
@@ -259,17 +640,26 @@ class ModelManager(ModelManagerInterface):
             'model_path': self.model_path,
             'device': self.config.device,
             'torch_dtype': self.config.torch_dtype,
+            'quantization_method': self.config.quantization_method,
             'max_memory': self.config.max_memory
         }
     
     def cleanup(self) -> None:
         """
         清理模型资源
+        
+        先将模型标记为未加载，拒绝新的推理，再等待正在执行的推理结束后释放模型，
+        避免释放仍被管道使用的张量。
         """
         with self._lock:
             if self.model is not None:
                 logger.info("Cleaning up model resources...")
                 
+                # 拒绝新的推理并等待进行中的推理完成
+                with self._requests_idle:
+                    self._model_loaded = False
+                    self._requests_idle.wait_for(lambda: not self._active_requests)
+                
                 # 清理模型
                 del self.model
                 self.model = None
@@ -280,13 +670,28 @@ class ModelManager(ModelManagerInterface):
                     self.processor = None
                 
                 # 清理 GPU 缓存
-                if torch.cuda.is_available():
+                if self._is_cuda:
                     torch.cuda.empty_cache()
                 
                 # 强制垃圾回收
                 gc.collect()
                 
                 self._model_loaded = False
+                self._t2i_pipe = None
+                self._i2i_pipe = None
+                self._autocast_dtype = None
+                self._vae_tiled = False
+                self._pin_buf = None
+                self._gpu_img = None
+                self._copy_stream = None
+                self._copy_done = None
+                self._cached_blocks = []
+                if self._release_weights is not None:
+                    self._release_weights()
+                    self._release_weights = None
+                self.clear_caches()
+                if self.tensor_pool is not None:
+                    self.tensor_pool.clear()
                 logger.info("Model resources cleaned up")
     
     def _load_qwen_image_model(self, device: str) -> tuple:
@@ -303,6 +708,13 @@ class ModelManager(ModelManagerInterface):
             RuntimeError: 模型加载失败
         """
         try:
+            # 计算精度和加载时量化配置（供 from_pretrained 使用）
+            compute_dtype, _ = self._resolve_dtypes()
+            quantization_config = self._get_quantization_config()
+            
+            # 可用时用 fastsafetensors 直接把 Transformer 权重读到目标设备，否则为 None
+            transformer = self._load_transformer_fast(device, compute_dtype)
+            
             # 实际的 qwen-image 模型加载代码应该在这里
             # 以下是示例代码结构，需要根据实际的 qwen-image API 调整
             
@@ -311,22 +723,22 @@ class ModelManager(ModelManagerInterface):
             # model = AutoModel.from_pretrained(
             #     self.model_path,
             #     device_map=device,
-            #     torch_dtype=getattr(torch, self.config.torch_dtype),
+            #     torch_dtype=compute_dtype,
             #     trust_remote_code=True
             # )
             # processor = AutoProcessor.from_pretrained(self.model_path)
             
-            # 方案2: 如果使用 diffusers 库
+            # 方案2: 如果使用 diffusers 库（图生图管道复用文生图管道的组件，不重复占用显存）
             # from diffusers import StableDiffusionPipeline, StableDiffusionImg2ImgPipeline
+            # t2i_pipe = StableDiffusionPipeline.from_pretrained(
+            #     self.model_path,
+            #     torch_dtype=compute_dtype,
+            #     quantization_config=quantization_config,
+            #     **({'transformer': transformer} if transformer is not None else {})
+            # ).to(device)
             # model = {
-            #     'text_to_image': StableDiffusionPipeline.from_pretrained(
-            #         self.model_path,
-            #         torch_dtype=getattr(torch, self.config.torch_dtype)
-            #     ).to(device),
-            #     'image_to_image': StableDiffusionImg2ImgPipeline.from_pretrained(
-            #         self.model_path,
-            #         torch_dtype=getattr(torch, self.config.torch_dtype)
-            #     ).to(device)
+            #     'text_to_image_pipeline': t2i_pipe,
+            #     'image_to_image_pipeline': StableDiffusionImg2ImgPipeline(**t2i_pipe.components)
             # }
             # processor = None
             
@@ -367,6 +779,48 @@ class ModelManager(ModelManagerInterface):
             logger.error(f"Failed to load qwen-image model: {str(e)}")
             raise RuntimeError(f"qwen-image model loading failed: {str(e)}")
     
+    def _load_transformer_fast(self, device: str, dtype: torch.dtype) -> Any:
+        """
+        使用 fastsafetensors 加载 Transformer
+        
+        在 meta 设备上按配置构建模型结构，再以 assign=True 直接挂载已读到目标设备的权重，
+        不产生第二份拷贝。fastsafetensors 或对应的 diffusers 模型类不可用、启用了加载时量化、
+        或模型目录中没有 transformer/*.safetensors 时返回 None，由常规加载流程处理。
+        
+        Args:
+            device: 目标设备
+            dtype: 计算精度
+            
+        Returns:
+            Any: 已加载权重的 Transformer，不适用时为 None
+        """
+        if self.config.quantization_method == 'bnb_int8':
+            return None
+        
+        try:
+            from diffusers import QwenImageTransformer2DModel
+        except ImportError:
+            return None
+        
+        loaded = load_safetensors(os.path.join(self.model_path, 'transformer'), device)
+        if loaded is None:
+            return None
+        
+        state_dict, release = loaded
+        try:
+            config = QwenImageTransformer2DModel.load_config(self.model_path, subfolder='transformer')
+            with torch.device('meta'):
+                transformer = QwenImageTransformer2DModel.from_config(config)
+            transformer.load_state_dict(state_dict, assign=True)
+            transformer.to(dtype=dtype).eval()
+        except Exception:
+            release()
+            raise
+        
+        self._release_weights = release
+        logger.info("Transformer weights loaded with fastsafetensors")
+        return transformer
+    
     def _execute_text_to_image(self, prompt: str, width: int, height: int, 
                               num_inference_steps: int, guidance_scale: float) -> Image.Image:
         """
@@ -388,7 +842,7 @@ class ModelManager(ModelManagerInterface):
             
             # 方案1: 使用 transformers
             # inputs = self.processor(text=prompt, return_tensors="pt")
-            # with torch.no_grad():
+            # with torch.inference_mode():
             #     outputs = self.model.generate(
             #         **inputs,
             #         width=width,
@@ -398,15 +852,20 @@ class ModelManager(ModelManagerInterface):
             #     )
             # image = self.processor.decode(outputs[0])
             
-            # 方案2: 使用 diffusers
-            # pipeline = self.model['text_to_image']
-            # image = pipeline(
-            #     prompt=prompt,
-            #     width=width,
-            #     height=height,
-            #     num_inference_steps=num_inference_steps,
-            #     guidance_scale=guidance_scale
-            # ).images[0]
+            # 方案2: 使用 diffusers，直接调用加载时绑定的管道
+            # 提示词编码结果来自缓存，重复提示词不再运行文本编码器
+            pipeline = self._t2i_pipe
+            if pipeline is not None:
+                prompt_embeds, prompt_embeds_mask = self._encode_prompt(prompt)
+                return pipeline(
+                    prompt_embeds=prompt_embeds,
+                    prompt_embeds_mask=prompt_embeds_mask,
+                    width=width,
+                    height=height,
+                    num_inference_steps=num_inference_steps,
+                    guidance_scale=guidance_scale,
+                    **self._step_callback()
+                ).images[0]
             
             # 方案3: 使用专门的 qwen-image API
             # image = self.model.text_to_image(
@@ -417,29 +876,21 @@ class ModelManager(ModelManagerInterface):
             #     guidance_scale=guidance_scale
             # )
             
-            # 临时模拟实现 - 创建带有提示词信息的测试图像
-            import hashlib
-            from PIL import ImageDraw, ImageFont
+            # 临时模拟实现 - 未开启 debug_stub 时直接返回纯色图像
+            if not self.config.debug_stub:
+                return Image.new('RGB', (width, height), color='lightblue')
             
-            # 创建基础图像
-            image = Image.new('RGB', (width, height), color='lightblue')
+            # 创建带有提示词信息的测试图像
+            from PIL import ImageDraw
             
-            # 添加文本信息（用于测试验证）
-            draw = ImageDraw.Draw(image)
-            try:
-                # 尝试使用默认字体
-                font = ImageFont.load_default()
-            except:
-                font = None
+            # 复用按形状缓存的基础图像（已绘制参数信息），只复制可变部分
+            state = self._get_shape_state(width, height, num_inference_steps, guidance_scale)
+            image = state['canvas'].copy()
             
             # 在图像上绘制提示词的哈希值（用于验证）
-            prompt_hash = hashlib.md5(prompt.encode()).hexdigest()[:8]
+            prompt_hash = self._encode_prompt(prompt)
             text = f"Text2Img: {prompt_hash}"
-            draw.text((10, 10), text, fill='black', font=font)
-            
-            # 添加参数信息
-            params_text = f"{width}x{height}, steps:{num_inference_steps}, scale:{guidance_scale}"
-            draw.text((10, 30), params_text, fill='darkblue', font=font)
+            ImageDraw.Draw(image).text((10, 10), text, fill='black', font=state['font'])
             
             return image
             
@@ -447,6 +898,514 @@ class ModelManager(ModelManagerInterface):
             logger.error(f"Text-to-image inference failed: {str(e)}")
             raise RuntimeError(f"Text-to-image inference error: {str(e)}")
     
+    def _bind_pipelines(self, model: Any) -> None:
+        """
+        从已加载的模型中取出文生图和图生图管道并绑定为属性
+        
+        推理时直接调用绑定的管道，不再每次从模型字典中查找。模拟实现中管道为 None，
+        推理回退到模拟路径。
+        
+        Args:
+            model: 按任务类型组织的管道字典
+        """
+        if isinstance(model, dict):
+            self._t2i_pipe = model.get('text_to_image_pipeline')
+            self._i2i_pipe = model.get('image_to_image_pipeline')
+        else:
+            self._t2i_pipe = self._i2i_pipe = None
+    
+    def _wrap_transformer_blocks(self, model: Any) -> List[CachedBlock]:
+        """
+        为管道中的 Transformer 块启用步间特征缓存
+        
+        只在配置的 cache_interval 大于 1 时包装；请求级 cache_interval 在此基础上覆盖间隔。
+        图生图管道与文生图管道共享 Transformer，同一组块只包装一次，并在 Transformer 上
+        注册 pre-hook 记录 CFG 分支。
+
+        Args:
+            model: 已加载的管道，或按任务类型组织的管道字典
+
+        Returns:
+            List[CachedBlock]: 包装后的块，找不到块时返回空列表
+        """
+        if self.config.cache_interval <= 1:
+            return []
+        
+        wrapped: List[CachedBlock] = []
+        seen = set()
+        pipelines = model.values() if isinstance(model, dict) else [model]
+        for pipeline in pipelines:
+            # diffusers 管道的 Transformer 块位于 pipeline.transformer.transformer_blocks
+            transformer = getattr(pipeline, 'transformer', None)
+            blocks = getattr(transformer, 'transformer_blocks', None)
+            if not isinstance(blocks, torch.nn.ModuleList) or id(blocks) in seen:
+                continue
+            seen.add(id(blocks))
+            transformer.register_forward_pre_hook(self._feature_cache.begin_branch)
+            wrapped.extend(wrap_blocks_with_cache(blocks, cache=self._feature_cache))
+
+        if not wrapped:
+            return []
+
+        logger.info(
+            f"Feature cache enabled for {len(wrapped)} transformer blocks "
+            f"(interval={self.config.cache_interval})"
+        )
+        return wrapped
+    
+    def _resolve_dtypes(self) -> Tuple[torch.dtype, Optional[torch.dtype]]:
+        """
+        解析计算精度和权重存储精度
+        
+        float8 权重只用于存储，计算时按层上转为 bfloat16。
+        
+        Returns:
+            Tuple[torch.dtype, Optional[torch.dtype]]: (计算精度, 权重存储精度)，
+            不需要单独的存储精度时第二项为 None
+            
+        Raises:
+            ModelLoadError: 当前 PyTorch 版本不支持配置的数据类型
+        """
+        dtype_name = self.config.torch_dtype
+        dtype = getattr(torch, dtype_name, None)
+        if not isinstance(dtype, torch.dtype):
+            raise ModelLoadError(
+                f"torch_dtype '{dtype_name}' is not supported by this PyTorch version",
+                model_path=self.model_path
+            )
+        
+        if dtype_name.startswith('float8'):
+            return torch.bfloat16, dtype
+        if self.config.quantization_method == 'fp8':
+            return dtype, torch.float8_e4m3fn
+        return dtype, None
+    
+    def _get_quantization_config(self) -> Any:
+        """
+        获取加载时使用的量化配置
+        
+        Returns:
+            Any: bnb_int8 时为 diffusers 的 BitsAndBytesConfig，其余方式为 None
+            
+        Raises:
+            ModelLoadError: bitsandbytes 量化依赖未安装
+        """
+        if self.config.quantization_method != 'bnb_int8':
+            return None
+        
+        try:
+            from diffusers import BitsAndBytesConfig
+            import bitsandbytes  # noqa: F401
+        except ImportError as e:
+            raise ModelLoadError(
+                f"quantization_method 'bnb_int8' requires diffusers and bitsandbytes: {e}",
+                model_path=self.model_path
+            )
+        return BitsAndBytesConfig(load_in_8bit=True)
+    
+    def _apply_quantization(self, model: Any) -> None:
+        """
+        对管道中的 Transformer 执行加载后量化
+        
+        fp8 存储通过 diffusers 的按层类型转换实现，quanto_fp8 使用 optimum-quanto 的
+        qfloat8 权重量化，torchao_int8 / torchao_fp8 使用 torchao 的仅权重量化。
+        bnb_int8 在加载时完成，这里不做处理。VAE 保持原精度，避免解码瑕疵。
+        
+        图生图管道与文生图管道共享 Transformer，同一模块只量化一次。
+        
+        Args:
+            model: 已加载的管道，或按任务类型组织的管道字典
+            
+        Raises:
+            ModelLoadError: 量化依赖未安装或模型不支持
+        """
+        quantized = set()
+        pipelines = model.values() if isinstance(model, dict) else [model]
+        for pipeline in pipelines:
+            transformer = getattr(pipeline, 'transformer', None)
+            if isinstance(transformer, torch.nn.Module) and id(transformer) not in quantized:
+                quantized.add(id(transformer))
+                self._quantize_transformer(transformer)
+    
+    def _quantize_transformer(self, transformer: torch.nn.Module) -> None:
+        """
+        按配置量化单个 Transformer
+        
+        Args:
+            transformer: 管道中的 Transformer 模块
+            
+        Raises:
+            ModelLoadError: 量化依赖未安装或模型不支持
+        """
+        compute_dtype, storage_dtype = self._resolve_dtypes()
+        if storage_dtype is not None:
+            if not hasattr(transformer, 'enable_layerwise_casting'):
+                raise ModelLoadError(
+                    "fp8 weight storage requires a diffusers version with enable_layerwise_casting",
+                    model_path=self.model_path
+                )
+            transformer.enable_layerwise_casting(
+                storage_dtype=storage_dtype,
+                compute_dtype=compute_dtype
+            )
+            logger.info(f"Transformer weights stored as {storage_dtype}, computed in {compute_dtype}")
+        
+        if self.config.quantization_method == 'quanto_fp8':
+            try:
+                from optimum.quanto import freeze, qfloat8, quantize
+            except ImportError as e:
+                raise ModelLoadError(
+                    f"quantization_method 'quanto_fp8' requires optimum-quanto: {e}",
+                    model_path=self.model_path
+                )
+            quantize(transformer, weights=qfloat8)
+            freeze(transformer)
+            logger.info("Transformer weights quantized with optimum-quanto qfloat8")
+        
+        elif self.config.quantization_method in ('torchao_int8', 'torchao_fp8'):
+            try:
+                from torchao.quantization import float8_weight_only, int8_weight_only, quantize_
+            except ImportError as e:
+                raise ModelLoadError(
+                    f"quantization_method '{self.config.quantization_method}' requires torchao: {e}",
+                    model_path=self.model_path
+                )
+            if self.config.quantization_method == 'torchao_int8':
+                quantize_(transformer, int8_weight_only())
+            else:
+                quantize_(transformer, float8_weight_only())
+            logger.info(f"Transformer weights quantized with torchao ({self.config.quantization_method})")
+    
+    def _compile_pipeline(self, model: Any) -> None:
+        """
+        使用 torch.compile 编译管道中的 Transformer 和 VAE 解码器
+
+        以固定形状 (dynamic=False) 编译，每个分辨率生成专用的融合内核并捕获 CUDA Graph。
+        图生图管道与文生图管道共享组件，同一模块只编译一次，编译结果替换到所有管道上。
+        Transformer 块已包装特征缓存时只编译每个块内部的模块：CachedBlock 的步数计数和
+        缓存分支在 eager 模式下执行，不会让编译图随去噪步反复重编译。
+
+        Args:
+            model: 已加载的管道，或按任务类型组织的管道字典
+        """
+        if not hasattr(torch, 'compile'):
+            return
+
+        compiled: Dict[int, torch.nn.Module] = {}
+
+        def compile_module(module: torch.nn.Module) -> torch.nn.Module:
+            result = compiled.get(id(module))
+            if result is None:
+                result = torch.compile(module, mode="reduce-overhead", fullgraph=False, dynamic=False)
+                compiled[id(module)] = compiled[id(result)] = result
+            return result
+
+        pipelines = model.values() if isinstance(model, dict) else [model]
+        try:
+            for pipeline in pipelines:
+                transformer = getattr(pipeline, 'transformer', None)
+                blocks = getattr(transformer, 'transformer_blocks', None)
+                cached = (
+                    [block for block in blocks if isinstance(block, CachedBlock)]
+                    if isinstance(blocks, torch.nn.ModuleList) else []
+                )
+                if cached:
+                    for block in cached:
+                        block.module = compile_module(block.module)
+                elif isinstance(transformer, torch.nn.Module):
+                    pipeline.transformer = compile_module(transformer)
+
+                vae = getattr(pipeline, 'vae', None)
+                decoder = getattr(vae, 'decoder', None)
+                if isinstance(decoder, torch.nn.Module):
+                    vae.decoder = compile_module(decoder)
+        except Exception as e:
+            # 编译失败时继续使用 eager 模式
+            logger.warning(f"torch.compile failed, falling back to eager mode: {e}")
+            return
+
+        if compiled:
+            logger.info(f"Compiled {len(compiled) // 2} modules with torch.compile")
+    
+    def _apply_channels_last(self, model: Any) -> None:
+        """
+        将管道中的卷积模块（UNet、VAE）转换为 channels_last 内存布局
+        
+        NHWC 布局与 Tensor Core 的分块方式一致，cuDNN 可以选择更快的卷积内核。
+        Transformer 以线性层为主，不受布局影响，保持不变。
+        
+        Args:
+            model: 已加载的管道，或按任务类型组织的管道字典
+        """
+        pipelines = model.values() if isinstance(model, dict) else [model]
+        for pipeline in pipelines:
+            for name in ('unet', 'vae'):
+                module = getattr(pipeline, name, None)
+                if isinstance(module, torch.nn.Module):
+                    module.to(memory_format=torch.channels_last)
+    
+    def _enable_vae_tiling(self, model: Any) -> bool:
+        """
+        为管道中的 VAE 启用分块和切片解码
+        
+        分块解码把潜变量切成重叠的块逐块解码再拼接，峰值显存由 vae_tile_size 决定而不是整图
+        分辨率；切片解码让批内图像逐张解码。
+        
+        Args:
+            model: 已加载的管道，或按任务类型组织的管道字典
+            
+        Returns:
+            bool: 是否至少为一个 VAE 启用了分块解码
+        """
+        tile_size = self.config.vae_tile_size
+        if tile_size <= 0:
+            return False
+        
+        tiled = False
+        pipelines = model.values() if isinstance(model, dict) else [model]
+        for pipeline in pipelines:
+            vae = getattr(pipeline, 'vae', None)
+            if not hasattr(vae, 'enable_tiling'):
+                continue
+            vae.enable_tiling()
+            if hasattr(vae, 'tile_sample_min_height'):
+                vae.tile_sample_min_height = vae.tile_sample_min_width = tile_size
+            elif hasattr(vae, 'tile_sample_min_size'):
+                # 潜空间块大小按 VAE 的下采样倍数同步缩放
+                scale = vae.tile_sample_min_size // vae.tile_latent_min_size
+                vae.tile_sample_min_size = tile_size
+                vae.tile_latent_min_size = tile_size // scale
+            if hasattr(vae, 'enable_slicing'):
+                vae.enable_slicing()
+            tiled = True
+        
+        if tiled:
+            logger.info(f"VAE tiled decoding enabled (tile size {tile_size})")
+        return tiled
+    
+    def _apply_sdpa_attention(self, model: Any) -> None:
+        """
+        让管道中 UNet 的注意力使用融合的 scaled_dot_product_attention
+        
+        SDPA 在 CUDA 上分派到 FlashAttention / 内存高效注意力内核，计算量不变，但不再物化
+        完整的注意力矩阵，显存带宽和峰值激活占用都更低。PyTorch 不提供 SDPA 时回退到 xformers。
+        qwen-image 的 Transformer 自带基于 SDPA 的注意力处理器，不做替换。
+        
+        Args:
+            model: 已加载的管道，或按任务类型组织的管道字典
+        """
+        use_sdpa = hasattr(torch.nn.functional, 'scaled_dot_product_attention')
+        pipelines = model.values() if isinstance(model, dict) else [model]
+        for pipeline in pipelines:
+            unet = getattr(pipeline, 'unet', None)
+            if not hasattr(unet, 'set_attn_processor'):
+                continue
+            try:
+                if use_sdpa:
+                    from diffusers.models.attention_processor import AttnProcessor2_0
+                    unet.set_attn_processor(AttnProcessor2_0())
+                else:
+                    pipeline.enable_xformers_memory_efficient_attention()
+            except Exception as e:
+                # 无法启用时继续使用默认注意力实现
+                logger.warning(f"Failed to enable fused attention: {e}")
+    
+    @contextmanager
+    def _reader(self):
+        """
+        推理期间持有的模型使用计数
+        
+        多个推理可以同时持有；cleanup 在计数归零前不会释放模型。
+        
+        Raises:
+            ModelNotLoadedError: 模型未加载或正在清理
+        """
+        with self._requests_idle:
+            if not self._model_loaded:
+                raise ModelNotLoadedError()
+            self._active_requests += 1
+        try:
+            yield
+        finally:
+            with self._requests_idle:
+                self._active_requests -= 1
+                if not self._active_requests:
+                    self._requests_idle.notify_all()
+    
+    def _autocast(self):
+        """CUDA 半精度推理的 autocast 上下文，未启用时为空上下文"""
+        if self._autocast_dtype is None:
+            return nullcontext()
+        return torch.autocast("cuda", dtype=self._autocast_dtype)
+    
+    def _tensor_scope(self):
+        """单次推理的张量池作用域，未启用张量池时为空上下文"""
+        if self.tensor_pool is None:
+            return nullcontext()
+        return self.tensor_pool.scope()
+    
+    def _prepare_feature_cache(self, cache_interval: Optional[int] = None) -> None:
+        """
+        在每次生成前重置各块的步数和缓存残差
+        
+        Args:
+            cache_interval: 本次生成使用的缓存间隔，未指定时使用配置值
+        """
+        self._feature_cache.reset(cache_interval or self.config.cache_interval)
+        for block in self._cached_blocks:
+            block.reset()
+    
+    def _step_callback(self) -> Dict[str, Any]:
+        """特征缓存启用时传给管道的 callback_on_step_end 参数，用于推进去噪步"""
+        if not self._cached_blocks:
+            return {}
+        return {'callback_on_step_end': self._feature_cache.end_step}
+    
+    def _get_shape_state(self, width: int, height: int,
+                         num_inference_steps: int, guidance_scale: float) -> Dict[str, Any]:
+        """
+        获取按生成参数缓存的推理准备结果
+        
+        分辨率、步数和引导比例通常来自少量预设，相同参数的请求复用同一份准备结果。
+        真实管道中这里应缓存 scheduler 时间步、潜变量形状和位置编码等张量。
+        
+        Returns:
+            Dict[str, Any]: 只读的准备结果，可变部分需由调用方复制
+        """
+        key = (width, height, num_inference_steps, guidance_scale,
+               self.config.device, self.config.torch_dtype)
+        
+        with self._cache_lock:
+            state = self._shape_cache.get(key)
+            if state is not None:
+                self._shape_cache.move_to_end(key)
+                return state
+        
+        from PIL import ImageDraw
+        
+        font = self._DEFAULT_FONT
+        
+        # 预先绘制参数信息，请求只需在副本上绘制提示词
+        canvas = Image.new('RGB', (width, height), color='lightblue')
+        params_text = f"{width}x{height}, steps:{num_inference_steps}, scale:{guidance_scale}"
+        ImageDraw.Draw(canvas).text((10, 30), params_text, fill='darkblue', font=font)
+        
+        state = {'canvas': canvas, 'font': font}
+        
+        with self._cache_lock:
+            self._shape_cache[key] = state
+            if len(self._shape_cache) > SHAPE_CACHE_SIZE:
+                self._shape_cache.popitem(last=False)
+        
+        return state
+    
+    def _encode_prompt(self, prompt: str) -> Any:
+        """
+        编码提示词，结果按规范化提示词的哈希缓存（LRU）
+        
+        提示词先合并连续空白再编码，只有空白差异的提示词共享同一条缓存。绑定了文生图管道时
+        返回文本编码器输出的 (prompt_embeds, prompt_embeds_mask)，模拟实现中返回提示词摘要。
+        """
+        normalized = " ".join(prompt.split())
+        key = hashlib.blake2b(normalized.encode(), digest_size=16).digest()
+        
+        with self._cache_lock:
+            encoded = self._prompt_cache.get(key)
+            if encoded is not None:
+                self._prompt_cache.move_to_end(key)
+                return encoded
+        
+        pipeline = self._t2i_pipe
+        if pipeline is not None:
+            encoded = pipeline.encode_prompt(prompt=normalized, device=self._device)
+        else:
+            # 模拟实现直接复用缓存键的前 4 字节作为摘要，不再额外计算 MD5
+            encoded = key[:4].hex()
+        
+        with self._cache_lock:
+            self._prompt_cache[key] = encoded
+            if len(self._prompt_cache) > PROMPT_CACHE_SIZE:
+                self._prompt_cache.popitem(last=False)
+        
+        return encoded
+    
+    def clear_caches(self) -> None:
+        """清空形状缓存和提示词编码缓存"""
+        with self._cache_lock:
+            self._shape_cache.clear()
+            self._prompt_cache.clear()
+    
+    def _execute_text_to_image_batch(self, prompts: List[str], width: int, height: int,
+                                     num_inference_steps: int, guidance_scale: float) -> List[Image.Image]:
+        """
+        执行批量文生图推理
+
+        Args:
+            prompts: 文本提示词列表
+            width: 图像宽度
+            height: 图像高度
+            num_inference_steps: 推理步数
+            guidance_scale: 引导比例
+
+        Returns:
+            List[PIL.Image.Image]: 生成的图像列表
+        """
+        try:
+            # 一次性传入按批堆叠的提示词编码，由管道在批维度上堆叠潜变量
+            # 各提示词的编码结果来自缓存，重复提示词不再运行文本编码器
+            pipeline = self._t2i_pipe
+            if pipeline is not None:
+                prompt_embeds, prompt_embeds_mask = self._stack_prompt_embeds(
+                    [self._encode_prompt(prompt) for prompt in prompts]
+                )
+                return pipeline(
+                    prompt_embeds=prompt_embeds,
+                    prompt_embeds_mask=prompt_embeds_mask,
+                    width=width,
+                    height=height,
+                    num_inference_steps=num_inference_steps,
+                    guidance_scale=guidance_scale,
+                    **self._step_callback()
+                ).images
+
+            # 临时模拟实现 - 逐个生成测试图像
+            return [
+                self._execute_text_to_image(
+                    prompt=prompt,
+                    width=width,
+                    height=height,
+                    num_inference_steps=num_inference_steps,
+                    guidance_scale=guidance_scale
+                )
+                for prompt in prompts
+            ]
+
+        except Exception as e:
+            logger.error(f"Batched text-to-image inference failed: {str(e)}")
+            raise RuntimeError(f"Text-to-image inference error: {str(e)}")
+
+    @staticmethod
+    def _stack_prompt_embeds(encoded: List[Tuple[torch.Tensor, torch.Tensor]]) -> Tuple[torch.Tensor, torch.Tensor]:
+        """
+        将逐条缓存的 (prompt_embeds, prompt_embeds_mask) 拼接为一批
+
+        各提示词的 token 数不同，按最长序列在末尾补零，补齐部分的掩码为 0。
+
+        Args:
+            encoded: 每个提示词的编码结果，批维度为 1
+
+        Returns:
+            Tuple[torch.Tensor, torch.Tensor]: 批量的 prompt_embeds 和 prompt_embeds_mask
+        """
+        seq_len = max(embeds.shape[1] for embeds, _ in encoded)
+        embeds, masks = [], []
+        for e, m in encoded:
+            if m is None:
+                m = torch.ones(e.shape[:2], dtype=torch.long, device=e.device)
+            embeds.append(torch.nn.functional.pad(e, (0, 0, 0, seq_len - e.shape[1])))
+            masks.append(torch.nn.functional.pad(m, (0, seq_len - m.shape[1])))
+        return torch.cat(embeds), torch.cat(masks)
+    
     def _execute_image_to_image(self, image: Image.Image, prompt: str, strength: float,
                                width: int, height: int, num_inference_steps: int) -> Image.Image:
         """
@@ -473,7 +1432,7 @@ class ModelManager(ModelManagerInterface):
             #     images=image,
             #     return_tensors="pt"
             # )
-            # with torch.no_grad():
+            # with torch.inference_mode():
             #     outputs = self.model.generate(
             #         **inputs,
             #         width=width,
@@ -483,16 +1442,18 @@ class ModelManager(ModelManagerInterface):
             #     )
             # result_image = self.processor.decode(outputs[0])
             
-            # 方案2: 使用 diffusers
-            # pipeline = self.model['image_to_image']
-            # result_image = pipeline(
-            #     prompt=prompt,
-            #     image=image,
-            #     strength=strength,
-            #     width=width,
-            #     height=height,
-            #     num_inference_steps=num_inference_steps
-            # ).images[0]
+            # 方案2: 使用 diffusers，直接调用加载时绑定的管道
+            pipeline = self._i2i_pipe
+            if pipeline is not None:
+                return pipeline(
+                    prompt=prompt,
+                    image=self._stage_image(image),
+                    strength=strength,
+                    width=width,
+                    height=height,
+                    num_inference_steps=num_inference_steps,
+                    **self._step_callback()
+                ).images[0]
             
             # 方案3: 使用专门的 qwen-image API
             # result_image = self.model.image_to_image(
@@ -504,9 +1465,12 @@ class ModelManager(ModelManagerInterface):
             #     num_inference_steps=num_inference_steps
             # )
             
-            # 临时模拟实现 - 基于输入图像创建变换后的图像
-            import hashlib
-            from PIL import ImageDraw, ImageFont, ImageEnhance
+            # 临时模拟实现 - 未开启 debug_stub 时直接返回纯色图像
+            if not self.config.debug_stub:
+                return Image.new('RGB', (width, height), color='lightblue')
+            
+            # 基于输入图像创建变换后的图像
+            from PIL import ImageDraw, ImageEnhance
             
             # 调整输入图像尺寸
             result_image = image.resize((width, height), Image.Resampling.LANCZOS)
@@ -522,13 +1486,10 @@ class ModelManager(ModelManagerInterface):
             
             # 添加文本信息（用于测试验证）
             draw = ImageDraw.Draw(result_image)
-            try:
-                font = ImageFont.load_default()
-            except:
-                font = None
+            font = self._DEFAULT_FONT
             
             # 在图像上绘制提示词的哈希值
-            prompt_hash = hashlib.md5(prompt.encode()).hexdigest()[:8]
+            prompt_hash = self._encode_prompt(prompt)
             text = f"Img2Img: {prompt_hash}"
             draw.text((10, 10), text, fill='white', font=font)
             
@@ -550,8 +1511,8 @@ class ModelManager(ModelManagerInterface):
             str: 设备名称
         """
         if self.config.device == "auto":
-            return "cuda" if torch.cuda.is_available() else "cpu"
-        elif self.config.device == "cuda" and not torch.cuda.is_available():
+            return "cuda" if CUDA_AVAILABLE else "cpu"
+        elif self.config.device == "cuda" and not CUDA_AVAILABLE:
             logger.warning("CUDA not available, falling back to CPU")
             return "cpu"
         else:
@@ -583,14 +1544,18 @@ class ModelManager(ModelManagerInterface):
         if guidance_scale is not None and not 1.0 <= guidance_scale <= 20.0:
             raise ValidationError("guidance_scale must be between 1.0 and 20.0", parameter="guidance_scale")
     
-    def _preprocess_image(self, image: Image.Image, target_width: int, target_height: int) -> Image.Image:
+    def _preprocess_image(self, image: Image.Image, target_width: int, target_height: int,
+                          strength: Optional[float] = None) -> Image.Image:
         """
         预处理输入图像
         
+        变换强度较高时，加噪会抹掉输入图像的高频细节，缩放改用更快的双线性插值。
+        
         Args:
             image: 输入图像
             target_width: 目标宽度
             target_height: 目标高度
+            strength: 图生图变换强度（可选）
             
         Returns:
             PIL.Image.Image: 预处理后的图像
@@ -601,27 +1566,77 @@ class ModelManager(ModelManagerInterface):
         
         # 调整大小
         if image.size != (target_width, target_height):
-            image = image.resize((target_width, target_height), Image.Resampling.LANCZOS)
+            resample = (
+                Image.Resampling.BILINEAR
+                if strength is not None and strength > FAST_RESAMPLE_STRENGTH
+                else Image.Resampling.LANCZOS
+            )
+            image = image.resize((target_width, target_height), resample)
         
         return image
     
+    def _allocate_staging(self) -> None:
+        """
+        分配图生图输入的 H2D 传输缓冲区
+        
+        按最大支持分辨率一次性分配锁页内存暂存区、设备端缓冲区和专用拷贝流，
+        之后每次请求只写入暂存区并发起异步拷贝，不再逐次分配。
+        """
+        max_resolution = SUPPORTED_FORMATS['max_resolution']
+        numel = max_resolution['width'] * max_resolution['height'] * 3
+        self._pin_buf = torch.empty(numel, dtype=torch.uint8, pin_memory=True)
+        self._gpu_img = torch.empty(numel, dtype=torch.uint8, device="cuda")
+        self._copy_stream = torch.cuda.Stream()
+        self._copy_done = torch.cuda.Event()
+    
+    def _stage_image(self, image: Image.Image) -> Any:
+        """
+        将预处理后的图像经锁页暂存区异步拷贝到 GPU
+        
+        拷贝和归一化在专用流上执行，当前流只在使用结果前等待拷贝流，可与前一次推理的
+        GPU 计算重叠。暂存区未分配（非 CUDA 设备）时原样返回图像。
+        
+        Args:
+            image: 预处理后的 RGB 图像
+            
+        Returns:
+            Any: 形状 (1, 3, H, W)、取值 [0, 1] 的设备张量，或原图像
+        """
+        if self._pin_buf is None:
+            return image
+        
+        width, height = image.size
+        numel = width * height * 3
+        with self._staging_lock:
+            # 上一次拷贝完成前不能覆写暂存区
+            self._copy_done.synchronize()
+            host = self._pin_buf[:numel].view(height, width, 3)
+            np.copyto(host.numpy(), np.asarray(image))
+            
+            current = torch.cuda.current_stream()
+            with torch.cuda.stream(self._copy_stream):
+                device_image = self._gpu_img[:numel].view(height, width, 3)
+                device_image.copy_(host, non_blocking=True)
+                self._copy_done.record()
+                chw = device_image.permute(2, 0, 1).unsqueeze(0)
+                if self.tensor_pool is not None:
+                    # 归一化结果从张量池租用，推理结束时随作用域归还
+                    tensor = self.tensor_pool.rent(chw.shape, torch.float32, "cuda")
+                    tensor.copy_(chw).div_(255)
+                else:
+                    tensor = chw.float().div_(255)
+            tensor.record_stream(current)
+            current.wait_stream(self._copy_stream)
+        return tensor
+    
     def get_supported_formats(self) -> Dict[str, Any]:
         """
         获取支持的图像格式和参数范围
         
         Returns:
-            Dict[str, Any]: 支持的格式和参数信息
+            Dict[str, Any]: 支持的格式和参数信息（共享的静态字典，调用方不应修改）
         """
-        return {
-            'image_formats': ['JPEG', 'PNG', 'WEBP', 'BMP'],
-            'max_resolution': {'width': 2048, 'height': 2048},
-            'min_resolution': {'width': 256, 'height': 256},
-            'inference_steps_range': {'min': 1, 'max': 100},
-            'guidance_scale_range': {'min': 1.0, 'max': 20.0},
-            'strength_range': {'min': 0.1, 'max': 1.0},
-            'supported_dtypes': ['float16', 'float32', 'bfloat16'],
-            'supported_devices': ['cpu', 'cuda', 'auto']
-        }
+        return SUPPORTED_FORMATS
     
     def format_inference_result(self, image: Image.Image, metadata: Dict[str, Any] = None) -> Dict[str, Any]:
         """
@@ -640,7 +1655,7 @@ class ModelManager(ModelManagerInterface):
             'height': image.height,
             'mode': image.mode,
             'format': image.format or 'PNG',
-            'size_bytes': len(image.tobytes()) if hasattr(image, 'tobytes') else None
+            'size_bytes': self._estimated_size_bytes(image)
         }
         
         if metadata:
@@ -648,6 +1663,26 @@ class ModelManager(ModelManagerInterface):
             
         return result
     
+    @staticmethod
+    def _estimated_size_bytes(image: Image.Image) -> Optional[int]:
+        """
+        按尺寸和模式计算图像原始像素数据的字节数，不复制像素缓冲区
+        
+        Args:
+            image: PIL 图像
+            
+        Returns:
+            Optional[int]: 字节数，无法确定时为 None
+        """
+        if image.mode == '1':
+            # 1 位图按行补齐到整字节
+            return (image.width + 7) // 8 * image.height
+        
+        bytes_per_pixel = _BYTES_PER_PIXEL.get(image.mode)
+        if bytes_per_pixel is not None:
+            return image.width * image.height * bytes_per_pixel
+        return len(image.tobytes()) if hasattr(image, 'tobytes') else None
+    
     def validate_inference_request(self, request_type: str, **kwargs) -> Dict[str, Any]:
         """
         验证推理请求参数
@@ -709,6 +1744,21 @@ class ModelManager(ModelManagerInterface):
         
         return validated_params
     
+    def _gpu_total_memory(self) -> int:
+        """GPU 总显存字节数，首次查询后缓存"""
+        if self._gpu_total_mem is None:
+            self._gpu_total_mem = torch.cuda.get_device_properties(0).total_memory
+        return self._gpu_total_mem
+    
+    def _gpu_free_memory(self) -> int:
+        """
+        可用于推理的 GPU 显存字节数
+        
+        驱动报告的空闲显存，加上缓存分配器已保留但未分配的部分。
+        """
+        free, _ = torch.cuda.mem_get_info(0)
+        return free + torch.cuda.memory_reserved(0) - torch.cuda.memory_allocated(0)
+    
     def _check_memory_availability(self) -> None:
         """
         检查内存可用性
@@ -716,9 +1766,11 @@ class ModelManager(ModelManagerInterface):
         Raises:
             MemoryError: 内存不足
         """
+        if psutil is None:
+            logger.warning("psutil not available, skipping memory check")
+            return
+        
         try:
-            import psutil
-            
             # 检查系统内存
             memory = psutil.virtual_memory()
             available_gb = memory.available / (1024**3)
@@ -733,17 +1785,14 @@ class ModelManager(ModelManagerInterface):
                 )
             
             # 检查 GPU 内存（如果使用 CUDA）
-            if torch.cuda.is_available() and self.config.device in ['cuda', 'auto']:
-                gpu_memory = torch.cuda.get_device_properties(0).total_memory
-                gpu_available = gpu_memory - torch.cuda.memory_allocated(0)
-                gpu_available_gb = gpu_available / (1024**3)
+            if self._is_cuda:
+                gpu_available_gb = self._gpu_free_memory() / (1024**3)
                 
                 if gpu_available_gb < min_required_gb:
                     logger.warning(f"Low GPU memory: {gpu_available_gb:.1f}GB available")
                     
-        except ImportError:
-            # psutil 不可用，跳过内存检查
-            logger.warning("psutil not available, skipping memory check")
+        except MemoryError:
+            raise
         except Exception as e:
             logger.warning(f"Memory check failed: {str(e)}")
     
@@ -761,22 +1810,22 @@ class ModelManager(ModelManagerInterface):
         try:
             # 估算内存需求（简化计算）
             pixels = width * height
-            # 假设每个像素需要 4 字节（RGBA），加上模型中间结果的内存开销
-            estimated_mb = (pixels * 4 * 3) / (1024**2)  # 3倍开销用于中间结果
+            # 假设每个像素需要 4 字节（RGBA），加上模型中间结果的内存开销：整图 VAE 解码按 3 倍
+            # 估算，分块解码时最大的整图激活不再出现
+            overhead = 1 if self._vae_tiled else 3
+            estimated_mb = (pixels * 4 * overhead) / (1024**2)
             
-            if torch.cuda.is_available() and self.config.device in ['cuda', 'auto']:
+            if self._is_cuda:
                 # 检查 GPU 内存
-                gpu_memory_free = torch.cuda.get_device_properties(0).total_memory - torch.cuda.memory_allocated(0)
-                gpu_free_mb = gpu_memory_free / (1024**2)
+                gpu_free_mb = self._gpu_free_memory() / (1024**2)
                 
                 if estimated_mb > gpu_free_mb * 0.8:  # 保留 20% 缓冲
                     raise MemoryError(
                         f"Insufficient GPU memory for inference. "
                         f"Estimated need: {estimated_mb:.1f}MB, Available: {gpu_free_mb:.1f}MB"
                     )
-            else:
-                # 检查系统内存
-                import psutil
+            elif psutil is not None:
+                # 检查系统内存（psutil 不可用时跳过）
                 memory = psutil.virtual_memory()
                 available_mb = memory.available / (1024**2)
                 
@@ -786,20 +1835,29 @@ class ModelManager(ModelManagerInterface):
                         f"Estimated need: {estimated_mb:.1f}MB, Available: {available_mb:.1f}MB"
                     )
                     
-        except ImportError:
-            # psutil 不可用，跳过内存检查
-            pass
+        except MemoryError:
+            raise
         except Exception as e:
             logger.warning(f"Inference memory check failed: {str(e)}")
     
+    def _record_inference(self, count: int = 1) -> None:
+        """记录成功推理次数"""
+        with self._stats_lock:
+            self._inference_count += count
+    
+    def _record_error(self) -> None:
+        """记录一次失败"""
+        with self._stats_lock:
+            self._error_count += 1
+    
     def _update_memory_usage(self) -> None:
         """更新内存使用统计"""
         try:
-            if torch.cuda.is_available() and self.config.device in ['cuda', 'auto']:
+            if self._is_cuda:
                 current_usage = torch.cuda.memory_allocated(0) / (1024**2)  # MB
-                self._memory_usage['current'] = current_usage
-                if current_usage > self._memory_usage['peak']:
-                    self._memory_usage['peak'] = current_usage
+                with self._stats_lock:
+                    self._memory_usage['current'] = current_usage
+                    self._memory_usage['peak'] = max(self._memory_usage['peak'], current_usage)
         except Exception as e:
             logger.warning(f"Memory usage update failed: {str(e)}")
     
@@ -810,18 +1868,23 @@ class ModelManager(ModelManagerInterface):
         Returns:
             Dict[str, Any]: 资源统计信息
         """
+        with self._stats_lock:
+            inference_count = self._inference_count
+            error_count = self._error_count
+            memory_usage = self._memory_usage.copy()
+        
         stats = {
-            'inference_count': self._inference_count,
-            'error_count': self._error_count,
-            'memory_usage_mb': self._memory_usage.copy(),
+            'inference_count': inference_count,
+            'error_count': error_count,
+            'memory_usage_mb': memory_usage,
             'model_loaded': self._model_loaded
         }
         
         # 添加设备信息
-        if torch.cuda.is_available():
+        if self._is_cuda:
             stats['gpu_info'] = {
                 'device_name': torch.cuda.get_device_name(0),
-                'total_memory_mb': torch.cuda.get_device_properties(0).total_memory / (1024**2),
+                'total_memory_mb': self._gpu_total_memory() / (1024**2),
                 'allocated_memory_mb': torch.cuda.memory_allocated(0) / (1024**2),
                 'cached_memory_mb': torch.cuda.memory_reserved(0) / (1024**2)
             }
@@ -830,9 +1893,10 @@ class ModelManager(ModelManagerInterface):
     
     def reset_stats(self) -> None:
         """重置统计信息"""
-        self._inference_count = 0
-        self._error_count = 0
-        self._memory_usage = {'peak': 0, 'current': 0}
+        with self._stats_lock:
+            self._inference_count = 0
+            self._error_count = 0
+            self._memory_usage = {'peak': 0, 'current': 0}
         logger.info("Resource statistics reset")
     
     def health_check(self) -> Dict[str, Any]:
@@ -856,8 +1920,8 @@ class ModelManager(ModelManagerInterface):
                 health['status'] = 'unhealthy'
             
             # 检查内存状态
-            if torch.cuda.is_available() and self.config.device in ['cuda', 'auto']:
-                gpu_memory_used = torch.cuda.memory_allocated(0) / torch.cuda.get_device_properties(0).total_memory
+            if self._is_cuda:
+                gpu_memory_used = torch.cuda.memory_allocated(0) / self._gpu_total_memory()
                 if gpu_memory_used > 0.9:
                     health['issues'].append(f'High GPU memory usage: {gpu_memory_used:.1%}')
                     health['status'] = 'warning'
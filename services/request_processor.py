@@ -5,26 +5,154 @@
 """
 
 import io
-import base64
-from typing import Optional, Dict, Any, List
+import struct
+from typing import BinaryIO, Optional, Dict, Any, List, Tuple
 from PIL import Image
 from fastapi import UploadFile, HTTPException
 import logging
 
+try:
+    # pybase64 按 CPU 指令集（SSSE3/AVX2/AVX-512）分派 SIMD 编码内核
+    from pybase64 import b64encode, b64encode_as_string
+except ImportError:  # pybase64 为可选依赖，未安装时使用标准库实现
+    from base64 import b64encode
+
+    def b64encode_as_string(s: bytes) -> str:
+        """将字节编码为 base64 字符串"""
+        return b64encode(s).decode('ascii')
+
 from models.requests import TextToImageRequest, ImageToImageRequest
 from models.responses import ImageResponse, ErrorResponse
 
 logger = logging.getLogger(__name__)
 
+# JPEG 输出质量：生成图像在该质量下与无损输出肉眼无差别
+JPEG_QUALITY = 92
+
+# JPEG 可直接编码的颜色模式，其他模式编码前转换为 RGB
+_JPEG_MODES = ("RGB", "L")
+
+# 图像文件头签名到 MIME 类型的对照表（前 12 字节足以区分）
+_IMAGE_SIGNATURES = (
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"BM", "image/bmp"),
+    (b"II*\x00", "image/tiff"),
+    (b"MM\x00*", "image/tiff"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+)
+
+
+def sniff_mime(head: bytes) -> Optional[str]:
+    """
+    根据文件头识别图像 MIME 类型
+    
+    Args:
+        head: 文件开头的字节（至少 12 字节以识别 WebP）
+        
+    Returns:
+        Optional[str]: MIME 类型，无法识别时返回 None
+    """
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    for signature, mime in _IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return mime
+    return None
+
+
+# 带有图像尺寸的 JPEG 帧头标记（SOF0-SOF15，不含 DHT/JPG/DAC）
+_JPEG_SOF_MARKERS = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+# 扫描 JPEG 段时最多读取的字节数，超过仍未找到帧头时交给 PIL 判断
+_JPEG_SCAN_LIMIT = 1024 * 1024
+
+
+def _sniff_jpeg_size(stream: BinaryIO) -> Optional[Tuple[int, int]]:
+    """逐段跳过 JPEG 头部，读取第一个帧头（SOFn）中的宽高，stream 位于 SOI 之后"""
+    while stream.tell() < _JPEG_SCAN_LIMIT:
+        byte = stream.read(1)
+        if byte != b"\xff":
+            return None
+        marker = stream.read(1)
+        while marker == b"\xff":  # 填充字节
+            marker = stream.read(1)
+        if not marker:
+            return None
+        code = marker[0]
+        if code == 0x01 or 0xD0 <= code <= 0xD8:  # 无长度字段的标记
+            continue
+        segment = stream.read(2)
+        if len(segment) < 2:
+            return None
+        length = struct.unpack(">H", segment)[0]
+        if code in _JPEG_SOF_MARKERS:
+            frame = stream.read(5)
+            if len(frame) < 5:
+                return None
+            height, width = struct.unpack(">xHH", frame)
+            return width, height
+        stream.seek(length - 2, io.SEEK_CUR)
+    return None
+
+
+def sniff_image_info(stream: BinaryIO) -> Optional[Tuple[str, int, int]]:
+    """
+    只读取文件头识别图像格式和尺寸
+    
+    PNG 读取 IHDR，WebP 读取 VP8/VP8L/VP8X 块头，BMP 读取 DIB 头，JPEG 逐段跳到帧头，
+    不构造 PIL 解析器。调用方负责复位流位置。
+    
+    Args:
+        stream: 位于文件开头的可 seek 二进制流
+        
+    Returns:
+        Optional[Tuple[str, int, int]]: (PIL 格式名, 宽, 高)，无法识别时返回 None
+    """
+    head = stream.read(30)
+    if head.startswith(b"\x89PNG\r\n\x1a\n") and head[12:16] == b"IHDR":
+        width, height = struct.unpack(">II", head[16:24])
+        return "PNG", width, height
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP" and len(head) >= 30:
+        chunk = head[12:16]
+        if chunk == b"VP8 ":
+            width, height = struct.unpack("<HH", head[26:30])
+            return "WEBP", width & 0x3FFF, height & 0x3FFF
+        if chunk == b"VP8L":
+            bits = struct.unpack("<I", head[21:25])[0]
+            return "WEBP", (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+        if chunk == b"VP8X":
+            width = int.from_bytes(head[24:27], "little") + 1
+            height = int.from_bytes(head[27:30], "little") + 1
+            return "WEBP", width, height
+        return None
+    if head.startswith(b"BM") and len(head) >= 26:
+        header_size = struct.unpack("<I", head[14:18])[0]
+        if header_size == 12:  # OS/2 BITMAPCOREHEADER
+            width, height = struct.unpack("<HH", head[18:22])
+        else:
+            width, height = struct.unpack("<ii", head[18:26])
+        return "BMP", abs(width), abs(height)
+    if head.startswith(b"\xff\xd8"):
+        stream.seek(2)
+        size = _sniff_jpeg_size(stream)
+        if size is not None:
+            return ("JPEG",) + size
+    return None
+
 
 class RequestProcessor:
     """请求处理器类"""
     
     # 支持的图像格式
-    SUPPORTED_IMAGE_FORMATS = {"JPEG", "PNG", "WEBP", "BMP"}
+    SUPPORTED_IMAGE_FORMATS = frozenset({"JPEG", "PNG", "WEBP", "BMP"})
+    
+    # 错误信息中列出的支持格式，只拼接一次
+    SUPPORTED_IMAGE_FORMATS_STR = ", ".join(sorted(SUPPORTED_IMAGE_FORMATS))
     
-    # 支持的文件扩展名
-    SUPPORTED_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp", ".bmp"}
+    # get_supported_formats 返回的有序列表，只构建一次
+    _SUPPORTED_FORMATS_LIST = sorted(SUPPORTED_IMAGE_FORMATS)
     
     # 最大文件大小 (10MB)
     MAX_FILE_SIZE = 10 * 1024 * 1024
@@ -32,14 +160,18 @@ class RequestProcessor:
     # 最大图像尺寸
     MAX_IMAGE_DIMENSION = 2048
 
-    def __init__(self, max_file_size: Optional[int] = None):
+    def __init__(self, max_file_size: Optional[int] = None, allowed_file_types: Optional[List[str]] = None):
         """
         初始化请求处理器
         
         Args:
             max_file_size: 最大文件大小限制（字节）
+            allowed_file_types: 允许的图像 MIME 类型，为 None 时不按文件头检查
         """
         self.max_file_size = max_file_size or self.MAX_FILE_SIZE
+        self.allowed_file_types = (
+            frozenset(t.lower() for t in allowed_file_types) if allowed_file_types is not None else None
+        )
         logger.info(f"RequestProcessor initialized with max_file_size={self.max_file_size}")
 
     def validate_text_request(self, request: TextToImageRequest) -> bool:
@@ -126,6 +258,8 @@ class RequestProcessor:
         """
         处理图像文件上传
         
+        文件类型只按内容（文件头）判断，不检查文件扩展名。
+        
         Args:
             file: 上传的文件对象
             
@@ -137,58 +271,64 @@ class RequestProcessor:
         """
         try:
             # 检查文件大小
-            if hasattr(file, 'size') and file.size > self.max_file_size:
+            if getattr(file, 'size', None) is not None and file.size > self.max_file_size:
                 raise HTTPException(
                     status_code=413,
                     detail=f"文件大小超过限制 ({self.max_file_size / 1024 / 1024:.1f}MB)"
                 )
             
-            # 检查文件扩展名
-            if file.filename:
-                file_ext = file.filename.lower().split('.')[-1]
-                if f".{file_ext}" not in self.SUPPORTED_EXTENSIONS:
-                    raise HTTPException(
-                        status_code=415,
-                        detail=f"不支持的文件格式。支持的格式: {', '.join(self.SUPPORTED_EXTENSIONS)}"
-                    )
-            
-            # 读取文件内容
-            file_content = file.file.read()
+            # 不读入内存，直接获取上传文件（SpooledTemporaryFile）的实际大小
+            stream = file.file
+            stream.seek(0, io.SEEK_END)
+            file_size = stream.tell()
+            stream.seek(0)
             
             # 检查实际文件大小
-            if len(file_content) > self.max_file_size:
+            if file_size > self.max_file_size:
                 raise HTTPException(
                     status_code=413,
                     detail=f"文件大小超过限制 ({self.max_file_size / 1024 / 1024:.1f}MB)"
                 )
             
-            # 尝试打开图像
-            try:
-                image = Image.open(io.BytesIO(file_content))
-                
-                # 验证图像格式
-                if image.format not in self.SUPPORTED_IMAGE_FORMATS:
+            # 按文件头识别实际类型，未识别的交给 PIL 判断
+            if self.allowed_file_types is not None:
+                mime = sniff_mime(stream.read(12))
+                stream.seek(0)
+                if mime is not None and mime not in self.allowed_file_types:
                     raise HTTPException(
                         status_code=415,
-                        detail=f"不支持的图像格式: {image.format}。支持的格式: {', '.join(self.SUPPORTED_IMAGE_FORMATS)}"
+                        detail=f"不支持的图像类型: {mime}"
                     )
+            
+            # 只读文件头校验格式和尺寸，不合格的上传不再构造 PIL 解析器
+            info = sniff_image_info(stream)
+            stream.seek(0)
+            if info is not None:
+                self._check_format_and_size(*info)
+            
+            # 尝试打开图像：Image.open 只解析文件头，格式和尺寸检查通过后再解码像素
+            try:
+                image = Image.open(stream)
                 
-                # 检查图像尺寸
+                # 文件头未能识别的图像由 PIL 解析结果校验
                 width, height = image.size
-                if width > self.MAX_IMAGE_DIMENSION or height > self.MAX_IMAGE_DIMENSION:
-                    raise HTTPException(
-                        status_code=400,
-                        detail=f"图像尺寸过大。最大支持尺寸: {self.MAX_IMAGE_DIMENSION}x{self.MAX_IMAGE_DIMENSION}"
-                    )
+                if info is None:
+                    self._check_format_and_size(image.format, width, height)
+                
+                # 从上传流解码像素数据，之后不再依赖文件对象
+                image.load()
                 
                 # 转换为 RGB 模式（如果需要）
                 if image.mode != 'RGB':
+                    original_mode = image.mode
                     image = image.convert('RGB')
-                    logger.info(f"Converted image from {image.mode} to RGB")
+                    logger.info(f"Converted image from {original_mode} to RGB")
                 
                 logger.info(f"Image processed successfully: {width}x{height}, format={image.format}")
                 return image
                 
+            except HTTPException:
+                raise
             except Exception as e:
                 logger.error(f"Image processing error: {e}")
                 raise HTTPException(
@@ -209,39 +349,138 @@ class RequestProcessor:
             if hasattr(file.file, 'seek'):
                 file.file.seek(0)
 
+    def _check_format_and_size(self, image_format: Optional[str], width: int, height: int) -> None:
+        """
+        校验图像格式和尺寸
+        
+        Raises:
+            HTTPException: 格式不支持 (415) 或尺寸过大 (400)
+        """
+        if image_format not in self.SUPPORTED_IMAGE_FORMATS:
+            raise HTTPException(
+                status_code=415,
+                detail=f"不支持的图像格式: {image_format}。支持的格式: {self.SUPPORTED_IMAGE_FORMATS_STR}"
+            )
+        
+        if width > self.MAX_IMAGE_DIMENSION or height > self.MAX_IMAGE_DIMENSION:
+            raise HTTPException(
+                status_code=400,
+                detail=f"图像尺寸过大。最大支持尺寸: {self.MAX_IMAGE_DIMENSION}x{self.MAX_IMAGE_DIMENSION}"
+            )
+
+    def encode_image(self, image: Image.Image, image_format: str = "png") -> tuple:
+        """
+        将图像编码为字节
+        
+        使用偏向速度的编码参数：PNG 低压缩级别，WebP 最快编码方法。JPEG 由 Pillow 自带的
+        libjpeg-turbo（SIMD）编码，速度和体积都明显优于 PNG。
+        
+        Args:
+            image: PIL 图像对象
+            image_format: 输出格式 ('jpeg'、'png' 或 'webp')
+            
+        Returns:
+            tuple: (图像字节, MIME 类型)
+            
+        Raises:
+            ValueError: 不支持的输出格式
+        """
+        image_format = image_format.lower()
+        with self._encode_to_buffer(image, image_format) as buffer:
+            return buffer.getvalue(), f"image/{image_format}"
+
+    @staticmethod
+    def encoded_mode(image: Image.Image, image_format: str) -> str:
+        """
+        获取图像按指定格式编码后的颜色模式
+        
+        Args:
+            image: PIL 图像对象
+            image_format: 输出格式 ('jpeg'、'png' 或 'webp')
+            
+        Returns:
+            str: 编码结果的颜色模式，JPEG 输出中非 RGB/L 模式均转换为 RGB
+        """
+        if image_format.lower() == "jpeg" and image.mode not in _JPEG_MODES:
+            return "RGB"
+        return image.mode
+
+    def encode_image_buffer(self, image: Image.Image, image_format: str = "png") -> io.BytesIO:
+        """
+        将图像编码到内存缓冲区，供调用方按块读取而不复制出完整的 bytes
+        
+        Args:
+            image: PIL 图像对象
+            image_format: 输出格式 ('jpeg'、'png' 或 'webp')
+            
+        Returns:
+            io.BytesIO: 已写入图像数据的缓冲区，调用方负责关闭
+            
+        Raises:
+            ValueError: 不支持的输出格式
+        """
+        return self._encode_to_buffer(image, image_format.lower())
+
+    def _encode_to_buffer(self, image: Image.Image, image_format: str) -> io.BytesIO:
+        """
+        将图像编码到内存缓冲区，调用方负责关闭
+        
+        Raises:
+            ValueError: 不支持的输出格式
+        """
+        buffer = io.BytesIO()
+        if image_format == "jpeg":
+            if image.mode not in _JPEG_MODES:
+                image = image.convert("RGB")
+            image.save(buffer, format='JPEG', quality=JPEG_QUALITY)
+        elif image_format == "png":
+            image.save(buffer, format='PNG', compress_level=1)
+        elif image_format == "webp":
+            image.save(buffer, format='WEBP', quality=90, method=0)
+        else:
+            buffer.close()
+            raise ValueError(f"Unsupported output format: {image_format}")
+        return buffer
+
     def format_image_response(
         self, 
         image: Image.Image, 
-        metadata: Optional[Dict[str, Any]] = None
+        metadata: Optional[Dict[str, Any]] = None,
+        image_format: str = "jpeg"
     ) -> ImageResponse:
         """
         格式化图像响应
         
+        默认编码为 JPEG：生成图像在该质量下与 PNG 肉眼无差别，编码更快且数据量小得多，
+        后续 base64 编码的开销也随之下降。需要无损输出时传入 'png'。
+        
         Args:
             image: PIL 图像对象
             metadata: 额外的元数据
+            image_format: 输出格式 ('jpeg'、'png' 或 'webp')
             
         Returns:
             ImageResponse: 格式化的响应对象
         """
         try:
-            # 将图像转换为 base64
-            buffer = io.BytesIO()
-            image.save(buffer, format='PNG')
-            image_base64 = base64.b64encode(buffer.getvalue()).decode('utf-8')
+            # 将图像转换为 base64：直接编码缓冲区的零拷贝视图，不再复制出完整的 bytes
+            image_format = image_format.lower()
+            with self._encode_to_buffer(image, image_format) as buffer, buffer.getbuffer() as raw:
+                image_base64 = b64encode_as_string(raw)
             
             # 构建元数据
             response_metadata = {
                 "width": image.size[0],
                 "height": image.size[1],
-                "format": "PNG",
-                "mode": image.mode
+                "format": image_format.upper(),
+                "mode": self.encoded_mode(image, image_format)
             }
             
             if metadata:
                 response_metadata.update(metadata)
             
-            return ImageResponse(
+            # 响应内容完全由服务端生成，跳过字段校验
+            return ImageResponse.model_construct(
                 success=True,
                 image=image_base64,
                 metadata=response_metadata
@@ -286,9 +525,9 @@ class RequestProcessor:
         获取支持的图像格式列表
         
         Returns:
-            List[str]: 支持的格式列表
+            List[str]: 支持的格式列表（共享的静态列表，调用方不应修改）
         """
-        return list(self.SUPPORTED_IMAGE_FORMATS)
+        return self._SUPPORTED_FORMATS_LIST
 
     def get_max_file_size(self) -> int:
         """
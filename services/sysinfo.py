@@ -0,0 +1,121 @@
+"""
+系统资源采样
+
+在后台定期采集 CPU、内存和磁盘信息，健康检查和指标端点直接读取最近一次快照，
+不在请求路径上执行系统调用。
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Dict, Optional
+
+try:
+    import psutil
+except ImportError:  # psutil 为可选依赖
+    psutil = None
+
+
+logger = logging.getLogger(__name__)
+
+
+class SysInfoSampler:
+    """系统资源后台采样器"""
+
+    def __init__(self, interval: float = 2.0, ttl: float = 1.0):
+        """
+        初始化采样器
+
+        Args:
+            interval: 采样间隔 (秒)
+            ttl: 后台任务未运行时快照的有效期 (秒)，过期后读取时重新采集
+        """
+        self.interval = interval
+        self.ttl = ttl
+        self.snapshot: Optional[Dict[str, Any]] = None
+        self._sampled_at = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def available(self) -> bool:
+        """psutil 是否可用"""
+        return psutil is not None
+
+    def sample(self) -> Dict[str, Any]:
+        """
+        立即采集一次并更新快照
+
+        Returns:
+            Dict[str, Any]: 系统资源快照，psutil 不可用时为空字典
+        """
+        if psutil is None:
+            snapshot: Dict[str, Any] = {}
+        else:
+            memory = psutil.virtual_memory()
+            disk = psutil.disk_usage('/')
+            snapshot = {
+                "cpu_percent": psutil.cpu_percent(),
+                "memory": {
+                    "total": memory.total,
+                    "available": memory.available,
+                    "percent": memory.percent
+                },
+                "disk": {
+                    "total": disk.total,
+                    "free": disk.free,
+                    "percent": disk.percent
+                }
+            }
+
+        # 整体替换引用，读取方总是拿到完整的快照
+        self.snapshot = snapshot
+        self._sampled_at = time.monotonic()
+        return snapshot
+
+    def get_snapshot(self) -> Dict[str, Any]:
+        """
+        获取最近一次快照
+
+        后台任务运行时直接返回快照；未运行时按 ttl 读穿缓存，合并短时间内的多次读取。
+
+        Returns:
+            Dict[str, Any]: 系统资源快照
+        """
+        snapshot = self.snapshot
+        if snapshot is None or (
+            self._task is None and time.monotonic() - self._sampled_at > self.ttl
+        ):
+            snapshot = self.sample()
+        return snapshot
+
+    def start(self, interval: Optional[float] = None) -> None:
+        """启动后台采样任务"""
+        if interval is not None:
+            self.interval = interval
+        if self._task is None or self._task.done():
+            self.sample()
+            if psutil is not None:
+                self._task = asyncio.get_running_loop().create_task(self._loop())
+
+    async def stop(self) -> None:
+        """停止后台采样任务"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _loop(self) -> None:
+        """采样循环"""
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                self.sample()
+            except Exception as e:
+                logger.warning(f"System info sampling failed: {e}")
+
+
+# 全局采样器实例
+sysinfo_sampler = SysInfoSampler()
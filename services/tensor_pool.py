@@ -0,0 +1,108 @@
+"""
+张量池
+
+按 (shape, dtype, device) 复用推理过程中的临时张量（潜变量、VAE 输出等），
+避免并发请求下反复分配相同形状的缓冲区。
+"""
+
+import logging
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Tuple
+
+import torch
+
+
+logger = logging.getLogger(__name__)
+
+_Key = Tuple[Tuple[int, ...], torch.dtype, str]
+
+
+class TensorPool:
+    """按形状分桶的张量池
+
+    rent() 优先返回同形状的空闲张量（内容未初始化），没有时再 torch.empty 分配；
+    return_() 将张量放回对应的桶。在 scope() 内租用的张量会在作用域结束时自动归还，
+    每个线程的作用域相互独立。
+    """
+
+    def __init__(self, max_per_key: int = 4):
+        """
+        初始化张量池
+
+        Args:
+            max_per_key: 每个 (shape, dtype, device) 桶最多保留的空闲张量数
+        """
+        self.max_per_key = max_per_key
+        self._free: Dict[_Key, List[torch.Tensor]] = defaultdict(list)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @staticmethod
+    def _key(shape, dtype: torch.dtype, device) -> _Key:
+        return tuple(shape), dtype, str(torch.device(device))
+
+    def rent(self, shape, dtype: torch.dtype = torch.float32, device="cpu") -> torch.Tensor:
+        """
+        租用一个张量
+
+        Args:
+            shape: 张量形状
+            dtype: 数据类型
+            device: 设备
+
+        Returns:
+            torch.Tensor: 内容未初始化的张量
+        """
+        key = self._key(shape, dtype, device)
+        with self._lock:
+            bucket = self._free.get(key)
+            tensor = bucket.pop() if bucket else None
+
+        if tensor is None:
+            tensor = torch.empty(key[0], dtype=dtype, device=device)
+
+        scopes = getattr(self._local, "scopes", None)
+        if scopes:
+            scopes[-1].append(tensor)
+        return tensor
+
+    def return_(self, tensor: torch.Tensor) -> None:
+        """
+        归还张量
+
+        Args:
+            tensor: 之前租用的张量
+        """
+        key = self._key(tensor.shape, tensor.dtype, tensor.device)
+        with self._lock:
+            bucket = self._free[key]
+            if len(bucket) < self.max_per_key:
+                bucket.append(tensor)
+
+    @contextmanager
+    def scope(self) -> Iterator["TensorPool"]:
+        """作用域内租用的张量在退出时自动归还"""
+        scopes = getattr(self._local, "scopes", None)
+        if scopes is None:
+            scopes = self._local.scopes = []
+
+        rented: List[torch.Tensor] = []
+        scopes.append(rented)
+        try:
+            yield self
+        finally:
+            scopes.pop()
+            for tensor in rented:
+                self.return_(tensor)
+
+    def clear(self) -> None:
+        """释放所有空闲张量"""
+        with self._lock:
+            self._free.clear()
+
+    def free_count(self) -> int:
+        """当前空闲张量总数"""
+        with self._lock:
+            return sum(len(bucket) for bucket in self._free.values())
@@ -0,0 +1,64 @@
+"""
+快速权重加载
+
+使用 fastsafetensors 将 safetensors 分片批量读入目标设备内存（CUDA 上可经 GPU Direct Storage
+绕过 CPU），再通过 DLPack 直接构造张量，省去常规加载中先映射到 CPU 再逐个拷贝到 GPU 的过程。
+"""
+
+import glob
+import logging
+import os
+from typing import Callable, Dict, Optional, Tuple
+
+import torch
+
+try:
+    from fastsafetensors import SafeTensorsFileLoader, SingleGroup
+except ImportError:  # fastsafetensors 为可选依赖
+    SafeTensorsFileLoader = None
+    SingleGroup = None
+
+
+logger = logging.getLogger(__name__)
+
+
+def load_safetensors(directory: str, device: str
+                     ) -> Optional[Tuple[Dict[str, torch.Tensor], Callable[[], None]]]:
+    """
+    将目录下所有 safetensors 分片加载到目标设备
+
+    返回的张量直接引用 fastsafetensors 的设备缓冲区，调用方在不再使用这些张量（模型卸载）
+    之后调用释放函数。
+
+    Args:
+        directory: safetensors 分片所在目录
+        device: 目标设备
+
+    Returns:
+        Optional[Tuple[Dict[str, torch.Tensor], Callable[[], None]]]: (state_dict, 释放函数)，
+        fastsafetensors 不可用或目录中没有 safetensors 文件时为 None
+    """
+    if SafeTensorsFileLoader is None:
+        return None
+
+    filenames = sorted(glob.glob(os.path.join(directory, "*.safetensors")))
+    if not filenames:
+        return None
+
+    target = torch.device(device)
+    loader = SafeTensorsFileLoader(SingleGroup(), target, nogds=target.type != "cuda")
+    try:
+        loader.add_filenames({0: filenames})
+        buffers = loader.copy_files_to_device()
+    except Exception:
+        loader.close()
+        raise
+
+    state_dict = {key: buffers.get_tensor(key) for key in loader.get_keys()}
+    logger.info(f"Loaded {len(state_dict)} tensors from {len(filenames)} safetensors files to {target}")
+
+    def release() -> None:
+        buffers.close()
+        loader.close()
+
+    return state_dict, release
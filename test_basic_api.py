@@ -18,10 +18,10 @@ def test_basic_functionality():
     
     try:
         # 导入应用
-        from api import app
+        from api import get_app
         
         # 创建测试客户端
-        client = TestClient(app)
+        client = TestClient(get_app())
         
         # 模拟依赖
         mock_model_manager = Mock()
@@ -62,7 +62,8 @@ async def test_route_registration():
     print("\nTesting route registration...")
     
     try:
-        from api import app
+        from api import get_app
+        app = get_app()
         
         # 获取所有路由
         routes = []
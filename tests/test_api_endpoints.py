@@ -4,20 +4,25 @@ API 端点测试
 测试 FastAPI 应用的各个端点功能。
 """
 
+import asyncio
 import pytest
 import io
+import base64
+import json
+import subprocess
+import sys
 from unittest.mock import Mock, patch, MagicMock
 from PIL import Image
 from fastapi.testclient import TestClient
 
-from api import app
+from api import get_app
 from models.responses import ImageResponse, HealthResponse, InfoResponse
 
 
 @pytest.fixture
 def client():
     """测试客户端"""
-    return TestClient(app)
+    return TestClient(get_app())
 
 
 @pytest.fixture
@@ -117,6 +122,65 @@ class TestAPIEndpoints:
         mock_model_manager.is_model_loaded.assert_called_once()
         mock_model_manager.text_to_image.assert_called_once()
     
+    @patch('api.app.qwen_api.get_model_manager')
+    @patch('api.app.qwen_api.get_request_processor')
+    def test_text_to_image_raw(self, mock_get_processor, mock_get_manager,
+                               mock_model_manager, client):
+        """测试文生图直接返回图像字节"""
+        from services.request_processor import RequestProcessor
+        mock_get_manager.return_value = mock_model_manager
+        mock_get_processor.return_value = RequestProcessor()
+        
+        request_data = {"prompt": "一只可爱的小猫", "width": 512, "height": 512}
+        
+        response = client.post("/text-to-image/raw", json=request_data)
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "image/png"
+        assert response.headers["x-width"] == "512"
+        assert Image.open(io.BytesIO(response.content)).size == (512, 512)
+        
+        metadata = json.loads(response.headers["x-metadata"])
+        assert metadata["parameters"]["prompt"] == "一只可爱的小猫"
+        
+        response = client.post("/text-to-image/raw?format=webp", json=request_data)
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "image/webp"
+
+    @patch('api.app.qwen_api.get_model_manager')
+    @patch('api.app.qwen_api.get_request_processor')
+    def test_text_to_image_stream(self, mock_get_processor, mock_get_manager,
+                                  mock_model_manager, client):
+        """测试文生图流式 JSON 响应与 ImageResponse 结构一致"""
+        from services.request_processor import RequestProcessor
+        mock_get_manager.return_value = mock_model_manager
+        mock_get_processor.return_value = RequestProcessor()
+
+        request_data = {"prompt": "一只可爱的小猫", "width": 512, "height": 512}
+
+        response = client.post("/text-to-image/stream", json=request_data)
+        assert response.status_code == 200
+
+        data = ImageResponse.model_validate_json(response.content)
+        assert data.success is True
+        assert data.metadata["width"] == 512
+        assert data.metadata["parameters"]["prompt"] == "一只可爱的小猫"
+        image = Image.open(io.BytesIO(base64.b64decode(data.image)))
+        assert image.size == (512, 512)
+
+    def test_stream_image_json_chunks_buffer(self):
+        """测试流式 JSON 按块编码缓冲区内容，结束后关闭缓冲区"""
+        from api.routes import _stream_image_json, _STREAM_CHUNK_SIZE
+        
+        content = bytes(range(256)) * (_STREAM_CHUNK_SIZE // 128 + 1)
+        buffer = io.BytesIO(content)
+        
+        chunks = list(_stream_image_json(buffer, {"width": 1}))
+        data = ImageResponse.model_validate_json(b"".join(chunks))
+        
+        assert len(chunks) > 3
+        assert base64.b64decode(data.image) == content
+        assert buffer.closed
+
     @patch('api.app.qwen_api.get_model_manager')
     @patch('api.app.qwen_api.get_request_processor')
     def test_text_to_image_model_not_loaded(self, mock_get_processor, mock_get_manager, 
@@ -138,6 +202,48 @@ class TestAPIEndpoints:
         data = response.json()
         assert data["success"] is False
         assert "模型未加载" in data["error"]["message"]
+
+    @patch('api.app.qwen_api.get_model_manager')
+    @patch('api.app.qwen_api.get_request_processor')
+    def test_text_to_image_model_warming_up(self, mock_get_processor, mock_get_manager,
+                                           mock_model_manager, mock_request_processor, client):
+        """测试模型后台预热期间的情况"""
+        mock_get_manager.return_value = mock_model_manager
+        mock_get_processor.return_value = mock_request_processor
+
+        request_data = {
+            "prompt": "一只可爱的小猫",
+            "width": 512,
+            "height": 512
+        }
+
+        with patch('api.app.qwen_api.is_model_warming_up', return_value=True):
+            response = client.post("/text-to-image", json=request_data)
+
+        assert response.status_code == 503
+        mock_model_manager.text_to_image.assert_not_called()
+
+        # 健康检查在预热期间仍然可用
+        with patch('api.app.qwen_api.is_model_warming_up', return_value=True):
+            response = client.get("/health")
+        assert response.status_code == 200
+
+    def test_inference_errors_mapped(self):
+        """测试推理异常映射为对应的 HTTP 状态码"""
+        from api.routes import _to_http_exception
+        from services.exceptions import ModelNotLoadedError, ValidationError, InferenceError, MemoryError
+        
+        cases = [
+            (ModelNotLoadedError(), 503, "模型未加载"),
+            (ValidationError("bad size"), 400, "参数验证失败: bad size"),
+            (MemoryError("oom"), 503, "内存不足"),
+            (InferenceError("boom"), 500, "图像生成失败"),
+            (RuntimeError("unexpected"), 500, "服务器内部错误"),
+        ]
+        for error, status_code, message in cases:
+            exc = _to_http_exception(error, "text-to-image")
+            assert exc.status_code == status_code
+            assert message in exc.detail
     
     @patch('api.app.qwen_api.get_model_manager')
     @patch('api.app.qwen_api.get_request_processor')
@@ -209,6 +315,29 @@ class TestAPIEndpoints:
         assert "memory_usage" in data
         assert "uptime" in data
         assert "timestamp" in data
+        assert data["uptime"] == 3600.0
+        assert data["memory_usage"]["inference_count"] == 10
+        
+        # 拼接的响应体仍然符合 HealthResponse 结构
+        HealthResponse.model_validate_json(response.content)
+    
+    @patch('api.app.qwen_api.get_model_manager')
+    def test_health_check_reports_current_memory_usage(self, mock_get_manager, mock_model_manager, client):
+        """测试健康检查复用状态前缀，但每次返回最新的内存信息"""
+        from api.app import qwen_api
+        mock_get_manager.return_value = mock_model_manager
+        
+        first = client.get("/health").json()
+        prefix = qwen_api.get_health_prefix(True)
+        mock_model_manager.get_resource_stats.return_value = {
+            **mock_model_manager.get_resource_stats.return_value,
+            "inference_count": 11
+        }
+        second = client.get("/health").json()
+        
+        assert first["memory_usage"]["inference_count"] == 10
+        assert second["memory_usage"]["inference_count"] == 11
+        assert qwen_api.get_health_prefix(True) is prefix
     
     @patch('api.app.qwen_api.get_model_manager')
     def test_health_check_degraded(self, mock_get_manager, mock_model_manager, client):
@@ -252,6 +381,51 @@ class TestAPIEndpoints:
         ]
         for endpoint in expected_endpoints:
             assert endpoint in data["api_endpoints"]
+    
+    @pytest.mark.asyncio
+    async def test_service_info_cached_until_model_state_changes(self, mock_model_manager,
+                                                                 mock_request_processor):
+        """测试服务信息在模型状态不变时复用缓存"""
+        from api.app import qwen_api
+        from api.routes import service_info
+        
+        qwen_api.invalidate_info_response()
+        first = await service_info(mock_model_manager, mock_request_processor)
+        second = await service_info(mock_model_manager, mock_request_processor)
+        
+        assert second.body == first.body
+        assert mock_model_manager.get_model_info.call_count == 1
+        
+        # 加载状态变化后重新生成
+        mock_model_manager.is_model_loaded.return_value = False
+        await service_info(mock_model_manager, mock_request_processor)
+        assert mock_model_manager.get_model_info.call_count == 2
+        
+        # 模型加载完成回调显式清空缓存
+        future = asyncio.get_running_loop().create_future()
+        future.set_result(None)
+        qwen_api._on_model_loaded(future)
+        await service_info(mock_model_manager, mock_request_processor)
+        assert mock_model_manager.get_model_info.call_count == 3
+        qwen_api.invalidate_info_response()
+
+
+class TestAPIPackage:
+    """api 包导入测试"""
+    
+    def test_import_api_is_lazy(self):
+        """测试仅导入 api 包不会加载应用模块，api.app 仍是子模块"""
+        code = (
+            "import sys, api\n"
+            "assert 'api.app' not in sys.modules and 'services.model_manager' not in sys.modules\n"
+            "import api.app\n"
+            "assert api.app.QwenImageAPI\n"
+        )
+        subprocess.run([sys.executable, "-c", code], check=True)
+    
+    def test_get_app_returns_same_instance(self):
+        """测试 get_app 只构建一次应用"""
+        assert get_app() is get_app()
 
 
 class TestAPIErrorHandling:
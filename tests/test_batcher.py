@@ -0,0 +1,154 @@
+"""
+动态批处理器测试
+"""
+
+import asyncio
+
+import pytest
+from unittest.mock import Mock
+from PIL import Image
+
+from models.requests import TextToImageRequest
+from services.batcher import DynamicBatcher
+from services.exceptions import MemoryError, ResourceError, ValidationError
+
+
+def _fake_batch(prompts, **kwargs):
+    """按提示词长度生成不同宽度的图像，便于核对结果分发"""
+    return [Image.new('RGB', (256 + len(p), kwargs['height'])) for p in prompts]
+
+
+class TestDynamicBatcher:
+    """DynamicBatcher 测试类"""
+
+    def test_can_batch(self):
+        """测试请求兼容性判断"""
+        a = TextToImageRequest(prompt="a", width=512, height=512)
+        b = TextToImageRequest(prompt="b", width=512, height=512)
+        c = TextToImageRequest(prompt="c", width=768, height=512)
+
+        assert a.can_batch(b)
+        assert not a.can_batch(c)
+
+    @pytest.mark.asyncio
+    async def test_compatible_requests_share_one_batch(self):
+        """测试参数相同的并发请求合并为一次推理"""
+        manager = Mock()
+        manager.text_to_image_batch.side_effect = _fake_batch
+
+        batcher = DynamicBatcher(manager, max_batch_size=4, batch_window=0.05)
+        batcher.start()
+        try:
+            requests = [TextToImageRequest(prompt="x" * i, height=256) for i in range(1, 4)]
+            images = await asyncio.gather(*(batcher.submit(r) for r in requests))
+        finally:
+            await batcher.stop()
+
+        assert manager.text_to_image_batch.call_count == 1
+        assert [image.width for image in images] == [257, 258, 259]
+
+    @pytest.mark.asyncio
+    async def test_incompatible_requests_are_split(self):
+        """测试参数不同的请求分批推理"""
+        manager = Mock()
+        manager.text_to_image_batch.side_effect = _fake_batch
+
+        batcher = DynamicBatcher(manager, max_batch_size=4, batch_window=0.05)
+        batcher.start()
+        try:
+            images = await asyncio.gather(
+                batcher.submit(TextToImageRequest(prompt="a", height=256)),
+                batcher.submit(TextToImageRequest(prompt="b", height=512)),
+                batcher.submit(TextToImageRequest(prompt="c", height=256)),
+            )
+        finally:
+            await batcher.stop()
+
+        assert manager.text_to_image_batch.call_count == 2
+        assert [image.height for image in images] == [256, 512, 256]
+
+    @pytest.mark.asyncio
+    async def test_batch_error_propagates_to_all_requests(self):
+        """测试批量推理失败时所有请求都收到异常"""
+        manager = Mock()
+        manager.text_to_image_batch.side_effect = RuntimeError("boom")
+
+        batcher = DynamicBatcher(manager, max_batch_size=4, batch_window=0.01)
+        batcher.start()
+        try:
+            results = await asyncio.gather(
+                batcher.submit(TextToImageRequest(prompt="a")),
+                batcher.submit(TextToImageRequest(prompt="b")),
+                return_exceptions=True
+            )
+        finally:
+            await batcher.stop()
+
+        assert all(isinstance(r, RuntimeError) for r in results)
+
+    @pytest.mark.asyncio
+    async def test_validation_error_retries_requests_individually(self):
+        """测试批次参数校验失败时逐个重试，只有无效请求收到异常"""
+        def reject_bad(prompts, **kwargs):
+            if "bad" in prompts:
+                raise ValidationError("Prompt rejected", parameter="prompt")
+            return _fake_batch(prompts, **kwargs)
+
+        manager = Mock()
+        manager.text_to_image_batch.side_effect = reject_bad
+
+        batcher = DynamicBatcher(manager, max_batch_size=4, batch_window=0.05)
+        batcher.start()
+        try:
+            results = await asyncio.gather(
+                batcher.submit(TextToImageRequest(prompt="a", height=256)),
+                batcher.submit(TextToImageRequest(prompt="bad", height=256)),
+                batcher.submit(TextToImageRequest(prompt="ccc", height=256)),
+                return_exceptions=True
+            )
+        finally:
+            await batcher.stop()
+
+        assert manager.text_to_image_batch.call_count == 4
+        assert results[0].width == 257 and results[2].width == 259
+        assert isinstance(results[1], ValidationError)
+
+    @pytest.mark.asyncio
+    async def test_memory_error_retries_requests_individually(self):
+        """测试按批估算的内存不足时逐个重试"""
+        def reject_batches(prompts, **kwargs):
+            if len(prompts) > 1:
+                raise MemoryError("Insufficient memory for batch")
+            return _fake_batch(prompts, **kwargs)
+
+        manager = Mock()
+        manager.text_to_image_batch.side_effect = reject_batches
+
+        batcher = DynamicBatcher(manager, max_batch_size=4, batch_window=0.05)
+        batcher.start()
+        try:
+            images = await asyncio.gather(
+                batcher.submit(TextToImageRequest(prompt="a", height=256)),
+                batcher.submit(TextToImageRequest(prompt="bb", height=256)),
+            )
+        finally:
+            await batcher.stop()
+
+        assert manager.text_to_image_batch.call_count == 3
+        assert [image.width for image in images] == [257, 258]
+
+    @pytest.mark.asyncio
+    async def test_submit_rejects_when_queue_full(self):
+        """测试等待队列已满时直接拒绝新请求"""
+        batcher = DynamicBatcher(Mock(), max_queue_size=1)
+
+        # 未启动工作协程，第一个请求占满队列
+        pending = asyncio.ensure_future(batcher.submit(TextToImageRequest(prompt="a")))
+        await asyncio.sleep(0)
+
+        with pytest.raises(ResourceError):
+            await batcher.submit(TextToImageRequest(prompt="b"))
+
+        await batcher.stop()
+        with pytest.raises(RuntimeError, match="Batcher stopped"):
+            await pending
@@ -8,6 +8,7 @@ import yaml
 import tempfile
 import pytest
 from pathlib import Path
+from pydantic import ValidationError
 from unittest.mock import patch, mock_open
 
 from config.manager import ConfigManager, get_config_manager, init_config, get_current_config
@@ -96,6 +97,73 @@ class TestConfigManager:
         finally:
             os.unlink(temp_path)
     
+    def test_load_config_skips_unchanged_file(self):
+        """测试配置文件未变化时复用已加载的配置"""
+        config_data = {"model": {"model_path": "/path/to/model"}}
+        
+        with tempfile.NamedTemporaryFile(mode='w', suffix='.yaml', delete=False) as f:
+            yaml.dump(config_data, f)
+            temp_path = f.name
+        
+        try:
+            first = self.manager.load_config(temp_path)
+            
+            with patch.object(self.manager, '_load_yaml_config') as mock_load:
+                assert self.manager.reload_config() is first
+                mock_load.assert_not_called()
+            
+            # 文件内容变化后重新解析
+            config_data["server"] = {"port": 9100}
+            with open(temp_path, 'w') as f:
+                yaml.dump(config_data, f)
+            
+            assert self.manager.reload_config().server.port == 9100
+        finally:
+            os.unlink(temp_path)
+    
+    def test_section_dicts_cached_until_reload(self):
+        """测试配置段字典在重新加载前复用同一快照"""
+        config_data = {"model": {"model_path": "/path/to/model"}}
+        
+        with tempfile.NamedTemporaryFile(mode='w', suffix='.yaml', delete=False) as f:
+            yaml.dump(config_data, f)
+            temp_path = f.name
+        
+        try:
+            self.manager.load_config(temp_path)
+            server_config = self.manager.get_server_config()
+            assert self.manager.get_server_config() is server_config
+            
+            config_data["server"] = {"port": 9200}
+            with open(temp_path, 'w') as f:
+                yaml.dump(config_data, f)
+            self.manager.reload_config()
+            
+            assert self.manager.get_server_config()["port"] == 9200
+        finally:
+            os.unlink(temp_path)
+    
+    def test_section_dicts_are_read_only(self):
+        """测试配置段快照和配置段模型均不可修改"""
+        config_data = {"model": {"model_path": "/path/to/model"}}
+        
+        with tempfile.NamedTemporaryFile(mode='w', suffix='.yaml', delete=False) as f:
+            yaml.dump(config_data, f)
+            temp_path = f.name
+        
+        try:
+            self.manager.load_config(temp_path)
+            server_config = self.manager.get_server_config()
+            
+            with pytest.raises(TypeError):
+                server_config["port"] = 9200
+            with pytest.raises(ValidationError):
+                self.manager.get_config().server.port = 9200
+            
+            assert self.manager.get_server_config()["port"] == 8000
+        finally:
+            os.unlink(temp_path)
+    
     def test_load_config_unsupported_format(self):
         """测试不支持的配置文件格式"""
         with tempfile.NamedTemporaryFile(mode='w', suffix='.txt', delete=False) as f:
@@ -168,6 +236,16 @@ class TestConfigManager:
         assert merged["server"]["port"] == 9000  # 被覆盖
         assert merged["new_section"]["key"] == "value"  # 新增
     
+    def test_merge_configs_empty_file_returns_copy(self):
+        """测试文件配置为空时返回默认配置的副本"""
+        default_config = {"server": {"port": 8000}}
+        
+        merged = self.manager._merge_configs(default_config, {})
+        merged["server"]["port"] = 9000
+        
+        assert merged is not default_config
+        assert default_config["server"]["port"] == 8000
+    
     def test_get_config_before_load(self):
         """测试在加载配置前获取配置"""
         with pytest.raises(RuntimeError) as exc_info:
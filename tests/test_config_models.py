@@ -33,7 +33,8 @@ class TestModelConfig:
         """测试使用默认值的模型配置"""
         config = ModelConfig(model_path="/path/to/model")
         assert config.device == "cuda"
-        assert config.torch_dtype == "float16"
+        assert config.torch_dtype == "bfloat16"
+        assert config.quantization_method == "none"
         assert config.max_memory is None
     
     def test_empty_model_path(self):
@@ -62,9 +63,19 @@ class TestModelConfig:
     
     def test_valid_torch_dtypes(self):
         """测试所有有效 torch 数据类型"""
-        for dtype in ['float16', 'float32', 'bfloat16']:
+        for dtype in ['float16', 'float32', 'bfloat16', 'float8_e4m3fn', 'float8_e5m2']:
             config = ModelConfig(model_path="/path/to/model", torch_dtype=dtype)
             assert config.torch_dtype == dtype
+    
+    def test_quantization_methods(self):
+        """测试量化方式校验"""
+        for method in ['none', 'bnb_int8', 'fp8', 'quanto_fp8', 'torchao_int8', 'torchao_fp8']:
+            config = ModelConfig(model_path="/path/to/model", quantization_method=method)
+            assert config.quantization_method == method
+        
+        with pytest.raises(ValidationError) as exc_info:
+            ModelConfig(model_path="/path/to/model", quantization_method="gptq")
+        assert "quantization_method 必须是" in str(exc_info.value)
 
 
 class TestServerConfig:
@@ -5,6 +5,7 @@
 """
 
 import pytest
+import json
 from unittest.mock import Mock, patch
 from fastapi import HTTPException, Request
 from fastapi.exceptions import RequestValidationError
@@ -37,6 +38,21 @@ class TestErrorHandler:
         assert "HTTP_404" in response_data
         assert "Not found" in response_data
     
+    def test_canned_envelope_matches_full_serialization(self):
+        """测试预序列化响应外壳与完整序列化结果一致"""
+        from services.error_handler import DefaultJSONResponse
+        
+        exc = ModelNotLoadedError()
+        with patch.object(self.error_handler, '_log_error'):
+            response = self.error_handler.handle_exception(self.mock_request, exc)
+        
+        data = json.loads(response.body)
+        expected = DefaultJSONResponse(content=data).body
+        assert response.status_code == 503
+        assert response.body == expected
+        assert data["error"]["code"] == "MODEL_NOT_LOADED"
+        assert data["error"]["details"]["path"] == "/test"
+    
     def test_validation_error_handling(self):
         """测试验证错误处理"""
         # 模拟 RequestValidationError
@@ -162,7 +178,27 @@ class TestErrorHandler:
         
         # IP 应该被记录在日志中
         assert response.status_code == 400
-    
+
+    def test_client_ip_header_precedence(self):
+        """测试从原始请求头提取客户端 IP 的优先级"""
+        def make_request(headers):
+            return Request({
+                "type": "http",
+                "headers": headers,
+                "client": ("127.0.0.1", 12345)
+            })
+
+        request = make_request([
+            (b"x-real-ip", b"10.0.0.2"),
+            (b"x-forwarded-for", b"192.168.1.1, 10.0.0.1"),
+        ])
+        assert self.error_handler._get_client_ip(request) == "192.168.1.1"
+
+        request = make_request([(b"x-real-ip", b"10.0.0.2")])
+        assert self.error_handler._get_client_ip(request) == "10.0.0.2"
+
+        assert self.error_handler._get_client_ip(make_request([])) == "127.0.0.1"
+
     def test_include_traceback_option(self):
         """测试包含堆栈跟踪选项"""
         exc = RuntimeError("Test error")
@@ -6,14 +6,20 @@
 
 import pytest
 import asyncio
+import io
+import logging
+import subprocess
+import sys
 import time
+from logging.handlers import QueueHandler
 from unittest.mock import Mock, patch
 from datetime import datetime
 
+import services.logging as service_logging
 from services.logging import (
     RequestTracker, PerformanceMonitor, configure_logging, get_logger,
     set_request_context, clear_request_context, log_performance,
-    request_tracker, performance_monitor
+    request_tracker, performance_monitor, generate_request_id
 )
 
 
@@ -163,6 +169,36 @@ class TestPerformanceMonitor:
         assert test2_stats["count"] == 1
         assert test2_stats["error_count"] == 1
     
+    def test_concurrent_recording(self):
+        """测试多线程并发记录不丢失计数"""
+        import threading
+        
+        def worker():
+            for _ in range(1000):
+                self.monitor.record_request("/test", 0.001, 200)
+        
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        metrics = self.monitor.get_metrics()
+        assert metrics["request_count"] == 4000
+        assert metrics["endpoint_stats"]["/test"]["count"] == 4000
+
+    def test_metrics_snapshot_cached_until_next_record(self):
+        """测试指标未变化时复用快照，新的记录使快照失效"""
+        self.monitor.record_request("/test", 1.0, 200)
+
+        metrics = self.monitor.get_metrics()
+        assert self.monitor.get_metrics() is metrics
+
+        self.monitor.record_request("/test", 1.0, 200)
+        updated = self.monitor.get_metrics()
+        assert updated is not metrics
+        assert updated["request_count"] == 2
+
     def test_reset_metrics(self):
         """测试重置指标"""
         self.monitor.record_request("/test", 1.0, 200)
@@ -206,6 +242,14 @@ class TestRequestContext:
         request_id = set_request_context(request_id=custom_id, user_id="user456")
         
         assert request_id == custom_id
+    
+    def test_generated_request_ids_are_unique_and_ordered(self):
+        """测试生成的请求 ID 唯一且按时间排序"""
+        ids = [generate_request_id() for _ in range(1000)]
+        
+        assert len(set(ids)) == len(ids)
+        assert all(len(request_id) == 20 for request_id in ids)
+        assert ids[0][4:16] <= ids[-1][4:16]
 
 
 class TestLogPerformanceDecorator:
@@ -215,15 +259,15 @@ class TestLogPerformanceDecorator:
     async def test_async_function_logging(self):
         """测试异步函数日志记录"""
         
-        @log_performance("test_async")
-        async def async_test_function(value):
-            await asyncio.sleep(0.01)
-            return value * 2
-        
         with patch('services.logging.get_logger') as mock_get_logger:
             mock_logger = Mock()
             mock_get_logger.return_value = mock_logger
             
+            @log_performance("test_async")
+            async def async_test_function(value):
+                await asyncio.sleep(0.01)
+                return value * 2
+            
             result = await async_test_function(5)
             
             assert result == 10
@@ -245,35 +289,51 @@ class TestLogPerformanceDecorator:
     def test_sync_function_logging(self):
         """测试同步函数日志记录"""
         
-        @log_performance("test_sync")
-        def sync_test_function(value):
-            time.sleep(0.01)
-            return value * 3
-        
         with patch('services.logging.get_logger') as mock_get_logger:
             mock_logger = Mock()
             mock_get_logger.return_value = mock_logger
             
+            @log_performance("test_sync")
+            def sync_test_function(value):
+                time.sleep(0.01)
+                return value * 3
+            
             result = sync_test_function(4)
             
             assert result == 12
             
             # 检查日志调用
             assert mock_logger.info.call_count == 2
+            
+            # 日志器只在装饰时获取一次，按函数名命名
+            sync_test_function(1)
+            mock_get_logger.assert_called_once_with("test_sync")
+    
+    def test_default_logger_name_is_function_name(self):
+        """测试未指定名称时日志器以函数名（不含类名）命名"""
+        
+        with patch('services.logging.get_logger') as mock_get_logger:
+            class Worker:
+                @log_performance()
+                def run(self):
+                    return 1
+            
+            assert Worker().run() == 1
+            mock_get_logger.assert_called_once_with("run")
     
     @pytest.mark.asyncio
     async def test_async_function_error_logging(self):
         """测试异步函数错误日志记录"""
         
-        @log_performance("test_error")
-        async def failing_async_function():
-            await asyncio.sleep(0.01)
-            raise ValueError("Test error")
-        
         with patch('services.logging.get_logger') as mock_get_logger:
             mock_logger = Mock()
             mock_get_logger.return_value = mock_logger
             
+            @log_performance("test_error")
+            async def failing_async_function():
+                await asyncio.sleep(0.01)
+                raise ValueError("Test error")
+            
             with pytest.raises(ValueError):
                 await failing_async_function()
             
@@ -289,6 +349,60 @@ class TestLogPerformanceDecorator:
 class TestLoggingConfiguration:
     """日志配置测试"""
     
+    @pytest.fixture(autouse=True)
+    def restore_root_logger(self):
+        """测试后停止后台写入线程并恢复根日志器的处理器和级别"""
+        root = logging.getLogger()
+        handlers, level = list(root.handlers), root.level
+        yield
+        service_logging._stop_log_listener()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        for handler in handlers:
+            root.addHandler(handler)
+        root.setLevel(level)
+    
+    def test_configure_logging_queues_existing_handlers(self):
+        """测试根日志器已有处理器（如 basicConfig）时也改为经队列由后台线程写入"""
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        stream = io.StringIO()
+        logging.basicConfig(level=logging.INFO, format="%(levelname)s|%(message)s", stream=stream)
+        existing = root.handlers[0]
+        
+        configure_logging(log_level="DEBUG", json_format=False)
+        
+        assert len(root.handlers) == 1 and isinstance(root.handlers[0], QueueHandler)
+        assert existing in service_logging._log_listener.handlers
+        # 入口脚本设置的级别不被覆盖
+        assert root.level == logging.INFO
+        
+        # 再次配置时沿用已移到后台线程的处理器，不重复添加
+        configure_logging(log_level="INFO", json_format=True)
+        assert service_logging._log_listener.handlers == (existing,)
+        
+        logging.getLogger("queued").info("through the queue")
+        service_logging._stop_log_listener()
+        assert "INFO|through the queue" in stream.getvalue()
+    
+    def test_configure_logging_after_main_import(self):
+        """测试按 main.py 的导入顺序（先 basicConfig）配置后日志经队列写入"""
+        pytest.importorskip("uvicorn")
+        code = (
+            "import logging, main\n"
+            "from logging.handlers import QueueHandler\n"
+            "from services import logging as service_logging\n"
+            "service_logging.configure_logging(log_level='INFO')\n"
+            "root = logging.getLogger()\n"
+            "assert [type(h) for h in root.handlers] == [QueueHandler], root.handlers\n"
+            "assert service_logging._log_listener is not None\n"
+            "logging.getLogger('main').info('queued message')\n"
+        )
+        result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+        assert result.returncode == 0, result.stderr
+        assert "queued message" in result.stdout
+    
     def test_configure_logging(self):
         """测试日志配置"""
         # 这个测试主要确保配置函数不会抛出异常
@@ -300,6 +414,11 @@ class TestLoggingConfiguration:
         
         # 测试日志记录
         logger.info("Test message", extra_field="test_value")
+
+    def test_get_logger_is_cached(self):
+        """测试同名日志器只创建一次"""
+        assert get_logger("cached") is get_logger("cached")
+        assert get_logger("cached") is not get_logger("other")
     
     @patch('services.logging.structlog')
     def test_configure_logging_with_file(self, mock_structlog):
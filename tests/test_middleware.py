@@ -13,16 +13,21 @@ from fastapi import FastAPI, Request
 from fastapi.testclient import TestClient
 from starlette.responses import Response
 
-from api.middleware import (
-    FileValidationMiddleware,
-    RateLimitMiddleware,
-    ConcurrencyLimitMiddleware,
-    SecurityHeadersMiddleware
-)
+from api.middleware import CombinedMiddleware, RequestLoggingMiddleware
+from config.models import AppConfig, ModelConfig, ServerConfig, SecurityConfig
 
 
-class TestFileValidationMiddleware:
-    """文件验证中间件测试"""
+def make_config(server=None, security=None) -> AppConfig:
+    """构建测试用的应用配置"""
+    return AppConfig(
+        model=ModelConfig(model_path="test_model"),
+        server=ServerConfig(**(server or {})),
+        security=SecurityConfig(**(security or {}))
+    )
+
+
+class TestFileValidation:
+    """文件验证测试"""
     
     def test_file_size_validation(self):
         """测试文件大小验证"""
@@ -30,9 +35,11 @@ class TestFileValidationMiddleware:
         
         # 添加中间件，设置较小的文件大小限制
         app.add_middleware(
-            FileValidationMiddleware,
-            max_file_size=1024,  # 1KB
-            allowed_content_types={"image/jpeg", "image/png"}
+            CombinedMiddleware,
+            config=make_config(
+                server={"max_file_size": 1024},  # 1KB
+                security={"allowed_file_types": ["image/jpeg", "image/png"]}
+            )
         )
         
         @app.post("/image-to-image")
@@ -55,9 +62,11 @@ class TestFileValidationMiddleware:
         app = FastAPI()
         
         app.add_middleware(
-            FileValidationMiddleware,
-            max_file_size=10 * 1024 * 1024,
-            allowed_content_types={"image/jpeg", "image/png"}
+            CombinedMiddleware,
+            config=make_config(
+                server={"max_file_size": 10 * 1024 * 1024},
+                security={"allowed_file_types": ["image/jpeg", "image/png"]}
+            )
         )
         
         @app.post("/image-to-image")
@@ -80,9 +89,11 @@ class TestFileValidationMiddleware:
         app = FastAPI()
         
         app.add_middleware(
-            FileValidationMiddleware,
-            max_file_size=10 * 1024 * 1024,
-            allowed_content_types={"image/jpeg", "image/png"}
+            CombinedMiddleware,
+            config=make_config(
+                server={"max_file_size": 10 * 1024 * 1024},
+                security={"allowed_file_types": ["image/jpeg", "image/png"]}
+            )
         )
         
         @app.post("/image-to-image")
@@ -104,9 +115,40 @@ class TestFileValidationMiddleware:
         assert response.status_code != 413
         assert response.status_code != 415
 
+    def test_streamed_body_size_validation(self):
+        """测试没有 Content-Length 的分块上传也受大小限制"""
+        app = FastAPI()
+
+        app.add_middleware(
+            CombinedMiddleware,
+            config=make_config(server={"max_file_size": 1024})
+        )
+
+        @app.post("/image-to-image")
+        async def mock_endpoint(request: Request):
+            body = await request.body()
+            return {"size": len(body)}
+
+        client = TestClient(app)
+
+        def chunks(count):
+            for _ in range(count):
+                yield b"x" * 512
+
+        # 分块传输超过限制
+        response = client.post("/image-to-image", content=chunks(4))
+        assert response.status_code == 413
+        assert response.json()["error"]["code"] == "FILE_TOO_LARGE"
+        assert "X-Content-Type-Options" in response.headers
 
-class TestRateLimitMiddleware:
-    """速率限制中间件测试"""
+        # 未超过限制的分块传输正常到达路由
+        response = client.post("/image-to-image", content=chunks(2))
+        assert response.status_code == 200
+        assert response.json()["size"] == 1024
+
+
+class TestRateLimit:
+    """速率限制测试"""
     
     def test_rate_limit_enforcement(self):
         """测试速率限制执行"""
@@ -114,10 +156,12 @@ class TestRateLimitMiddleware:
         
         # 设置很低的限制进行测试
         app.add_middleware(
-            RateLimitMiddleware,
-            requests_per_minute=2,
-            requests_per_hour=10,
-            burst_size=2
+            CombinedMiddleware,
+            config=make_config(security={
+                "requests_per_minute": 2,
+                "requests_per_hour": 10,
+                "burst_size": 2
+            })
         )
         
         @app.get("/test")
@@ -143,10 +187,12 @@ class TestRateLimitMiddleware:
         app = FastAPI()
         
         app.add_middleware(
-            RateLimitMiddleware,
-            requests_per_minute=1,
-            requests_per_hour=1,
-            burst_size=1
+            CombinedMiddleware,
+            config=make_config(security={
+                "requests_per_minute": 1,
+                "requests_per_hour": 1,
+                "burst_size": 1
+            })
         )
         
         @app.get("/health")
@@ -174,10 +220,12 @@ class TestRateLimitMiddleware:
         app = FastAPI()
         
         app.add_middleware(
-            RateLimitMiddleware,
-            requests_per_minute=10,
-            requests_per_hour=100,
-            burst_size=5
+            CombinedMiddleware,
+            config=make_config(security={
+                "requests_per_minute": 10,
+                "requests_per_hour": 100,
+                "burst_size": 5
+            })
         )
         
         @app.get("/test")
@@ -195,9 +243,81 @@ class TestRateLimitMiddleware:
         assert "X-RateLimit-Remaining-Minute" in response.headers
         assert "X-RateLimit-Remaining-Hour" in response.headers
 
+    def test_rate_limit_remaining_headers_disabled(self):
+        """测试关闭剩余请求数响应头"""
+        app = FastAPI()
+
+        app.add_middleware(
+            CombinedMiddleware,
+            config=make_config(security={"rate_limit_remaining_headers": False})
+        )
+
+        @app.get("/test")
+        async def mock_endpoint():
+            return {"success": True}
+
+        client = TestClient(app)
 
-class TestConcurrencyLimitMiddleware:
-    """并发限制中间件测试"""
+        response = client.get("/test")
+        assert response.status_code == 200
+        assert response.headers["X-RateLimit-Limit-Minute"] == "60"
+        assert "X-RateLimit-Remaining-Minute" not in response.headers
+        assert "X-RateLimit-Remaining-Hour" not in response.headers
+
+    def test_sliding_window_expiry(self):
+        """测试分钟窗口过期但小时窗口保留"""
+        middleware = CombinedMiddleware(
+            app=None,
+            config=make_config(security={
+                "requests_per_minute": 2,
+                "requests_per_hour": 100,
+                "burst_size": 100
+            })
+        )
+
+        with patch("api.middleware.combined.time.monotonic", return_value=1000.0):
+            middleware._record_request("client")
+            middleware._record_request("client")
+            is_limited, minute_requests, _, _ = middleware._is_rate_limited("client")
+            assert is_limited
+            assert minute_requests == 2
+
+        with patch("api.middleware.combined.time.monotonic", return_value=1061.0):
+            is_limited, minute_requests, hour_requests, _ = middleware._is_rate_limited("client")
+            assert not is_limited
+            assert minute_requests == 0
+            assert hour_requests == 2
+
+        with patch("api.middleware.combined.time.monotonic", return_value=4601.0):
+            _, _, hour_requests, _ = middleware._is_rate_limited("client")
+            assert hour_requests == 0
+
+    def test_client_state_is_bounded(self):
+        """测试客户端状态的 LRU 淘汰和过期清理"""
+        middleware = CombinedMiddleware(
+            app=None,
+            config=make_config(security={
+                "rate_limit_max_clients": CombinedMiddleware.NUM_SHARDS * 2
+            })
+        )
+        assert middleware.max_clients_per_shard == 2
+
+        with patch("api.middleware.combined.time.monotonic", return_value=1000.0):
+            for i in range(middleware.NUM_SHARDS * 4):
+                middleware._record_request(f"client-{i}")
+
+        assert all(len(shard) <= 2 for shard in middleware.shards)
+
+        with patch("api.middleware.combined.time.monotonic", return_value=1000.0 + 3601.0):
+            middleware._record_request("fresh-client")
+            removed = middleware._prune_expired_clients()
+
+        assert removed > 0
+        assert sum(len(shard) for shard in middleware.shards) == 1
+
+
+class TestConcurrencyLimit:
+    """并发限制测试"""
     
     @pytest.mark.asyncio
     async def test_concurrency_limit(self):
@@ -206,9 +326,11 @@ class TestConcurrencyLimitMiddleware:
         
         # 设置很低的并发限制
         app.add_middleware(
-            ConcurrencyLimitMiddleware,
-            max_concurrent_requests=1,
-            queue_timeout=1
+            CombinedMiddleware,
+            config=make_config(server={
+                "max_concurrent_requests": 1,
+                "queue_timeout": 5
+            })
         )
         
         request_started = asyncio.Event()
@@ -229,14 +351,106 @@ class TestConcurrencyLimitMiddleware:
             response = client.get("/test")
             assert response.status_code == 200
     
+    @pytest.mark.asyncio
+    async def test_queue_timeout_does_not_release_slot(self):
+        """测试排队超时的请求不会释放未获取的执行许可"""
+        release_first = asyncio.Event()
+
+        async def slow_app(scope, receive, send):
+            await release_first.wait()
+            await send({"type": "http.response.start", "status": 200, "headers": []})
+            await send({"type": "http.response.body", "body": b""})
+
+        middleware = CombinedMiddleware(
+            slow_app,
+            config=make_config(
+                server={"max_concurrent_requests": 1, "queue_timeout": 5},
+                security={"enable_rate_limiting": False}
+            )
+        )
+        middleware.queue_timeout = 0.05
+
+        scope = {"type": "http", "method": "POST", "path": "/text-to-image", "headers": []}
+        sent = []
+
+        async def receive():
+            return {"type": "http.request", "body": b""}
+
+        async def send(message):
+            sent.append(message)
+
+        first = asyncio.create_task(middleware(scope, receive, send))
+        await asyncio.sleep(0)
+
+        # 第二个请求排队超时
+        await middleware(scope, receive, send)
+        assert sent[0]["status"] == 503
+
+        # 第一个请求仍在处理，许可不应被超时请求释放
+        assert middleware.active_requests == 1
+
+        release_first.set()
+        await first
+        assert middleware.active_requests == 0
+
+        # 许可归还后新请求可以立即执行
+        sent.clear()
+        await middleware(scope, receive, send)
+        assert sent[0]["status"] == 200
+        middleware._stop_workers()
+
+    @pytest.mark.asyncio
+    async def test_queue_full_rejects_immediately(self):
+        """测试队列已满时请求被立即拒绝"""
+        release = asyncio.Event()
+
+        async def slow_app(scope, receive, send):
+            await release.wait()
+            await send({"type": "http.response.start", "status": 200, "headers": []})
+            await send({"type": "http.response.body", "body": b""})
+
+        middleware = CombinedMiddleware(
+            slow_app,
+            config=make_config(
+                server={"max_concurrent_requests": 1, "queue_timeout": 5},
+                security={"enable_rate_limiting": False}
+            )
+        )
+
+        scope = {"type": "http", "method": "POST", "path": "/text-to-image", "headers": []}
+        sent = []
+
+        async def receive():
+            return {"type": "http.request", "body": b""}
+
+        async def send(message):
+            sent.append(message)
+
+        # 一个执行中，两个排队
+        tasks = [asyncio.create_task(middleware(scope, receive, send)) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        assert middleware.active_requests == 1
+        assert middleware.queued_requests == 2
+
+        await middleware(scope, receive, send)
+        assert sent[0]["status"] == 503
+        assert b"SERVICE_OVERLOADED" in sent[1]["body"]
+
+        release.set()
+        await asyncio.gather(*tasks)
+        assert middleware.active_requests == 0
+        middleware._stop_workers()
+
     def test_concurrency_headers(self):
         """测试并发信息头"""
         app = FastAPI()
         
         app.add_middleware(
-            ConcurrencyLimitMiddleware,
-            max_concurrent_requests=4,
-            queue_timeout=30
+            CombinedMiddleware,
+            config=make_config(server={
+                "max_concurrent_requests": 4,
+                "queue_timeout": 30
+            })
         )
         
         @app.post("/text-to-image")
@@ -254,14 +468,14 @@ class TestConcurrencyLimitMiddleware:
         assert response.headers["X-Concurrency-Limit"] == "4"
 
 
-class TestSecurityHeadersMiddleware:
-    """安全头中间件测试"""
+class TestSecurityHeaders:
+    """安全头测试"""
     
     def test_security_headers_added(self):
         """测试安全头被添加"""
         app = FastAPI()
         
-        app.add_middleware(SecurityHeadersMiddleware)
+        app.add_middleware(CombinedMiddleware, config=make_config())
         
         @app.get("/test")
         async def mock_endpoint():
@@ -281,7 +495,7 @@ class TestSecurityHeadersMiddleware:
         """测试 API 端点的缓存头"""
         app = FastAPI()
         
-        app.add_middleware(SecurityHeadersMiddleware)
+        app.add_middleware(CombinedMiddleware, config=make_config())
         
         @app.post("/text-to-image")
         async def api_endpoint():
@@ -311,18 +525,18 @@ class TestMiddlewareIntegration:
         """测试多个中间件协同工作"""
         app = FastAPI()
         
-        # 添加多个中间件
-        app.add_middleware(SecurityHeadersMiddleware)
+        # 合并中间件同时启用所有检查
         app.add_middleware(
-            RateLimitMiddleware,
-            requests_per_minute=10,
-            requests_per_hour=100,
-            burst_size=5
-        )
-        app.add_middleware(
-            FileValidationMiddleware,
-            max_file_size=1024 * 1024,
-            allowed_content_types={"image/jpeg"}
+            CombinedMiddleware,
+            config=make_config(
+                server={"max_file_size": 1024 * 1024},
+                security={
+                    "requests_per_minute": 10,
+                    "requests_per_hour": 100,
+                    "burst_size": 5,
+                    "allowed_file_types": ["image/jpeg"]
+                }
+            )
         )
         
         @app.post("/image-to-image")
@@ -346,4 +560,61 @@ class TestMiddlewareIntegration:
         
         # 应该有安全头
         assert "X-Content-Type-Options" in response.headers
-        assert "X-RateLimit-Limit-Minute" in response.headers
\ No newline at end of file
+        assert "X-RateLimit-Limit-Minute" in response.headers
+
+    def test_request_logging_headers(self):
+        """测试请求日志中间件添加追踪头并结束请求追踪"""
+        from services.logging import request_tracker
+
+        app = FastAPI()
+
+        app.add_middleware(CombinedMiddleware, config=make_config())
+        app.add_middleware(RequestLoggingMiddleware)
+
+        @app.get("/test")
+        async def mock_endpoint():
+            return {"success": True}
+
+        client = TestClient(app)
+
+        response = client.get("/test")
+        assert response.status_code == 200
+        assert response.headers["X-Request-ID"]
+        assert float(response.headers["X-Process-Time"]) >= 0
+        assert "X-Content-Type-Options" in response.headers
+        assert response.headers["X-Request-ID"] not in request_tracker.get_active_requests()
+
+    def test_request_tracing_skipped(self):
+        """测试追踪关闭和排除路径时跳过请求上下文和追踪，但仍返回请求 ID"""
+        app = FastAPI()
+
+        app.add_middleware(RequestLoggingMiddleware, tracing_enabled=False)
+
+        @app.get("/test")
+        async def mock_endpoint():
+            return {"success": True}
+
+        client = TestClient(app)
+
+        with patch("services.logging.request_tracker.start_request") as start_request:
+            response = client.get("/test")
+            assert response.status_code == 200
+            assert response.headers["X-Request-ID"]
+            assert "X-Process-Time" in response.headers
+            start_request.assert_not_called()
+
+        # 启用追踪时健康检查仍然不追踪
+        app = FastAPI()
+        app.add_middleware(RequestLoggingMiddleware)
+
+        @app.get("/health")
+        async def traced_health_endpoint():
+            return {"status": "healthy"}
+
+        client = TestClient(app)
+
+        with patch("services.logging.request_tracker.start_request") as start_request:
+            response = client.get("/health")
+            assert response.status_code == 200
+            assert response.headers["X-Request-ID"]
+            start_request.assert_not_called()
@@ -5,19 +5,24 @@
 import pytest
 import tempfile
 import os
+import threading
 from unittest.mock import Mock, patch, MagicMock
 from PIL import Image
 
-from services.model_manager import ModelManager
+import torch
+
+from services.model_manager import ModelManager, CachedBlock, FeatureCache, wrap_blocks_with_cache
+from services.exceptions import InferenceError, ModelLoadError, ModelNotLoadedError, ValidationError
 
 
 class TestModelManager:
     """ModelManager 测试类"""
     
     @pytest.fixture
-    def model_config(self):
+    def model_config(self, temp_model_path):
         """测试配置"""
         return {
+            "model_path": temp_model_path,
             "device": "cpu",
             "torch_dtype": "float32",
             "max_memory": None
@@ -56,29 +61,26 @@ class TestModelManager:
         with pytest.raises(ValueError):
             ModelManager(temp_model_path, invalid_config)
     
-    @patch('torch.cuda.is_available')
-    def test_get_device_auto_cuda_available(self, mock_cuda_available, model_manager):
+    @patch('services.model_manager.CUDA_AVAILABLE', True)
+    def test_get_device_auto_cuda_available(self, model_manager):
         """测试自动设备选择 - CUDA 可用"""
-        mock_cuda_available.return_value = True
-        model_manager.config.device = "auto"
+        model_manager.config = model_manager.config.model_copy(update={"device": "auto"})
         
         device = model_manager._get_device()
         assert device == "cuda"
     
-    @patch('torch.cuda.is_available')
-    def test_get_device_auto_cuda_unavailable(self, mock_cuda_available, model_manager):
+    @patch('services.model_manager.CUDA_AVAILABLE', False)
+    def test_get_device_auto_cuda_unavailable(self, model_manager):
         """测试自动设备选择 - CUDA 不可用"""
-        mock_cuda_available.return_value = False
-        model_manager.config.device = "auto"
+        model_manager.config = model_manager.config.model_copy(update={"device": "auto"})
         
         device = model_manager._get_device()
         assert device == "cpu"
     
-    @patch('torch.cuda.is_available')
-    def test_get_device_cuda_fallback(self, mock_cuda_available, model_manager):
+    @patch('services.model_manager.CUDA_AVAILABLE', False)
+    def test_get_device_cuda_fallback(self, model_manager):
         """测试 CUDA 回退到 CPU"""
-        mock_cuda_available.return_value = False
-        model_manager.config.device = "cuda"
+        model_manager.config = model_manager.config.model_copy(update={"device": "cuda"})
         
         device = model_manager._get_device()
         assert device == "cpu"
@@ -94,7 +96,7 @@ class TestModelManager:
         """测试加载不存在的模型路径"""
         manager = ModelManager("/nonexistent/path", model_config)
         
-        with pytest.raises(RuntimeError, match="Model loading failed"):
+        with pytest.raises(ModelLoadError, match="Model path does not exist"):
             manager.load_model()
     
     def test_load_model_already_loaded(self, model_manager):
@@ -130,19 +132,111 @@ class TestModelManager:
         assert isinstance(image, Image.Image)
         assert image.size == (256, 256)
     
+    def test_text_to_image_reuses_shape_cache(self, model_manager):
+        """测试相同参数的请求复用形状缓存且不修改缓存内容"""
+        model_manager.config = model_manager.config.model_copy(update={"debug_stub": True})
+        model_manager.load_model()
+        
+        first = model_manager.text_to_image("first prompt", width=256, height=256)
+        second = model_manager.text_to_image("second prompt", width=256, height=256)
+        
+        assert len(model_manager._shape_cache) == 1
+        assert len(model_manager._prompt_cache) == 2
+        assert first.tobytes() != second.tobytes()
+        
+        # 同一提示词的结果保持一致
+        again = model_manager.text_to_image("first prompt", width=256, height=256)
+        assert again.tobytes() == first.tobytes()
+        
+        model_manager.clear_caches()
+        assert not model_manager._shape_cache
+        assert not model_manager._prompt_cache
+
+    def test_text_to_image_plain_stub_by_default(self, model_manager):
+        """测试未开启 debug_stub 时模拟实现返回纯色图像且不编码提示词"""
+        model_manager.load_model()
+
+        image = model_manager.text_to_image("test prompt", width=256, height=256)
+
+        assert image.getcolors() == [(256 * 256, (173, 216, 230))]
+        assert not model_manager._prompt_cache
+
+    def test_text_to_image_uses_bound_pipeline(self, model_manager):
+        """测试加载后直接调用绑定的文生图管道"""
+        pipeline = Mock()
+        pipeline.return_value.images = [Image.new('RGB', (256, 256))]
+        embeds, mask = torch.zeros(1, 4, 8), torch.ones(1, 4)
+        pipeline.encode_prompt.return_value = (embeds, mask)
+
+        with patch.object(model_manager, '_load_qwen_image_model',
+                          return_value=({'text_to_image_pipeline': pipeline}, None)):
+            model_manager.load_model()
+
+        assert model_manager._t2i_pipe is pipeline
+        image = model_manager.text_to_image("test prompt", width=256, height=256)
+
+        assert image is pipeline.return_value.images[0]
+        assert pipeline.call_args.kwargs["prompt_embeds"] is embeds
+        assert pipeline.call_args.kwargs["prompt_embeds_mask"] is mask
+
+        # 只有空白差异的提示词复用缓存的编码结果
+        model_manager.text_to_image("  test   prompt ", width=256, height=256)
+        pipeline.encode_prompt.assert_called_once_with(prompt="test prompt", device="cpu")
+
+        model_manager.cleanup()
+        assert model_manager._t2i_pipe is None
+
+    def test_text_to_image_batch_uses_cached_prompt_embeds(self, model_manager):
+        """测试批量推理复用提示词编码缓存，并按最长序列补齐后拼接"""
+        pipeline = Mock()
+        pipeline.return_value.images = [Image.new('RGB', (256, 256))] * 3
+        encoded = {
+            "short": (torch.ones(1, 2, 8), torch.ones(1, 2, dtype=torch.long)),
+            "longer prompt": (torch.ones(1, 4, 8), torch.ones(1, 4, dtype=torch.long)),
+        }
+        pipeline.encode_prompt.side_effect = lambda prompt, device: encoded[prompt]
+
+        with patch.object(model_manager, '_load_qwen_image_model',
+                          return_value=({'text_to_image_pipeline': pipeline}, None)):
+            model_manager.load_model()
+
+        images = model_manager.text_to_image_batch(["short", "longer prompt", "short"],
+                                                   width=256, height=256)
+
+        assert len(images) == 3
+        assert pipeline.encode_prompt.call_count == 2
+        kwargs = pipeline.call_args.kwargs
+        assert "prompt" not in kwargs
+        assert kwargs["prompt_embeds"].shape == (3, 4, 8)
+        assert kwargs["prompt_embeds_mask"].tolist() == [[1, 1, 0, 0], [1, 1, 1, 1], [1, 1, 0, 0]]
+
+    def test_text_to_image_batch_wraps_pipeline_errors(self, model_manager):
+        """测试批量推理中管道的任意异常都转换为 InferenceError"""
+        pipeline = Mock()
+        pipeline.encode_prompt.return_value = (torch.ones(1, 2, 8), torch.ones(1, 2))
+        pipeline.side_effect = ValueError("bad latents")
+
+        with patch.object(model_manager, '_load_qwen_image_model',
+                          return_value=({'text_to_image_pipeline': pipeline}, None)):
+            model_manager.load_model()
+
+        with pytest.raises(InferenceError, match="bad latents"):
+            model_manager.text_to_image_batch(["a", "b"], width=256, height=256)
+        assert model_manager._error_count == 1
+
     def test_text_to_image_model_not_loaded(self, model_manager):
         """测试模型未加载时的文生图"""
-        with pytest.raises(RuntimeError, match="Model not loaded"):
+        with pytest.raises(ModelNotLoadedError, match="Model not loaded"):
             model_manager.text_to_image("test prompt")
     
     def test_text_to_image_empty_prompt(self, model_manager):
         """测试空提示词"""
         model_manager.load_model()
         
-        with pytest.raises(ValueError, match="Prompt cannot be empty"):
+        with pytest.raises(ValidationError, match="Prompt cannot be empty"):
             model_manager.text_to_image("")
         
-        with pytest.raises(ValueError, match="Prompt cannot be empty"):
+        with pytest.raises(ValidationError, match="Prompt cannot be empty"):
             model_manager.text_to_image("   ")
     
     def test_text_to_image_invalid_params(self, model_manager):
@@ -150,19 +244,19 @@ class TestModelManager:
         model_manager.load_model()
         
         # 无效宽度
-        with pytest.raises(ValueError, match="Width must be between"):
+        with pytest.raises(ValidationError, match="Width must be between"):
             model_manager.text_to_image("test", width=100)
         
         # 无效高度
-        with pytest.raises(ValueError, match="Height must be between"):
+        with pytest.raises(ValidationError, match="Height must be between"):
             model_manager.text_to_image("test", height=3000)
         
         # 无效推理步数
-        with pytest.raises(ValueError, match="num_inference_steps must be between"):
+        with pytest.raises(ValidationError, match="num_inference_steps must be between"):
             model_manager.text_to_image("test", num_inference_steps=0)
         
         # 无效引导比例
-        with pytest.raises(ValueError, match="guidance_scale must be between"):
+        with pytest.raises(ValidationError, match="guidance_scale must be between"):
             model_manager.text_to_image("test", guidance_scale=0.5)
     
     def test_image_to_image_success(self, model_manager):
@@ -196,7 +290,7 @@ class TestModelManager:
         """测试模型未加载时的图生图"""
         input_image = Image.new('RGB', (512, 512), color='red')
         
-        with pytest.raises(RuntimeError, match="Model not loaded"):
+        with pytest.raises(ModelNotLoadedError, match="Model not loaded"):
             model_manager.image_to_image(input_image, "test prompt")
     
     def test_image_to_image_invalid_input(self, model_manager):
@@ -204,12 +298,12 @@ class TestModelManager:
         model_manager.load_model()
         
         # 无效图像类型
-        with pytest.raises(ValueError, match="Input must be a PIL Image"):
+        with pytest.raises(ValidationError, match="Input must be a PIL Image"):
             model_manager.image_to_image("not_an_image", "test prompt")
         
         # 空提示词
         input_image = Image.new('RGB', (512, 512), color='red')
-        with pytest.raises(ValueError, match="Prompt cannot be empty"):
+        with pytest.raises(ValidationError, match="Prompt cannot be empty"):
             model_manager.image_to_image(input_image, "")
     
     def test_image_to_image_invalid_strength(self, model_manager):
@@ -217,10 +311,10 @@ class TestModelManager:
         model_manager.load_model()
         input_image = Image.new('RGB', (512, 512), color='red')
         
-        with pytest.raises(ValueError, match="Strength must be between"):
+        with pytest.raises(ValidationError, match="Strength must be between"):
             model_manager.image_to_image(input_image, "test", strength=0.05)
         
-        with pytest.raises(ValueError, match="Strength must be between"):
+        with pytest.raises(ValidationError, match="Strength must be between"):
             model_manager.image_to_image(input_image, "test", strength=1.5)
     
     def test_preprocess_image_rgb_conversion(self, model_manager):
@@ -242,6 +336,160 @@ class TestModelManager:
         assert processed.size == (256, 256)
         assert processed.mode == 'RGB'
     
+    def test_preprocess_image_resample_by_strength(self, model_manager):
+        """测试高变换强度时使用双线性插值缩放"""
+        original_image = Image.new('RGB', (100, 100), color='blue')
+        
+        with patch.object(Image.Image, 'resize', return_value=original_image) as mock_resize:
+            model_manager._preprocess_image(original_image, 256, 256, strength=0.9)
+            model_manager._preprocess_image(original_image, 256, 256, strength=0.3)
+        
+        assert mock_resize.call_args_list[0].args[1] == Image.Resampling.BILINEAR
+        assert mock_resize.call_args_list[1].args[1] == Image.Resampling.LANCZOS
+
+    def test_stage_image_passthrough_without_cuda(self, model_manager):
+        """测试未分配暂存区时图像原样传给管道"""
+        model_manager.load_model()
+        image = Image.new('RGB', (256, 256), color='blue')
+
+        assert model_manager._pin_buf is None
+        assert model_manager._stage_image(image) is image
+
+    def test_image_to_image_passes_staged_image(self, model_manager):
+        """测试图生图管道收到经暂存区传输后的输入"""
+        pipeline = Mock()
+        pipeline.return_value.images = [Image.new('RGB', (256, 256))]
+        staged = torch.zeros(1, 3, 256, 256)
+
+        with patch.object(model_manager, '_load_qwen_image_model',
+                          return_value=({'image_to_image_pipeline': pipeline}, None)):
+            model_manager.load_model()
+
+        with patch.object(model_manager, '_stage_image', return_value=staged) as mock_stage:
+            model_manager.image_to_image(Image.new('RGB', (300, 200)), "test prompt",
+                                         width=256, height=256)
+
+        assert mock_stage.call_args.args[0].size == (256, 256)
+        assert pipeline.call_args.kwargs["image"] is staged
+
+    @pytest.mark.skipif(not torch.cuda.is_available(), reason="需要 CUDA")
+    def test_stage_image_copies_to_device(self, model_manager):
+        """测试暂存区传输得到归一化的设备张量，且连续请求复用暂存缓冲区"""
+        model_manager._allocate_staging()
+        first = Image.new('RGB', (64, 32), color=(255, 0, 51))
+        second = Image.new('RGB', (32, 64), color=(0, 255, 0))
+
+        tensor = model_manager._stage_image(first)
+        torch.cuda.synchronize()
+
+        assert tensor.device.type == "cuda"
+        assert tensor.shape == (1, 3, 32, 64)
+        expected = torch.tensor([1.0, 0.0, 0.2], device="cuda").view(1, 3, 1, 1)
+        assert torch.allclose(tensor, expected.expand_as(tensor))
+
+        with model_manager._tensor_scope():
+            tensor = model_manager._stage_image(second)
+            torch.cuda.synchronize()
+            assert tensor.shape == (1, 3, 64, 32)
+            assert torch.all(tensor[:, 1] == 1) and torch.all(tensor[:, 0] == 0)
+
+        # 作用域内租用的归一化缓冲区在推理结束后归还张量池
+        assert model_manager.tensor_pool.free_count() == 1
+
+    def test_load_model_wraps_shared_transformer_blocks(self, model_manager):
+        """测试加载后为管道字典中共享的 Transformer 块启用特征缓存"""
+        transformer = torch.nn.Module()
+        transformer.transformer_blocks = torch.nn.ModuleList(
+            [torch.nn.Identity(), torch.nn.Identity()]
+        )
+        t2i, i2i = Mock(transformer=transformer), Mock(transformer=transformer)
+        model_manager.config = model_manager.config.model_copy(update={"cache_interval": 2})
+
+        with patch.object(model_manager, '_load_qwen_image_model',
+                          return_value=({'text_to_image_pipeline': t2i,
+                                         'image_to_image_pipeline': i2i}, None)):
+            model_manager.load_model()
+
+        blocks = transformer.transformer_blocks
+        assert model_manager._cached_blocks == list(blocks)
+        assert all(isinstance(block, CachedBlock) and isinstance(block.module, torch.nn.Identity)
+                   for block in blocks)
+
+        model_manager._prepare_feature_cache(3)
+        assert model_manager._feature_cache.interval == 3
+        assert all(block.cache is model_manager._feature_cache for block in blocks)
+
+    def test_load_model_skips_feature_cache_when_disabled(self, model_manager):
+        """测试 cache_interval 为 1 时不包装 Transformer 块，管道调用也不带步回调"""
+        transformer = torch.nn.Module()
+        transformer.transformer_blocks = torch.nn.ModuleList([torch.nn.Identity()])
+        pipeline = Mock(transformer=transformer)
+
+        with patch.object(model_manager, '_load_qwen_image_model',
+                          return_value=({'text_to_image_pipeline': pipeline}, None)):
+            model_manager.load_model()
+
+        assert not model_manager._cached_blocks
+        assert isinstance(transformer.transformer_blocks[0], torch.nn.Identity)
+        assert model_manager._step_callback() == {}
+
+    def test_compile_pipeline_compiles_cached_block_modules(self, model_manager):
+        """测试已包装特征缓存的 Transformer 只编译块内部模块，且共享模块只编译一次"""
+        transformer = torch.nn.Module()
+        transformer.transformer_blocks = torch.nn.ModuleList(
+            [torch.nn.Linear(2, 2), torch.nn.Linear(2, 2)]
+        )
+        inner = list(transformer.transformer_blocks)
+        wrapped = wrap_blocks_with_cache(transformer.transformer_blocks, interval=2)
+        t2i = Mock(transformer=transformer, vae=None)
+        i2i = Mock(transformer=transformer, vae=None)
+
+        class Compiled(torch.nn.Module):
+            def __init__(self, module):
+                super().__init__()
+                self.module = module
+
+        with patch('torch.compile', side_effect=lambda module, **kwargs: Compiled(module)) as mock_compile:
+            model_manager._compile_pipeline({'text_to_image_pipeline': t2i,
+                                             'image_to_image_pipeline': i2i})
+
+        assert mock_compile.call_count == 2
+        assert t2i.transformer is transformer and i2i.transformer is transformer
+        assert [block.module.module for block in wrapped] == inner
+
+    def test_apply_quantization_to_shared_transformer(self, model_manager):
+        """测试对管道字典中共享的 Transformer 只执行一次量化"""
+        transformer = torch.nn.Linear(2, 2)
+        transformer.enable_layerwise_casting = Mock()
+        model_manager.config = model_manager.config.model_copy(update={"quantization_method": 'fp8'})
+
+        model_manager._apply_quantization({
+            'text_to_image_pipeline': Mock(transformer=transformer),
+            'image_to_image_pipeline': Mock(transformer=transformer),
+        })
+
+        transformer.enable_layerwise_casting.assert_called_once_with(
+            storage_dtype=torch.float8_e4m3fn, compute_dtype=torch.float32
+        )
+
+    def test_enable_vae_tiling(self, model_manager):
+        """测试为共享的 VAE 启用分块和切片解码并按配置设置块大小"""
+        vae = Mock(spec=['enable_tiling', 'enable_slicing',
+                         'tile_sample_min_size', 'tile_latent_min_size'])
+        vae.tile_sample_min_size, vae.tile_latent_min_size = 512, 64
+        pipeline = Mock(vae=vae)
+        model_manager.config = model_manager.config.model_copy(update={"vae_tile_size": 256})
+
+        assert model_manager._enable_vae_tiling({'text_to_image_pipeline': pipeline})
+        vae.enable_tiling.assert_called_once()
+        vae.enable_slicing.assert_called_once()
+        assert (vae.tile_sample_min_size, vae.tile_latent_min_size) == (256, 32)
+
+        # 模拟实现中没有 VAE，块大小为 0 时关闭
+        assert not model_manager._enable_vae_tiling({'text_to_image_pipeline': None})
+        model_manager.config = model_manager.config.model_copy(update={"vae_tile_size": 0})
+        assert not model_manager._enable_vae_tiling({'text_to_image_pipeline': pipeline})
+
     def test_get_model_info(self, model_manager):
         """测试获取模型信息"""
         info = model_manager.get_model_info()
@@ -263,11 +511,10 @@ class TestModelManager:
         
         assert info['loaded'] == True
     
-    @patch('torch.cuda.is_available')
     @patch('torch.cuda.empty_cache')
-    def test_cleanup(self, mock_empty_cache, mock_cuda_available, model_manager):
+    def test_cleanup(self, mock_empty_cache, model_manager):
         """测试资源清理"""
-        mock_cuda_available.return_value = True
+        model_manager._is_cuda = True
         
         # 加载模型
         model_manager.load_model()
@@ -279,6 +526,37 @@ class TestModelManager:
         assert not model_manager.is_model_loaded()
         assert model_manager.model is None
         mock_empty_cache.assert_called_once()
+
+    def test_cleanup_waits_for_active_inference(self, model_manager):
+        """测试清理等待进行中的推理结束后才释放模型"""
+        model_manager.load_model()
+        started, release = threading.Event(), threading.Event()
+
+        def slow_execute(**kwargs):
+            started.set()
+            release.wait(5)
+            return Image.new('RGB', (kwargs['width'], kwargs['height']))
+
+        with patch.object(model_manager, '_execute_text_to_image', side_effect=slow_execute):
+            worker = threading.Thread(target=model_manager.text_to_image, args=("test prompt",))
+            worker.start()
+            assert started.wait(5)
+
+            cleaner = threading.Thread(target=model_manager.cleanup)
+            cleaner.start()
+            cleaner.join(0.1)
+
+            # 新请求被拒绝，但模型在推理结束前不会被释放
+            assert cleaner.is_alive()
+            assert not model_manager.is_model_loaded()
+            assert model_manager.model is not None
+
+            release.set()
+            worker.join(5)
+            cleaner.join(5)
+
+        assert model_manager.model is None
+        assert model_manager._inference_count == 1
     
     def test_validate_generation_params_valid(self, model_manager):
         """测试有效的生成参数验证"""
@@ -289,19 +567,19 @@ class TestModelManager:
     def test_validate_generation_params_invalid(self, model_manager):
         """测试无效的生成参数验证"""
         # 无效宽度
-        with pytest.raises(ValueError, match="Width must be between"):
+        with pytest.raises(ValidationError, match="Width must be between"):
             model_manager._validate_generation_params(100, 512, 20)
         
         # 无效高度
-        with pytest.raises(ValueError, match="Height must be between"):
+        with pytest.raises(ValidationError, match="Height must be between"):
             model_manager._validate_generation_params(512, 3000, 20)
         
         # 无效推理步数
-        with pytest.raises(ValueError, match="num_inference_steps must be between"):
+        with pytest.raises(ValidationError, match="num_inference_steps must be between"):
             model_manager._validate_generation_params(512, 512, 0)
         
         # 无效引导比例
-        with pytest.raises(ValueError, match="guidance_scale must be between"):
+        with pytest.raises(ValidationError, match="guidance_scale must be between"):
             model_manager._validate_generation_params(512, 512, 20, 0.5)
 
 
@@ -316,6 +594,7 @@ class TestModelManagerIntegration:
             os.makedirs(model_path, exist_ok=True)
             
             config = {
+                "model_path": model_path,
                 "device": "cpu",
                 "torch_dtype": "float32",
                 "max_memory": None
@@ -415,6 +694,12 @@ class TestModelManagerIntegration:
         assert result['height'] == 256
         assert 'metadata' not in result
     
+    def test_estimated_size_bytes_matches_tobytes(self):
+        """测试按模式计算的字节数与 tobytes() 长度一致"""
+        for mode in ('1', 'L', 'LA', 'I;16', 'RGB', 'RGBA', 'CMYK', 'F'):
+            image = Image.new(mode, (13, 7))
+            assert ModelManager._estimated_size_bytes(image) == len(image.tobytes())
+    
     def test_validate_inference_request_text_to_image(self, model_manager):
         """测试文生图请求验证"""
         params = model_manager.validate_inference_request(
@@ -469,7 +754,7 @@ class TestModelManagerIntegration:
     def test_validate_inference_request_invalid_params(self, model_manager):
         """测试无效参数验证"""
         # 无效尺寸
-        with pytest.raises(ValueError, match="Width must be between"):
+        with pytest.raises(ValidationError, match="Width must be between"):
             model_manager.validate_inference_request(
                 'text_to_image',
                 prompt='test',
@@ -510,4 +795,107 @@ class TestModelManagerIntegration:
                 prompt='test',
                 image=test_image,
                 strength=0.05
-            )
\ No newline at end of file
+            )
+
+
+class TestCachedBlock:
+    """CachedBlock 特征缓存测试"""
+    
+    def _counting_block(self):
+        """返回记录调用次数的块"""
+        calls = []
+        
+        class Block(torch.nn.Module):
+            def forward(self, x):
+                calls.append(1)
+                return x * 2 + 1
+        
+        return Block(), calls
+    
+    def test_interval_one_always_computes(self):
+        """测试间隔为 1 时每步都完整计算"""
+        block, calls = self._counting_block()
+        cached = CachedBlock(block, interval=1)
+        
+        x = torch.ones(2, 3)
+        for _ in range(4):
+            assert torch.equal(cached(x), x * 2 + 1)
+        assert len(calls) == 4
+    
+    def test_reuses_residual_between_full_steps(self):
+        """测试非整数倍步复用上次残差"""
+        block, calls = self._counting_block()
+        cached = CachedBlock(block, interval=2)
+        
+        x0 = torch.ones(2, 3)
+        assert torch.equal(cached(x0), x0 * 2 + 1)
+        
+        # 第二步复用残差 (x0 + 1)
+        x1 = torch.full((2, 3), 3.0)
+        assert torch.equal(cached(x1), x1 + (x0 + 1))
+        assert len(calls) == 1
+        
+        # 第三步重新完整计算
+        cached(x1)
+        assert len(calls) == 2
+        
+        # 重置后从完整计算开始
+        cached.reset()
+        cached(x0)
+        assert len(calls) == 3
+    
+    def test_dual_stream_block_called_by_keyword(self):
+        """测试以关键字调用、返回 (encoder_hidden_states, hidden_states) 元组的块"""
+        calls = []
+
+        class DualStreamBlock(torch.nn.Module):
+            def forward(self, *, hidden_states, encoder_hidden_states, temb):
+                calls.append(1)
+                return encoder_hidden_states * 2, hidden_states + temb
+
+        cached = CachedBlock(DualStreamBlock(), interval=2)
+        temb = torch.full((1, 4), 0.5)
+
+        enc0, hid0 = torch.ones(1, 3), torch.ones(1, 4)
+        out = cached(hidden_states=hid0, encoder_hidden_states=enc0, temb=temb)
+        assert torch.equal(out[0], enc0 * 2) and torch.equal(out[1], hid0 + temb)
+
+        # 第二步按元素复用各自的残差
+        enc1, hid1 = torch.full((1, 3), 3.0), torch.full((1, 4), 2.0)
+        out = cached(hidden_states=hid1, encoder_hidden_states=enc1, temb=temb)
+        assert isinstance(out, tuple) and len(calls) == 1
+        assert torch.equal(out[0], enc1 + enc0)
+        assert torch.equal(out[1], hid1 + temb)
+
+    def test_shared_cache_tracks_cfg_branches(self):
+        """测试共享进度下条件/无条件分支分别缓存，无条件分支间隔加倍"""
+        block, calls = self._counting_block()
+        cache = FeatureCache(interval=2)
+        cache.reset()
+        cached = CachedBlock(block, cache=cache)
+        transformer = torch.nn.Identity()
+        transformer.register_forward_pre_hook(cache.begin_branch)
+
+        cond, uncond = torch.ones(1, 2), torch.zeros(1, 2)
+        computed = []
+        for step in range(4):
+            for x in (cond, uncond):
+                transformer(x)
+                before = len(calls)
+                out = cached(x)
+                computed.append(len(calls) > before)
+                # 每个分支复用的是自己的残差 (x + 1)
+                assert torch.equal(out, x * 2 + 1)
+            cache.end_step(None, step, None, {})
+
+        # (条件, 无条件) × 4 步：条件分支每 2 步计算，无条件分支每 4 步计算
+        assert computed == [True, True, False, False, True, False, False, False]
+
+    def test_wrap_blocks_in_place(self):
+        """测试原地包装 ModuleList"""
+        blocks = torch.nn.ModuleList([torch.nn.Identity(), torch.nn.Identity()])
+        wrapped = wrap_blocks_with_cache(blocks, interval=3)
+        
+        assert len(wrapped) == 2
+        assert all(isinstance(block, CachedBlock) for block in blocks)
+        assert wrap_blocks_with_cache(blocks, interval=3) == wrapped
@@ -19,9 +19,10 @@ class TestModelManagerErrorHandling:
     """ModelManager 错误处理测试"""
     
     @pytest.fixture
-    def model_config(self):
+    def model_config(self, temp_model_path):
         """测试配置"""
         return {
+            "model_path": temp_model_path,
             "device": "cpu",
             "torch_dtype": "float32",
             "max_memory": None
@@ -144,20 +145,18 @@ class TestModelManagerErrorHandling:
         # 应该不抛出异常
         model_manager._check_memory_availability()
     
-    @patch('torch.cuda.is_available')
-    @patch('torch.cuda.get_device_properties')
+    @patch('torch.cuda.mem_get_info')
+    @patch('torch.cuda.memory_reserved')
     @patch('torch.cuda.memory_allocated')
-    def test_gpu_memory_check(self, mock_memory_allocated, mock_device_props, 
-                             mock_cuda_available, model_manager):
+    def test_gpu_memory_check(self, mock_memory_allocated, mock_memory_reserved,
+                             mock_mem_get_info, model_manager):
         """测试 GPU 内存检查"""
-        mock_cuda_available.return_value = True
-        model_manager.config.device = "cuda"
+        model_manager._is_cuda = True
         
-        # 模拟 GPU 内存不足
-        mock_props = Mock()
-        mock_props.total_memory = 2 * 1024**3  # 2GB
-        mock_device_props.return_value = mock_props
-        mock_memory_allocated.return_value = 1.8 * 1024**3  # 1.8GB 已使用
+        # 模拟 GPU 内存不足：驱动空闲 20MB，分配器缓存中另有 10MB 可复用
+        mock_mem_get_info.return_value = (20 * 1024**2, 2 * 1024**3)
+        mock_memory_reserved.return_value = 1034 * 1024**2
+        mock_memory_allocated.return_value = 1024 * 1024**2
         
         with pytest.raises(MemoryError):
             model_manager._check_inference_memory(2048, 2048)  # 大图像
@@ -189,6 +188,7 @@ class TestModelManagerResourceManagement:
             os.makedirs(model_path, exist_ok=True)
             
             config = {
+                "model_path": model_path,
                 "device": "cpu",
                 "torch_dtype": "float32",
                 "max_memory": None
@@ -293,15 +293,13 @@ class TestModelManagerResourceManagement:
         assert health['status'] == 'warning'
         assert any('High error rate' in issue for issue in health['issues'])
     
-    @patch('torch.cuda.is_available')
     @patch('torch.cuda.memory_allocated')
     @patch('torch.cuda.get_device_properties')
     def test_health_check_high_gpu_memory(self, mock_device_props, mock_memory_allocated, 
-                                         mock_cuda_available, model_manager):
+                                         model_manager):
         """测试健康检查 - 高 GPU 内存使用"""
-        mock_cuda_available.return_value = True
-        model_manager.config.device = "cuda"
         model_manager.load_model()
+        model_manager._is_cuda = True
         
         # 模拟高内存使用
         mock_props = Mock()
@@ -314,10 +312,9 @@ class TestModelManagerResourceManagement:
         assert health['status'] == 'warning'
         assert any('High GPU memory usage' in issue for issue in health['issues'])
     
-    @patch('torch.cuda.is_available')
-    def test_gpu_info_in_stats(self, mock_cuda_available, model_manager):
+    def test_gpu_info_in_stats(self, model_manager):
         """测试统计信息中的 GPU 信息"""
-        mock_cuda_available.return_value = True
+        model_manager._is_cuda = True
         
         with patch('torch.cuda.get_device_name') as mock_device_name, \
              patch('torch.cuda.get_device_properties') as mock_device_props, \
@@ -351,6 +348,7 @@ class TestModelManagerIntegrationWithErrors:
             os.makedirs(model_path, exist_ok=True)
             
             config = {
+                "model_path": model_path,
                 "device": "cpu",
                 "torch_dtype": "float32",
                 "max_memory": None
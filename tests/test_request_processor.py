@@ -5,12 +5,13 @@
 """
 
 import pytest
+import base64
 import io
 from unittest.mock import Mock, patch
 from PIL import Image
 from fastapi import UploadFile, HTTPException
 
-from services.request_processor import RequestProcessor
+from services.request_processor import RequestProcessor, sniff_image_info, sniff_mime
 from models.requests import TextToImageRequest, ImageToImageRequest
 from models.responses import ImageResponse, ErrorResponse
 
@@ -133,16 +134,17 @@ class TestRequestProcessor:
         assert result.mode == 'RGB'
         assert result.size == (512, 512)
 
-    def test_process_image_upload_unsupported_extension(self):
-        """测试不支持的文件扩展名"""
-        image_buffer = self.create_test_image()
-        upload_file = self.create_upload_file(image_buffer, "test.gif")
+    def test_process_image_upload_ignores_extension(self):
+        """测试只按文件内容判断格式，不检查文件扩展名"""
+        upload_file = self.create_upload_file(self.create_test_image(), "test.gif")
+        assert self.processor.process_image_upload(upload_file).size == (512, 512)
         
+        upload_file = self.create_upload_file(self.create_test_image(format='GIF'), "test.png")
         with pytest.raises(HTTPException) as exc_info:
             self.processor.process_image_upload(upload_file)
         
         assert exc_info.value.status_code == 415
-        assert "不支持的文件格式" in exc_info.value.detail
+        assert "不支持的图像格式" in exc_info.value.detail
 
     def test_process_image_upload_file_too_large(self):
         """测试文件过大"""
@@ -156,6 +158,57 @@ class TestRequestProcessor:
         assert exc_info.value.status_code == 413
         assert "文件大小超过限制" in exc_info.value.detail
 
+    def test_process_image_upload_size_from_stream(self):
+        """测试未提供 size 时从上传流获取文件大小"""
+        large_content = io.BytesIO(b'x' * (11 * 1024 * 1024))  # 11MB
+        upload_file = self.create_upload_file(large_content, "test.png")
+        upload_file.size = None
+        
+        with pytest.raises(HTTPException) as exc_info:
+            self.processor.process_image_upload(upload_file)
+        
+        assert exc_info.value.status_code == 413
+
+    def test_sniff_mime(self):
+        """测试按文件头识别图像类型"""
+        assert sniff_mime(self.create_test_image(format='PNG').read(12)) == "image/png"
+        assert sniff_mime(self.create_test_image(format='JPEG').read(12)) == "image/jpeg"
+        assert sniff_mime(self.create_test_image(format='WEBP').read(12)) == "image/webp"
+        assert sniff_mime(b'not an image') is None
+
+    def test_sniff_image_info(self):
+        """测试只读文件头识别图像格式和尺寸"""
+        for image_format in ('PNG', 'JPEG', 'WEBP', 'BMP'):
+            buffer = self.create_test_image(width=321, height=123, format=image_format)
+            assert sniff_image_info(buffer) == (image_format, 321, 123)
+        
+        assert sniff_image_info(io.BytesIO(b'not an image')) is None
+
+    def test_process_image_upload_rejects_before_decoding(self):
+        """测试尺寸过大的图像在构造 PIL 解析器之前被拒绝"""
+        upload_file = self.create_upload_file(self.create_test_image(width=3000, height=100), "test.png")
+        
+        with patch('services.request_processor.Image.open') as mock_open:
+            with pytest.raises(HTTPException) as exc_info:
+                self.processor.process_image_upload(upload_file)
+        
+        assert exc_info.value.status_code == 400
+        mock_open.assert_not_called()
+
+    def test_process_image_upload_disallowed_signature(self):
+        """测试文件头类型不在允许列表中时直接拒绝"""
+        processor = RequestProcessor(allowed_file_types=["image/png"])
+        upload_file = self.create_upload_file(self.create_test_image(format='JPEG'), "test.jpg")
+        
+        with pytest.raises(HTTPException) as exc_info:
+            processor.process_image_upload(upload_file)
+        
+        assert exc_info.value.status_code == 415
+        
+        # 允许的类型正常处理
+        upload_file = self.create_upload_file(self.create_test_image(format='PNG'), "test.png")
+        assert processor.process_image_upload(upload_file).size == (512, 512)
+
     def test_process_image_upload_image_too_large(self):
         """测试图像尺寸过大"""
         # 创建超大尺寸图像
@@ -220,7 +273,20 @@ class TestRequestProcessor:
         assert response.success is True
         assert response.metadata["width"] == 256
         assert response.metadata["height"] == 256
-        assert response.metadata["format"] == "PNG"
+        assert response.metadata["format"] == "JPEG"
+
+    def test_format_image_response_png_opt_in(self):
+        """测试按需输出无损 PNG"""
+        image = Image.new('RGBA', (256, 256), color='green')
+        
+        jpeg = self.processor.format_image_response(image)
+        png = self.processor.format_image_response(image, image_format="png")
+        
+        assert base64.b64decode(jpeg.image)[:3] == b"\xff\xd8\xff"
+        assert jpeg.metadata["mode"] == "RGB"
+        assert png.metadata["format"] == "PNG"
+        assert png.metadata["mode"] == "RGBA"
+        assert Image.open(io.BytesIO(base64.b64decode(png.image))).mode == "RGBA"
 
     def test_format_error_response(self):
         """测试错误响应格式化"""
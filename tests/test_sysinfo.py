@@ -0,0 +1,52 @@
+"""
+系统资源采样测试
+"""
+
+import pytest
+from unittest.mock import patch
+
+from services import sysinfo
+from services.sysinfo import SysInfoSampler
+
+
+class TestSysInfoSampler:
+    """SysInfoSampler 测试类"""
+
+    def test_get_snapshot_samples_once(self):
+        """测试快照在未采样时才触发采集"""
+        sampler = SysInfoSampler()
+
+        with patch.object(sampler, 'sample', wraps=sampler.sample) as mock_sample:
+            first = sampler.get_snapshot()
+            second = sampler.get_snapshot()
+
+        assert mock_sample.call_count == 1
+        assert first is second
+
+    def test_snapshot_expires_without_background_task(self):
+        """测试后台任务未运行时快照按 ttl 过期重新采集"""
+        sampler = SysInfoSampler(ttl=0.0)
+
+        with patch.object(sampler, 'sample', wraps=sampler.sample) as mock_sample:
+            sampler.get_snapshot()
+            sampler.get_snapshot()
+
+        assert mock_sample.call_count == 2
+
+    def test_snapshot_without_psutil(self):
+        """测试 psutil 不可用时返回空快照"""
+        sampler = SysInfoSampler()
+
+        with patch.object(sysinfo, 'psutil', None):
+            assert sampler.get_snapshot() == {}
+
+    @pytest.mark.asyncio
+    async def test_start_and_stop(self):
+        """测试后台采样任务的启停"""
+        sampler = SysInfoSampler()
+
+        sampler.start(interval=0.01)
+        assert sampler.snapshot is not None
+
+        await sampler.stop()
+        assert sampler._task is None
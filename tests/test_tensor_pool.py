@@ -0,0 +1,71 @@
+"""
+张量池测试
+"""
+
+import threading
+
+import torch
+
+from services.tensor_pool import TensorPool
+
+
+class TestTensorPool:
+    """TensorPool 测试类"""
+
+    def test_rent_reuses_returned_tensor(self):
+        """测试归还后同形状租用复用同一张量"""
+        pool = TensorPool()
+
+        tensor = pool.rent((1, 4, 8, 8), torch.float32, "cpu")
+        pool.return_(tensor)
+
+        assert pool.rent((1, 4, 8, 8), torch.float32, "cpu") is tensor
+        assert pool.rent((1, 4, 8, 8), torch.float32, "cpu") is not tensor
+
+    def test_different_dtype_uses_different_bucket(self):
+        """测试不同数据类型不会混用"""
+        pool = TensorPool()
+
+        tensor = pool.rent((2, 2), torch.float32)
+        pool.return_(tensor)
+
+        other = pool.rent((2, 2), torch.float64)
+        assert other is not tensor
+        assert other.dtype == torch.float64
+
+    def test_scope_returns_rented_tensors(self):
+        """测试作用域结束时自动归还"""
+        pool = TensorPool()
+
+        with pool.scope():
+            first = pool.rent((3, 3))
+            pool.rent((4, 4))
+            assert pool.free_count() == 0
+
+        assert pool.free_count() == 2
+        assert pool.rent((3, 3)) is first
+
+    def test_bucket_is_bounded(self):
+        """测试每个桶保留的空闲张量数有上限"""
+        pool = TensorPool(max_per_key=2)
+
+        for tensor in [pool.rent((2,)) for _ in range(5)]:
+            pool.return_(tensor)
+
+        assert pool.free_count() == 2
+
+    def test_scopes_are_per_thread(self):
+        """测试不同线程的作用域互不影响"""
+        pool = TensorPool()
+        other_thread_tensors = []
+
+        def rent_outside_scope():
+            other_thread_tensors.append(pool.rent((5,)))
+
+        with pool.scope():
+            thread = threading.Thread(target=rent_outside_scope)
+            thread.start()
+            thread.join()
+
+        # 其他线程在作用域外租用的张量不会被归还
+        assert pool.free_count() == 0
@@ -0,0 +1,52 @@
+"""
+快速权重加载测试
+"""
+
+import os
+from unittest.mock import MagicMock, patch
+
+import torch
+
+from services import weight_loader
+from services.weight_loader import load_safetensors
+
+
+class TestLoadSafetensors:
+    """load_safetensors 测试类"""
+
+    def test_returns_none_without_fastsafetensors(self, tmp_path):
+        """测试 fastsafetensors 不可用时返回 None"""
+        (tmp_path / "model.safetensors").write_bytes(b"")
+
+        with patch.object(weight_loader, "SafeTensorsFileLoader", None):
+            assert load_safetensors(str(tmp_path), "cpu") is None
+
+    def test_returns_none_without_shards(self, tmp_path):
+        """测试目录中没有 safetensors 文件时返回 None"""
+        with patch.object(weight_loader, "SafeTensorsFileLoader", MagicMock()), \
+                patch.object(weight_loader, "SingleGroup", MagicMock()):
+            assert load_safetensors(str(tmp_path), "cpu") is None
+
+    def test_loads_all_shards(self, tmp_path):
+        """测试按文件名顺序加载所有分片，释放函数关闭缓冲区和加载器"""
+        for name in ("b.safetensors", "a.safetensors"):
+            (tmp_path / name).write_bytes(b"")
+
+        loader = MagicMock()
+        loader.get_keys.return_value = ["weight", "bias"]
+        buffers = loader.copy_files_to_device.return_value
+        buffers.get_tensor.side_effect = lambda key: torch.zeros(1)
+
+        with patch.object(weight_loader, "SafeTensorsFileLoader", return_value=loader), \
+                patch.object(weight_loader, "SingleGroup", MagicMock()):
+            state_dict, release = load_safetensors(str(tmp_path), "cpu")
+
+        loader.add_filenames.assert_called_once_with({0: [
+            os.path.join(str(tmp_path), "a.safetensors"),
+            os.path.join(str(tmp_path), "b.safetensors"),
+        ]})
+        assert set(state_dict) == {"weight", "bias"}
+
+        release()
+        buffers.close.assert_called_once()
+        loader.close.assert_called_once()